@@ -24,9 +24,10 @@ from liteeth.phy.s7rgmii import LiteEthPHYRGMII
 from liteeth.core import LiteEthUDPIPCore
 from liteeth.frontend.etherbone import LiteEthEtherbone
 
-from liteiclink.transceiver.gtp_7series import GTPQuadPLL, GTP
+from pcie_analyzer.liteiclink.gtp_7series import GTPQuadPLL, GTP
 
 from pcie_analyzer.capture_pipeline.capture_pipeline import *
+from pcie_analyzer.udp_streamer.udp_streamer import *
 from pcie_analyzer.common import *
 
 # *********************************************************
@@ -332,6 +333,7 @@ class PCIeAnalyzer(SoCSDRAM):
         # *                RX Capture Pipeline                    *
         # *********************************************************
 
+        # Reset values, rings are moved at run time (see allocate_rings)
         RX_RING_BUFFER_BASE_ADDRESS = 0
         RX_RING_BUFFER_SIZE         = 0x100000
 
@@ -353,9 +355,14 @@ class PCIeAnalyzer(SoCSDRAM):
         self.add_csr("rx_capture")
         self.add_csr("rx_capture_exerciser_mem")
         self.add_csr("rx_capture_trigger_mem")
+        self.add_csr("rx_capture_length_histogram_mem")
+        self.add_csr("rx_capture_gap_histogram_mem")
+        self.add_csr("rx_capture_recorder_table")
 
         if use_gtp:
             self.comb += self.gtp0.source.connect(self.rx_capture.sink, omit={"valid"})
+            self.comb += self.rx_capture.linkError.eq(Cat(self.gtp0.rx_disperr != 0,
+                                                          self.gtp0.rx_notintable != 0))
 
         self.comb += [
             self.rx_capture.sink.valid.eq(gtp0_ready | self.rx_capture.simmode),
@@ -366,6 +373,7 @@ class PCIeAnalyzer(SoCSDRAM):
         # *                TX Capture Pipeline                    *
         # *********************************************************
 
+        # Reset values, rings are moved at run time (see allocate_rings)
         TX_RING_BUFFER_BASE_ADDRESS = 0x100000
         TX_RING_BUFFER_SIZE         = 0x100000
 
@@ -387,9 +395,14 @@ class PCIeAnalyzer(SoCSDRAM):
         self.add_csr("tx_capture")
         self.add_csr("tx_capture_exerciser_mem")
         self.add_csr("tx_capture_trigger_mem")
+        self.add_csr("tx_capture_length_histogram_mem")
+        self.add_csr("tx_capture_gap_histogram_mem")
+        self.add_csr("tx_capture_recorder_table")
 
         if use_gtp:
             self.comb += self.gtp1.source.connect(self.tx_capture.sink, omit={"valid"})
+            self.comb += self.tx_capture.linkError.eq(Cat(self.gtp1.rx_disperr != 0,
+                                                          self.gtp1.rx_notintable != 0))
 
         self.comb += [
             self.tx_capture.sink.valid.eq(gtp1_ready | self.tx_capture.simmode),
@@ -406,6 +419,15 @@ class PCIeAnalyzer(SoCSDRAM):
             self.rx_capture.trigExt.eq(self.tx_capture.trigOut),
         ]
 
+        # *********************************************************
+        # *                    UDP Streamer                       *
+        # *********************************************************
+        # Pushes recorded blocks to the host, see PushUploader
+        streamer_port = self.sdram.crossbar.get_port("read", 256)
+        udp_port      = self.eth_core.udp.crossbar.get_port(UDP_STREAMER_PORT, dw=32, cd="etherbone")
+        self.submodules.udp_streamer = UDPStreamer(streamer_port, udp_port)
+        self.add_csr("udp_streamer")
+
         # *********************************************************
         # *                           LEDs                        *
         # *********************************************************
@@ -14,6 +14,9 @@ from pcie_analyzer.descrambler.descrambler import *
 from pcie_analyzer.aligner.aligner import *
 from pcie_analyzer.filter.filters import *
 from pcie_analyzer.trigger.trigger import *
+from pcie_analyzer.rle.rle import *
+from pcie_analyzer.stats.stats import *
+from pcie_analyzer.histogram.histogram import *
 from pcie_analyzer.recorder.recorder import *
 from pcie_analyzer.exerciser.exerciser import *
 
@@ -46,6 +49,7 @@ class CapturePipeline(Module, AutoCSR):
         self.trigOut   = Signal()          # Inform another recorder that we trigged
         self.trigExt   = Signal()          # Another recorder has trigged
         self.time      = Signal(32)        # Time source
+        self.linkError = Signal(2)         # 8b/10b disparity and not in table errors
         self.simmode   = Signal()
 
         # *********************************************************
@@ -63,7 +67,11 @@ class CapturePipeline(Module, AutoCSR):
         self.submodules.detect      = ClockDomainsRenamer(clock_domain)(DetectOrderedSets())
         self.submodules.aligner     = ClockDomainsRenamer(clock_domain)(Aligner())
         self.submodules.filter      = Filter(clock_domain, filter_fifo_size)
+        self.submodules.stats       = TrafficStats(clock_domain)
+        self.submodules.length_histogram = Histogram(clock_domain)
+        self.submodules.gap_histogram    = Histogram(clock_domain)
         self.submodules.trigger     = Trigger(clock_domain, trigger_memory_size)
+        self.submodules.rle         = RunLengthEncoder(clock_domain)
         self.submodules.recorder    = RingRecorder(clock_domain, dram_port,
                                                    ring_buffer_base_address,
                                                    ring_buffer_size)
@@ -95,8 +103,24 @@ class CapturePipeline(Module, AutoCSR):
             self.filter.source.connect(self.trigger.sink),
             self.filter.ts.eq(self.time),
 
-            self.trigger.source.connect(self.recorder.sink),
+            self.filter.sink.connect(self.stats.sink, omit={"ready"}),
+            self.stats.tlp.eq(self.filter.tlp),
+            self.stats.dllp.eq(self.filter.dllp),
+            self.stats.error.eq(self.filter.error),
+            self.trigger.error[ERROR_CLASSES.index("filter")].eq(self.filter.error),
+            self.trigger.error[ERROR_CLASSES.index("disparity")].eq(self.linkError[0]),
+            self.trigger.error[ERROR_CLASSES.index("notintable")].eq(self.linkError[1]),
+            self.filter.sink.connect(self.trigger.link, omit={"ready"}),
+
+            self.length_histogram.valid.eq(self.filter.tlpEnd),
+            self.length_histogram.value.eq(self.filter.tlpLength),
+            self.gap_histogram.valid.eq(self.filter.frameStart),
+            self.gap_histogram.value.eq(self.filter.frameGap),
+
+            self.trigger.source.connect(self.rle.sink),
+            self.rle.source.connect(self.recorder.sink),
             self.trigger.enable.eq(self.recorder.enableTrigger),
+            self.trigger.time.eq(self.time),
             self.trigOut.eq(self.trigger.trigExt),
             self.filter.trigExt.eq(self.trigExt),
 
@@ -105,6 +129,8 @@ class CapturePipeline(Module, AutoCSR):
             self.record.eq(self.recorder.record),
 
             self.recorder.trigExt.eq(self.trigExt),
+            self.recorder.trigId.eq(self.trigger.trigId),
+            self.recorder.time.eq(self.time),
 
             self.cdc.source.connect(self.dma.sink),
         ]
@@ -72,6 +72,36 @@ filter_layout = [
     ("eof"    , 1),
 ]
 
+# Run length tokens (see RunLengthEncoder): records with time, sof and eof
+# set together, data = count | (period - 1) << RLE_COUNT_BITS. The last
+# period records are repeated to make count records.
+RLE_COUNT_BITS  = 13
+RLE_PERIOD_BITS = 3
+RLE_COUNT_MAX   = (1 << RLE_COUNT_BITS) - 1
+RLE_PERIOD_MAX  = 1 << RLE_PERIOD_BITS
+
+# Traffic statistics categories (see TrafficStats). Each one has a
+# <category>Frames and a <category>Symbols counter.
+STATS_CATEGORIES = ["tlp", "dllp", "skip", "fts", "ts1", "ts2", "idle"]
+
+# Trigger error classes (see Trigger errorEnable), one bit each: bad or
+# unterminated TLP/DLLP (Filter), nullified TLP (EDB), 8b/10b running
+# disparity and not in table (GTP) errors.
+ERROR_CLASSES = ["filter", "edb", "disparity", "notintable"]
+
+# Trigger link timeouts (see LinkMonitor), one bit each: no TLP or DLLP,
+# electrical idle (after EIOS) and TS1/TS2 training for too long.
+LINK_TIMEOUTS = ["inactivity", "elecidle", "training"]
+
+# Trigger stages (see Trigger). The pattern that fired is stored with
+# each DDR block on TRIG_ID_BITS bits (see RingRecorder).
+TRIGGER_STAGES = 4
+TRIG_ID_BITS   = (TRIGGER_STAGES - 1).bit_length()
+
+# Segmented recorder status table entry (see RingRecorder), one 32-bit
+# word each per segment.
+SEGMENT_TABLE = ["trigAddr", "wrAddr", "trigTime", "preCount", "postCount"]
+
 def recorder_layout(nb):
     payload = [
         ("data"   , 16 * nb),
@@ -98,6 +98,15 @@ class Filter(Module, AutoCSR):
         self.ts           = Signal(32)      # Global time stamp
         self.trigExt      = Signal()        # Insert a trigger flag
 
+        self.tlp          = Signal()        # Writer is in a TLP
+        self.dllp         = Signal()        # Writer is in a DLLP
+        self.error        = Signal()        # Bad TLP/DLLP detected
+
+        self.tlpEnd       = Signal()        # A TLP ends, tlpLength is valid
+        self.tlpLength    = Signal(32)      # TLP words after STP, END included
+        self.frameStart   = Signal()        # A TLP/DLLP starts, frameGap is valid
+        self.frameGap     = Signal(32)      # Time stamp ticks since the last TLP/DLLP end
+
         self.source       = source = stream.Endpoint(trigger_layout)
         self.sink         = sink   = stream.Endpoint(descrambler_layout)
 
@@ -133,6 +142,8 @@ class Filter(Module, AutoCSR):
         last_ts      = Signal(32)
         payload_cnt  = Signal(32)
         from_error   = Signal()
+        frame_end    = Signal()
+        end_ts       = Signal(32)
         ts_trig      = Signal()
 
         # *********************************************************
@@ -365,6 +376,26 @@ class Filter(Module, AutoCSR):
             )
         )
 
+        # *********************************************************
+        # *               Frame length and gap                    *
+        # *********************************************************
+        self.comb += [
+            self.tlp.eq(fsmWriter.ongoing("TLP")),
+            self.dllp.eq(fsmWriter.ongoing("DLLP")),
+            self.error.eq(fifo.sink.valid & fifo.sink.error),
+
+            # END is seen one word late, on buf_in
+            frame_end.eq((self.tlp | self.dllp) & buf_in.source.ctrl[0] & (buf_in.source.data[0:8] == END.value)),
+            self.tlpEnd.eq(self.tlp & frame_end),
+            self.tlpLength.eq(payload_cnt),
+
+            self.frameStart.eq(~fsmWriter.ongoing("NO_FILTER") & sink.ctrl[1] &
+                               ((sink.data[8:16] == STP.value) | (sink.data[8:16] == SDP.value))),
+            self.frameGap.eq(Mux(frame_end, 0, _ts - end_ts)),
+        ]
+
+        sync += If(frame_end, end_ts.eq(_ts))
+
 # ******************************************************************
 # * Reading side of the FIFO.                                      *
 # * Filtering takes place on the reading side of the FIFO.         *
@@ -0,0 +1,126 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from functools import reduce
+from operator import add
+
+from migen import *
+from migen.genlib.cdc import *
+
+from litex.soc.interconnect.csr import *
+
+from pcie_analyzer.common import *
+
+# *********************************************************
+# *                                                       *
+# *                      Histogram                        *
+# *                                                       *
+# *********************************************************
+
+# Counts values in nbins bins kept in block RAM. Bin 0 holds values
+# below edge0, bin i values from edge(i-1) to below edge(i), the last
+# bin values from the last edge up (edges must be increasing). Bins
+# saturate at 0xffffffff.
+#
+# A bin is updated in three clock cycles: values coming faster are
+# not counted. The host reads the bins in one burst from the mem CSR
+# memory, clear zeroes them in nbins clock cycles.
+
+class Histogram(Module, AutoCSR):
+    def __init__(self, clock_domain, nbins=16, width=32):
+
+        # *********************************************************
+        # *                    Interface                          *
+        # *********************************************************
+        self.enable = CSRStorage()             # Count values
+        self.clear  = CSR()                    # Zero all bins
+        self.nbins  = CSRConstant(nbins)
+
+        for i in range(nbins - 1):
+            setattr(self, "edge{:d}".format(i), CSRStorage(width, name="edge{:d}".format(i)))
+
+        self.valid  = Signal()                 # value is valid
+        self.value  = Signal(width)            # Value to count
+
+        # *********************************************************
+        # *                      Signals                          *
+        # *********************************************************
+        edges    = [Signal(width) for i in range(nbins - 1)]
+        slot     = Signal(max=nbins)
+        index    = Signal(max=nbins)
+        clear    = Signal()                    # Clear requested
+
+        _enable  = Signal()
+
+        # *********************************************************
+        # *                         CDC                           *
+        # *********************************************************
+        ps_clear = PulseSynchronizer("sys", clock_domain)
+        self.submodules += ps_clear
+
+        self.specials += MultiReg(self.enable.storage, _enable, clock_domain)
+        for i, edge in enumerate(edges):
+            self.specials += MultiReg(getattr(self, "edge{:d}".format(i)).storage, edge, clock_domain)
+
+        # *********************************************************
+        # *                     Specials                          *
+        # *********************************************************
+        self.specials.mem = Memory(32, nbins)
+        self.mem.bus_read_only = True
+        self.specials.port = port = self.mem.get_port(write_capable=True, clock_domain=clock_domain)
+
+        # *********************************************************
+        # *                    Combinatorial                      *
+        # *********************************************************
+        self.comb += [
+            ps_clear.i.eq(self.clear.re),
+            # Number of edges below or at value
+            slot.eq(reduce(add, [self.value >= edge for edge in edges], 0)),
+        ]
+
+        # *********************************************************
+        # *                        FSM                            *
+        # *********************************************************
+        fsm = FSM(reset_state="IDLE")
+        self.submodules.fsm = ClockDomainsRenamer(clock_domain)(fsm)
+
+        sync = getattr(self.sync, clock_domain)
+        sync += [
+            If(ps_clear.o,
+                clear.eq(1),
+            ).Elif(fsm.ongoing("CLEAR"),
+                clear.eq(0),
+            ),
+        ]
+
+        fsm.act("IDLE",
+            If(clear,
+                NextValue(index, 0),
+                NextState("CLEAR"),
+            ).Elif(_enable & self.valid,
+                NextValue(index, slot),
+                NextState("READ"),
+            )
+        )
+
+        fsm.act("READ",
+            port.adr.eq(index),
+            NextState("WRITE"),
+        )
+
+        fsm.act("WRITE",
+            port.adr.eq(index),
+            port.dat_w.eq(port.dat_r + (port.dat_r != 0xffffffff)),
+            port.we.eq(1),
+            NextState("IDLE"),
+        )
+
+        fsm.act("CLEAR",
+            port.adr.eq(index),
+            port.dat_w.eq(0),
+            port.we.eq(1),
+            NextValue(index, index + 1),
+            If(index == nbins - 1,
+                NextState("IDLE"),
+            )
+        )
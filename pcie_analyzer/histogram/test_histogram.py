@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+import bisect
+
+from migen import *
+
+from pcie_analyzer.histogram.histogram import *
+from pcie_analyzer.filter.filters import *
+from pcie_analyzer.common import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_data(typ, osets, ctrl, data):
+    return (typ << 20) + (osets << 18) + (ctrl << 16) + data
+
+def expected_bins(values, edges):
+    bins = [0]*(len(edges) + 1)
+    for value in values:
+        bins[bisect.bisect_right(edges, value)] += 1
+    return bins
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+LENGTH_EDGES = [4, 6, 8, 10, 12, 16, 20, 24, 32, 40, 48, 64, 96, 128, 256]
+GAP_EDGES    = [1, 2, 3, 4, 5, 6, 8, 10, 12, 14, 16, 20, 24, 28, 32]
+
+def make_stream():
+    """TLPs and DLLPs with random lengths and gaps, their lengths and gaps"""
+    random.seed(0)
+    datas   = [make_data(osetsType.DATA, 0, 0, 0x0000)]*8
+    lengths = []
+    gaps    = []
+    for i in range(300):
+        gap = random.randint(0, 30)
+        datas += [make_data(osetsType.DATA, 0, 0, 0x0000)]*gap
+        # The first gap is counted from time stamp 0
+        gaps.append(gap if i else 0xffffffff)
+        start = random.choice([STP.value, SDP.value])
+        words = random.randint(2, 60) if start == STP.value else 3
+        datas.append(make_data(osetsType.DATA, 0, 2, start << 8))
+        datas += [make_data(osetsType.DATA, 0, 0, random.getrandbits(16)) for j in range(words)]
+        datas.append(make_data(osetsType.DATA, 0, 1, END.value))
+        if start == STP.value:
+            lengths.append(words + 1)
+    datas += [make_data(osetsType.DATA, 0, 0, 0x0000)]*8
+    return datas, lengths, gaps
+
+# *********************************************************
+# *                                                       *
+# *                     Test bench                        *
+# *                                                       *
+# *********************************************************
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.filter  = Filter("sys", 64)
+        self.submodules.lengths = Histogram("sys")
+        self.submodules.gaps    = Histogram("sys")
+
+        # One time stamp tick per word
+        ts = Signal(32)
+        self.sync += ts.eq(ts + 1)
+
+        self.comb += [
+            self.filter.ts.eq(ts),
+            self.filter.source.ready.eq(1),
+            self.lengths.valid.eq(self.filter.tlpEnd),
+            self.lengths.value.eq(self.filter.tlpLength),
+            self.gaps.valid.eq(self.filter.frameStart),
+            self.gaps.value.eq(self.filter.frameGap),
+        ]
+
+def read_bins(histogram, nbins=16):
+    bins = []
+    for i in range(nbins):
+        bins.append((yield histogram.mem[i]))
+    return bins
+
+def main_generator(dut, datas):
+    yield from dut.filter.tlpDllpTimeoutCnt.write(100)
+    yield from dut.filter.filterEnable.write(1)
+    for histogram, edges in [(dut.lengths, LENGTH_EDGES), (dut.gaps, GAP_EDGES)]:
+        for i, edge in enumerate(edges):
+            yield from getattr(histogram, "edge{:d}".format(i)).write(edge)
+        yield from histogram.enable.write(1)
+    for i in range(10):
+        yield
+
+    sink = dut.filter.sink
+    yield sink.valid.eq(1)
+    for data in datas:
+        yield sink.payload.raw_bits().eq(data)
+        yield
+    for i in range(10):
+        yield
+
+    dut.length_bins = yield from read_bins(dut.lengths)
+    dut.gap_bins    = yield from read_bins(dut.gaps)
+
+    # Clear
+    yield from dut.lengths.clear.write(1)
+    for i in range(30):
+        yield
+    dut.cleared = yield from read_bins(dut.lengths)
+
+# *********************************************************
+# *                                                       *
+# *                   Run simulation                      *
+# *                                                       *
+# *********************************************************
+
+if __name__ == "__main__":
+    datas, lengths, gaps = make_stream()
+    tb = TB()
+    generators = {"sys": [main_generator(tb, datas)]}
+    run_simulation(tb, generators, {"sys": 10}, vcd_name="sim.vcd")
+
+    print("TLP lengths: {}".format(tb.length_bins))
+    print("Gaps:        {}".format(tb.gap_bins))
+    assert tb.length_bins == expected_bins(lengths, LENGTH_EDGES)
+    assert tb.gap_bins == expected_bins(gaps, GAP_EDGES)
+    assert tb.cleared == [0]*16
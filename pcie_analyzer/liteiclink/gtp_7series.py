@@ -10,7 +10,9 @@ from litex.soc.cores.clock import *
 from litex.soc.interconnect.csr import *
 from litex.soc.interconnect import stream
 from litex.soc.cores.prbs import PRBSTX, PRBSRX
-from litex.soc.cores.code_8b10b import Encoder, Decoder
+from litex.soc.cores.code_8b10b import Encoder, Decoder, K
+from litex.soc.cores.code_8b10b import table_5b6b, table_5b6b_unbalanced, table_5b6b_flip
+from litex.soc.cores.code_8b10b import table_3b4b, table_3b4b_unbalanced, table_3b4b_flip
 
 from liteiclink.transceiver.gtp_7series_init import GTPTXInit, GTPRXInit
 from liteiclink.transceiver.clock_aligner import BruteforceClockAligner
@@ -20,6 +22,102 @@ from liteiclink.transceiver.common import *
 class Open(Signal):
     pass
 
+# 8b/10b running disparity check of one sub-block (abcdei or fghj, a in
+# bit 0): returns the comb statements setting error and rd_out from
+# rd_in (1 = RD+). Neutral sub-blocks keep the disparity, but 111000
+# (1100) is only valid with RD- and 000111 (0011) with RD+.
+def disparity_check(bits, rd_in, rd_out, error):
+    n       = len(bits)
+    ones    = Signal(max=n + 1)
+    minus   = (1 << n//2) - 1               # a (f) first: 111000 (1100)
+    plus    = minus << (n - n//2)
+    return [
+        ones.eq(sum(bits[i] for i in range(n))),
+        rd_out.eq(rd_in),
+        error.eq(0),
+        If(ones == n//2,
+            error.eq(((bits == minus) & rd_in) | ((bits == plus) & ~rd_in)),
+        ).Elif(ones == n//2 + 1,
+            rd_out.eq(1),
+            error.eq(rd_in),
+        ).Elif(ones == n//2 - 1,
+            rd_out.eq(0),
+            error.eq(~rd_in),
+        ).Else(
+            error.eq(1),
+        )
+    ]
+
+# Valid control symbols
+K_CODES = [K(28, y) for y in range(8)] + [K(23, 7), K(27, 7), K(29, 7), K(30, 7)]
+
+# Model of the 8b/10b Encoder: return the symbol of d (a in bit 0) and
+# the running disparity after it, from rd (1 = RD+)
+def encode_8b10b(d, k, rd):
+    x, y = d & 0x1f, d >> 5
+    if k and x == 28:
+        code6b, unbalanced6b, flip6b = 0b110000, True, True
+    else:
+        code6b, unbalanced6b, flip6b = table_5b6b[x], table_5b6b_unbalanced[x], table_5b6b_flip[x]
+    output_6b = ~code6b & 0x3f if not rd and flip6b else code6b
+    rd        = rd ^ unbalanced6b
+    if not rd and y == 7 and (k or x in [17, 18, 20]):
+        output_4b, rd = 0b0111, 1
+    elif rd and y == 7 and (k or x in [11, 13, 14]):
+        output_4b, rd = 0b1000, 0
+    else:
+        flip4b    = k or table_3b4b_flip[y]
+        output_4b = ~table_3b4b[y] & 0xf if not rd and flip4b else table_3b4b[y]
+        rd        = rd ^ table_3b4b_unbalanced[y]
+    msb_first = (output_6b << 4) | output_4b
+    return int("{:010b}".format(msb_first)[::-1], 2), int(rd)
+
+# 1024 entries table, 1 for the symbols of a data or control byte with
+# either running disparity
+def code_table():
+    table = [0]*1024
+    for rd in [0, 1]:
+        for d in range(256):
+            table[encode_8b10b(d, 0, rd)[0]] = 1
+        for d in K_CODES:
+            table[encode_8b10b(d, 1, rd)[0]] = 1
+    return table
+
+# 8b/10b errors of nwords symbols (a in bit 0), registered like the
+# Decoder outputs: running disparity errors, carried from word to word
+# and across cycles, and symbols not in the code table (a ROM lookup).
+# A symbol not in the table may also give a disparity error.
+class SymbolChecker(Module):
+    def __init__(self, nwords):
+        self.input      = Signal(10*nwords)
+        self.disperr    = Signal(nwords)
+        self.notintable = Signal(nwords)
+
+        # # #
+
+        table = Memory(1, 1024, init=code_table())
+        self.specials += table
+
+        rd = Signal()
+        rds = [rd]
+        for i in range(nwords):
+            rd6  = Signal()
+            rd4  = Signal()
+            err6 = Signal()
+            err4 = Signal()
+            self.comb += disparity_check(self.input[10*i:10*i+6], rds[-1], rd6, err6)
+            self.comb += disparity_check(self.input[10*i+6:10*i+10], rd6, rd4, err4)
+            self.sync += self.disperr[i].eq(err6 | err4)
+            rds.append(rd4)
+
+            port = table.get_port()
+            self.specials += port
+            self.comb += [
+                port.adr.eq(self.input[10*i:10*(i+1)]),
+                self.notintable[i].eq(~port.dat_r),
+            ]
+        self.sync += rd.eq(rds[-1])
+
 class GTPQuadPLL(Module):
     def __init__(self, refclk, refclk_freq, linerate, channel=0, shared=False):
         assert channel in [0, 1]
@@ -175,6 +273,8 @@ class GTP(Module, AutoCSR):
         self.rx_prbs_errors = Signal(32)
         self.rx_cdr_lock    = Signal()
         self.rx_idle        = Signal()
+        self.rx_disperr     = Signal(data_width//10) # 8b/10b running disparity errors (rx domain)
+        self.rx_notintable  = Signal(data_width//10) # 8b/10b not in table errors (rx domain)
 
         # DRP
         self.drp = DRPInterface()
@@ -1016,6 +1116,14 @@ class GTP(Module, AutoCSR):
             self.comb += self.decoders[i].input.eq(rxdata[10*i:10*(i+1)])
         self.comb += self.rx_prbs.i.eq(rxdata)
 
+        # RX 8B/10B errors, with the decoded words -----------------------------------------------
+        self.submodules.rx_checker = ClockDomainsRenamer("rx")(SymbolChecker(nwords))
+        self.comb += [
+            self.rx_checker.input.eq(rxdata),
+            self.rx_disperr.eq(self.rx_checker.disperr),
+            self.rx_notintable.eq(self.rx_checker.notintable),
+        ]
+
         # Clock Aligner ----------------------------------------------------------------------------
         if clock_aligner:
             clock_aligner = BruteforceClockAligner(clock_aligner_comma, self.tx_clk_freq, check_period=10e-3)
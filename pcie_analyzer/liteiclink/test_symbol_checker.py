@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+from migen import *
+
+from litex.soc.cores.code_8b10b import Encoder
+
+from pcie_analyzer.liteiclink.gtp_7series import *
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+NWORDS = 2
+
+# Every data and control byte, then random ones
+def make_words():
+    random.seed(0)
+    words = [(d, 0) for d in range(256)] + [(d, 1) for d in K_CODES]
+    words += [random.choice(words) for i in range(200)]
+    return words
+
+# *********************************************************
+# *                                                       *
+# *                     Test bench                        *
+# *                                                       *
+# *********************************************************
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.encoder = Encoder(NWORDS, True)
+        self.submodules.checker = SymbolChecker(NWORDS)
+        self.symbols = Signal(10*NWORDS)
+        self.comb += self.checker.input.eq(self.symbols)
+        self.errors = []
+
+def main_generator(dut, words, corrupt):
+    # Encoder outputs, corrupted as told by corrupt(cycle, word, symbol)
+    for cycle in range(len(words)//NWORDS + 2):
+        pairs = words[NWORDS*cycle:NWORDS*(cycle + 1)]
+        for i, (d, k) in enumerate(pairs):
+            yield dut.encoder.d[i].eq(d)
+            yield dut.encoder.k[i].eq(k)
+        symbols = 0
+        for i in range(NWORDS):
+            symbol   = corrupt(cycle, i, (yield dut.encoder.output[i]))
+            symbols |= symbol << 10*i
+        yield dut.symbols.eq(symbols)
+        yield
+        dut.errors.append(((yield dut.checker.disperr), (yield dut.checker.notintable)))
+
+# *********************************************************
+# *                                                       *
+# *                   Run simulation                      *
+# *                                                       *
+# *********************************************************
+
+if __name__ == "__main__":
+    words = make_words()
+
+    # Every valid symbol in the table, with both running disparities
+    assert sum(code_table()) == len({encode_8b10b(d, k, rd)[0] for d, k in words for rd in [0, 1]})
+
+    # Clean stream: no error, once the encoder pipeline is filled
+    tb = TB()
+    run_simulation(tb, main_generator(tb, words, lambda cycle, i, symbol: symbol), vcd_name="sim.vcd")
+    print("Clean: {} errors".format(sum(e != (0, 0) for e in tb.errors[4:])))
+    assert tb.errors[4:] == [(0, 0)]*(len(tb.errors) - 4)
+
+    # abcdei fghj = 000001 1111 has five ones but is not a symbol. It is
+    # flagged with the disparity errors it gives, on the next cycle like
+    # the decoded words
+    def corrupt(cycle, i, symbol):
+        return 0b1111100000 if (cycle, i) == (50, 1) else symbol
+    tb = TB()
+    run_simulation(tb, main_generator(tb, words, corrupt), vcd_name="sim.vcd")
+    print("Errors: {}".format([(n, e) for n, e in enumerate(tb.errors[4:], 4) if e != (0, 0)]))
+    assert [n for n, (disperr, notintable) in enumerate(tb.errors[4:], 4) if notintable] == [51]
+    assert tb.errors[51] == (0b10, 0b10)
@@ -18,8 +18,30 @@ from pcie_analyzer.recorder.stream2 import StrideConverter2
 # *                                                       *
 # *********************************************************
 
+# Segmented capture: with `segments` set (N, 0 = off), the ring is split
+# in N segments of `segmentSize` bytes (a multiple of the block size)
+# from base. Each trigger fills its pre/post trigger window in its own
+# segment, a ring itself, then the recorder moves to the next segment
+# and re-arms the trigger, up to N segments. Re-arming is immediate: the
+# trigger is only blind (mem_size cycles) on the first arming after its
+# patterns were reloaded. The trigger and next write
+# addresses, the trigger time and the pre/post trigger counts of each
+# segment are written to the read-only `table` CSR memory, SEGMENT_TABLE
+# words per segment. Start is refused (`configError`) when the segments
+# are not block aligned, smaller than two blocks or do not fit in the
+# ring, or when there are more than `maxSegments` of them.
+#
+# The ring `base` and `length` (bytes, multiples of the block size) are
+# set at run time, their reset values are the build time ones. They are
+# checked against the DRAM seen by the port (`dramSize`) on start, and
+# the segments against the ring in segmented mode: a ring or segments
+# that do not fit are refused and flagged in `configError`.
+
 class RingRecorder(Module, AutoCSR):
-    def __init__(self, clock_domain, dram_port, base, length):
+    def __init__(self, clock_domain, dram_port, base, length, max_segments=16):
+
+        # DRAM seen by the port, in bytes (32-bit addresses)
+        dram_size = min(2**dram_port.address_width*(dram_port.data_width//8), 2**32)
 
         # *********************************************************
         # *                    Interface                          *
@@ -30,19 +52,33 @@ class RingRecorder(Module, AutoCSR):
         self.size     = CSRStorage(32)    # Post trigger size
         self.offset   = CSRStorage(32)    # Trigger offset (Pre trigger size)
         self.trigAddr = CSRStatus(32)     # Trigger storage address
+        self.wrAddr   = CSRStatus(32)     # Next storage address
         self.state    = CSRStatus(3)      # Etats FSM
         self.mode     = CSRStorage()      # 0 = RAW, 1 = FRAME
         self.preCount = CSRStatus(32)     # Frames written to memory
         self.postCount= CSRStatus(32)     # Frames written to memory
+        self.streaming= CSRStorage()      # 0 = One shot capture, 1 = Streaming
+        self.backpressure = CSRStorage()  # Streaming: 0 = Drop blocks when full, 1 = Stall
+        self.rdAddr   = CSRStorage(32)    # Streaming: next address the host will read
+        self.overruns = CSRStatus(32)     # Streaming: blocks dropped, ring was full
+        self.segments = CSRStorage(bits_for(max_segments)) # Segmented: number of segments (0 = off)
+        self.segmentSize = CSRStorage(32) # Segmented: segment size in bytes
+        self.segment  = CSRStatus(bits_for(max_segments))  # Segmented: segments filled
+        self.maxSegments = CSRConstant(max_segments)
+
+        self.base     = CSRStorage(32, reset=base)   # Ring base address
+        self.length   = CSRStorage(32, reset=length) # Ring length
+        self.configError = CSRStatus()    # Start refused, ring outside of the DRAM or bad segments
 
-        self.base     = CSRConstant(base)
-        self.length   = CSRConstant(length)
         self.dw       = CSRConstant(dram_port.data_width)
+        self.dramSize = CSRConstant(dram_size)
 
         self.enableTrigger = Signal()     # Signal to enable the trigger
         self.forced        = Signal()     # Another recorder ask us to record datas
         self.record        = Signal()     # Start the other recorder
         self.trigExt       = Signal()     # Another recorder has trigged
+        self.trigId        = Signal(TRIG_ID_BITS) # Trigger pattern that fired
+        self.time          = Signal(32)   # Time source
 
         self.source = source = stream.Endpoint([("address", dram_port.address_width),
                                                 ("data", dram_port.data_width)])
@@ -51,11 +87,13 @@ class RingRecorder(Module, AutoCSR):
         # *********************************************************
         # *                      Signals                          *
         # *********************************************************
-        addr      = Signal(dram_port.address_width)
+        addr      = Signal(32)                  # Byte address
         first     = Signal()
         ext_trig  = Signal()
         count     = Signal(32)
         sof_count = Signal(3)
+        sof       = Signal()                    # SOF record, not a run length token
+        eof       = Signal()                    # EOF record, not a run length token
 
         _trigExt  = Signal()
         _start    = Signal()
@@ -69,6 +107,32 @@ class RingRecorder(Module, AutoCSR):
         _mode     = Signal()
         _preCount = Signal(32)
         _postCount= Signal(32)
+        _streaming= Signal()
+        _backpressure = Signal()
+        _rdAddr   = Signal(32)
+        rd_toggle = Signal()                    # Flips on each rdAddr write
+        rd_last   = Signal(33)                  # Last rdAddr and toggle seen
+        _overruns = Signal(32)
+        next_addr = Signal(32)
+        full      = Signal()
+        drop      = Signal()                    # Streaming: block dropped, ring full
+        done      = Signal()                    # In DONE: stalling would hold finished
+        ring_base = Signal(32)                  # Ring, or current segment
+        ring_last = Signal(32)                  # Last block address
+        seg_base  = Signal(32)
+        next_segment = Signal()                 # Move to the next segment
+        trig_time = Signal(32)
+        table_index = Signal(max=len(SEGMENT_TABLE) + 1)
+
+        _segments    = Signal(bits_for(max_segments))
+        _segmentSize = Signal(32)
+        _segment     = Signal(bits_for(max_segments))
+
+        _base        = Signal(32)
+        _length      = Signal(32)
+        _configError = Signal()
+        config_ok    = Signal()                 # Ring fits in the DRAM
+        segments_ok  = Signal()                 # Segments fit in the ring
         
         # *********************************************************
         # *                      Constants                        *
@@ -98,12 +162,16 @@ class RingRecorder(Module, AutoCSR):
         SOF_COUNT_END = TRIG_EXT - SOF_COUNT_BITS
         SOF_COUNT = slice(SOF_COUNT_END,SOF_COUNT_START)
 
+        TRIG_ID_START = SOF_COUNT_END
+        TRIG_ID_END = SOF_COUNT_END - len(self.trigId)
+        TRIG_ID = slice(TRIG_ID_END,TRIG_ID_START)
+
         print("Memory data width        = {:d} bits".format(dram_port.data_width))
 
         trigger_nbits = len(stream.Endpoint(trigger_layout).payload.raw_bits())
         print("Trigger stream data size = {:d} bits".format(trigger_nbits))
 
-        recorder_reserved_bits = len(first) + VALID_TOKEN_BITS + len(_trigExt) + SOF_COUNT_BITS
+        recorder_reserved_bits = len(first) + VALID_TOKEN_BITS + len(_trigExt) + SOF_COUNT_BITS + len(self.trigId)
 
         data_per_chunk   = (dram_port.data_width - recorder_reserved_bits) // trigger_nbits
         print("Chunks per block         = {:d} ({:d} bits)".format(data_per_chunk, data_per_chunk * trigger_nbits))
@@ -118,7 +186,6 @@ class RingRecorder(Module, AutoCSR):
         # *********************************************************
         self.specials += MultiReg(self.start.re, _start, clock_domain)
         self.specials += MultiReg(self.stop.re, _stop, clock_domain)
-        self.specials += MultiReg(_finished, self.finished.status, "sys")
         self.specials += MultiReg(self.size.storage, _size, clock_domain)
         self.specials += MultiReg(self.offset.storage, _offset, clock_domain)
         self.specials += MultiReg(_trigAddr, self.trigAddr.status, "sys")
@@ -128,6 +195,36 @@ class RingRecorder(Module, AutoCSR):
         self.specials += MultiReg(self.trigExt, _trigExt, clock_domain)
         self.specials += MultiReg(_preCount, self.preCount.status, "sys")
         self.specials += MultiReg(_postCount, self.postCount.status, "sys")
+        self.specials += MultiReg(self.streaming.storage, _streaming, clock_domain)
+        self.specials += MultiReg(self.backpressure.storage, _backpressure, clock_domain)
+        self.specials += MultiReg(_overruns, self.overruns.status, "sys")
+        self.specials += MultiReg(self.segments.storage, _segments, clock_domain)
+        self.specials += MultiReg(self.segmentSize.storage, _segmentSize, clock_domain)
+        self.specials += MultiReg(_segment, self.segment.status, "sys")
+        self.specials += MultiReg(self.base.storage, _base, clock_domain)
+        self.specials += MultiReg(self.length.storage, _length, clock_domain)
+        self.specials += MultiReg(_configError, self.configError.status, "sys")
+
+        # The live pointers go through handshakes, a word at a time: the
+        # host always gets a consistent wrAddr, together with finished so
+        # that the final wrAddr is read once finished is set. A rdAddr
+        # write, flagged by its toggle, is taken once it arrives.
+        wr_sync = BusSynchronizer(len(addr) + 1, clock_domain, "sys")
+        rd_sync = BusSynchronizer(len(_rdAddr) + 1, "sys", clock_domain)
+        self.submodules += wr_sync, rd_sync
+        self.comb += [
+            wr_sync.i.eq(Cat(addr, _finished)),
+            Cat(self.wrAddr.status, self.finished.status).eq(wr_sync.o),
+            rd_sync.i.eq(Cat(self.rdAddr.storage, rd_toggle)),
+        ]
+        self.sync += If(self.rdAddr.re, rd_toggle.eq(~rd_toggle))
+
+        # *********************************************************
+        # *                     Specials                          *
+        # *********************************************************
+        self.specials.table = Memory(32, len(SEGMENT_TABLE)*max_segments)
+        self.table.bus_read_only = True
+        self.specials.table_port = table_port = self.table.get_port(write_capable=True, clock_domain=clock_domain)
         
         # *********************************************************
         # *                     Submodules                        *
@@ -146,9 +243,34 @@ class RingRecorder(Module, AutoCSR):
         # *********************************************************
         self.comb += [
             sink.connect(self.fifo.sink),
+
+            # Run length tokens have time, sof and eof set, they are not frames
+            sof.eq(fifo.source.sof & ~(fifo.source.time & fifo.source.eof)),
+            eof.eq(fifo.source.eof & ~(fifo.source.time & fifo.source.sof)),
             self.fifo.source.connect(stride.sink),
-            source.valid.eq(stride.source.valid),
-            stride.source.ready.eq(source.ready),
+
+            # DRAM address wrap, once the last block is written
+            If(_segments != 0,
+                ring_base.eq(seg_base),
+                ring_last.eq(seg_base + _segmentSize - ADDRINCR),
+            ).Else(
+                ring_base.eq(_base),
+                ring_last.eq(_base + _length - ADDRINCR),
+            ),
+            If(addr == ring_last,
+                next_addr.eq(ring_base),
+            ).Else(
+                next_addr.eq(addr + ADDRINCR),
+            ),
+
+            # Streaming: the ring is full when the next block would reach
+            # the host read pointer. Then blocks are dropped (and counted)
+            # or held, stalling the capture pipeline. The last block,
+            # flushed on stop, is never held.
+            full.eq(_streaming & (next_addr == _rdAddr)),
+            drop.eq(full & (~_backpressure | done)),
+            source.valid.eq(stride.source.valid & ~full),
+            stride.source.ready.eq(Mux(full, drop, source.ready)),
             source.address.eq(addr[log2_int(ADDRINCR):32]),
             source.data.eq(stride.source.payload.raw_bits()),
 
@@ -159,6 +281,7 @@ class RingRecorder(Module, AutoCSR):
             source.data[VALID_TOKEN_COUNT].eq(stride.valid_token_count),
             source.data[TRIG_EXT].eq(ext_trig),
             source.data[SOF_COUNT].eq(sof_count),
+            source.data[TRIG_ID].eq(self.trigId),
         ]
 
         # *********************************************************
@@ -167,30 +290,77 @@ class RingRecorder(Module, AutoCSR):
         sync = getattr(self.sync, clock_domain)
         sync += [
             # Count SOF
-            If(stride.sink.valid & stride.sink.ready & stride.sink.sof, sof_count.eq(sof_count + 1)),
+            If(stride.sink.valid & stride.sink.ready & sof, sof_count.eq(sof_count + 1)),
 
-            # DRAM address increment
+            # Block out of the converter
             If(stride.source.valid & stride.source.ready,
-                first.eq(0),
                 ext_trig.eq(0),
                 #If at the same time we get a SOF entering the converter, count it
-                If(stride.sink.valid & stride.sink.ready & stride.sink.sof,
+                If(stride.sink.valid & stride.sink.ready & sof,
                     sof_count.eq(1),
                 ).Else(
                     sof_count.eq(0),
                 ),
-                addr.eq(addr + ADDRINCR),
             ),
 
-            # DRAM address wrap
-            If(addr == (base + length - ADDRINCR), addr.eq(base)),
+            # DRAM address increment
+            If(source.valid & source.ready,
+                first.eq(0),
+                addr.eq(next_addr),
+            ),
+
+            # Streaming: block dropped
+            If(stride.source.valid & drop,
+                _overruns.eq(_overruns + 1),
+            ),
 
             If(fifo.source.trig & fifo.source.valid & (_state == 6), ext_trig.eq(1)),
 
             If(_state == 0,
-                addr.eq(base),
+                addr.eq(_base),
+                seg_base.eq(_base),
                 first.eq(1),
             ),
+
+            # Streaming: the read pointer restarts from base, then follows
+            # the host writes
+            rd_last.eq(rd_sync.o),
+            If(_state == 0,
+                _rdAddr.eq(_base),
+            ).Elif(rd_sync.o != rd_last,
+                _rdAddr.eq(rd_sync.o[:32]),
+            ),
+
+            # Segmented: the next segment starts with a new ring
+            If(next_segment,
+                addr.eq(seg_base + _segmentSize),
+                seg_base.eq(seg_base + _segmentSize),
+                first.eq(1),
+            ),
+        ]
+
+        # Ring check: block aligned, at least two blocks, inside the DRAM
+        self.comb += [
+            config_ok.eq((_base[:log2_int(ADDRINCR)] == 0) &
+                         (_length[:log2_int(ADDRINCR)] == 0) &
+                         (_length >= 2*ADDRINCR) &
+                         (_base + _length <= dram_size) &
+                         segments_ok),
+
+            # Segmented: block aligned segments of at least two blocks,
+            # all in the ring, and a table entry for each of them
+            segments_ok.eq((_segments == 0) |
+                           ((_segmentSize[:log2_int(ADDRINCR)] == 0) &
+                            (_segmentSize >= 2*ADDRINCR) &
+                            (_segments <= max_segments) &
+                            (_segments*_segmentSize <= _length))),
+        ]
+
+        # Segmented: status table entry of the current segment
+        self.comb += [
+            table_port.adr.eq(_segment*len(SEGMENT_TABLE) + table_index),
+            Case(table_index, {i: table_port.dat_w.eq(value) for i, value in
+                enumerate([_trigAddr, addr, trig_time, _preCount, _postCount])}),
         ]
 
         # *********************************************************
@@ -207,15 +377,24 @@ class RingRecorder(Module, AutoCSR):
             NextValue(self.enableTrigger, 0),
             NextValue(_finished, 1),
 
-            If(_start,
+            If(_start & ~config_ok,
+                NextValue(_configError, 1),
+            ).Elif(_start,
+                NextValue(_configError, 0),
                 NextValue(_finished, 0),
-                NextState("FILL_PRE_TRIG"),
+                NextValue(_segment, 0),
+                If(_streaming,
+                    NextValue(_overruns, 0),
+                    NextState("STREAM"),
+                ).Else(
+                    NextState("FILL_PRE_TRIG"),
+                ),
                 NextValue(self.record, 1),
                 stride.reset.eq(1),
                 NextValue(_preCount, 0),
                 NextValue(_postCount, 0),
             ),
-            If(_forced,
+            If(_forced & config_ok,
                 NextValue(_finished, 0),
                 stride.reset.eq(1),
                 NextState("FORCED"),
@@ -238,7 +417,7 @@ class RingRecorder(Module, AutoCSR):
                         NextValue(count, count + 1),
                         NextValue(_preCount, _preCount + 1),
                     ).Else(
-                        If(fifo.source.eof,
+                        If(eof,
                             NextValue(count, count + 1),
                             NextValue(_preCount, _preCount + 1),
                         )
@@ -258,6 +437,7 @@ class RingRecorder(Module, AutoCSR):
             If(stride.sink.ready & stride.sink.valid,
                 If(fifo.source.trig & fifo.source.valid,
                     NextValue(count, 0),
+                    NextValue(trig_time, self.time),
                     # If stride is complete, this next data will be in the
                     # next address block
                     If(stride.valid_token_count == data_per_chunk,
@@ -266,7 +446,7 @@ class RingRecorder(Module, AutoCSR):
                         NextValue(_trigAddr, addr),
                     ),
                     NextState("FILL_POST_TRIG"),
-                    If(fifo.source.eof & (_size == 1),
+                    If(eof & (_size == 1),
                         NextValue(stride.flush, 1),
                         NextValue(self.fifo.reset, 1),
                         NextState("DONE")
@@ -286,14 +466,20 @@ class RingRecorder(Module, AutoCSR):
             If(count == _size,
                 NextValue(stride.flush, 1),
                 NextValue(self.fifo.reset, 1),
-                NextState("DONE")
+                If(_segments != 0,
+                    NextValue(table_index, 0),
+                    NextValue(self.enableTrigger, 0),
+                    NextState("SEGMENT")
+                ).Else(
+                    NextState("DONE")
+                )
             ).Else(
                 If(stride.sink.ready & stride.sink.valid,
                     If(_mode == RAW_MODE,
                         NextValue(count, count + 1),
                         NextValue(_postCount, _postCount + 1),
                     ).Else(
-                        If(fifo.source.eof,
+                        If(eof,
                             NextValue(count, count + 1),
                             NextValue(_postCount, _postCount + 1),
                         )
@@ -308,10 +494,51 @@ class RingRecorder(Module, AutoCSR):
             )
         )
 
+        # Segmented: wait for the last block, write the table entry
+        # and go on with the next segment, or stop after the last one
+        fsm.act("SEGMENT",
+            NextValue(_state, 3),
+            NextValue(stride.flush, 0),
+            NextState("SEGMENT_TABLE"),
+            If(_stop,
+                NextState("ABORT")
+            )
+        )
+
+        fsm.act("SEGMENT_TABLE",
+            If(~stride.source.valid,
+                If(table_index != len(SEGMENT_TABLE),
+                    table_port.we.eq(1),
+                    NextValue(table_index, table_index + 1),
+                ).Else(
+                    NextValue(_segment, _segment + 1),
+                    If(_segment + 1 == _segments,
+                        NextState("DONE")
+                    ).Else(
+                        next_segment.eq(1),
+                        NextValue(count, 0),
+                        NextValue(_preCount, 0),
+                        NextValue(_postCount, 0),
+                        stride.reset.eq(1),
+                        NextState("FILL_PRE_TRIG")
+                    )
+                )
+            ),
+            If(_stop,
+                NextState("ABORT")
+            )
+        )
+
+        self.comb += done.eq(fsm.ongoing("DONE"))
+
+        # Finished once the last block, flushed on the way in, is written
+        # (or dropped) and addr moved past it
         fsm.act("DONE",
             NextValue(_state, 4),
             NextValue(self.enableTrigger, 0),
-            NextValue(_finished, 1),
+            If(~stride.flush & ~stride.source.valid,
+                NextValue(_finished, 1),
+            ),
             NextValue(self.fifo.reset, 1),
             NextValue(self.record, 0),
             NextValue(stride.flush, 0),
@@ -331,6 +558,20 @@ class RingRecorder(Module, AutoCSR):
             NextState("IDLE")
         )
 
+        # Streaming: record until stopped, the host drains the ring
+        # from rdAddr to wrAddr. On stop, the last block is flushed,
+        # finished is set once it is written and pointers are kept until
+        # the next stop.
+        fsm.act("STREAM",
+            NextValue(_state, 7),
+            NextValue(self.fifo.reset, 0),
+            If(fifo.source.trig & fifo.source.valid, NextValue(_trigAddr, addr)),
+            If(_stop,
+                NextValue(stride.flush, 1),
+                NextState("DONE")
+            )
+        )
+
         fsm.act("FORCED",
             NextValue(_state, 6),
             NextValue(self.fifo.reset, 0),
@@ -8,6 +8,7 @@ import csv
 from migen import *
 from migen.fhdl import *
 
+from litex.soc.interconnect import stream
 from litex.soc.interconnect.stream import *
 from litex.soc.interconnect.stream_sim import *
 from litex.soc.interconnect import csr
@@ -15,6 +16,8 @@ from litex.soc.interconnect import csr_bus
 
 from pcie_analyzer.recorder.recorder import *
 from pcie_analyzer.common import *
+from pcie_analyzer.software.decoder import RecordDecoder
+from pcie_analyzer.software.ring import RingCapture
 
 # *********************************************************
 # *                                                       *
@@ -154,17 +157,25 @@ class TB(Module):
         TX_RING_BUFFER_BASE_ADDRESS = 0x1000
         TX_RING_BUFFER_SIZE         = 0x1000
 
-        # Number of trigger_layout we want to put in recorder_layout
-        STRIDE_MULTIPLIER        = 12
+        self.dram = {}
+        self.rx_status = {}
 
-        self.submodules.rx_streamer = PacketStreamer(trigger_layout)
-        self.submodules.rx_recorder = RingRecorder("sys", port, RX_RING_BUFFER_BASE_ADDRESS, RX_RING_BUFFER_SIZE, STRIDE_MULTIPLIER)
-        self.submodules.tx_streamer = PacketStreamer(trigger_layout)
-        self.submodules.tx_recorder = RingRecorder("sys", port, TX_RING_BUFFER_BASE_ADDRESS, TX_RING_BUFFER_SIZE, STRIDE_MULTIPLIER)
+        # PacketStreamer only drives "data": stream raw trigger_layout records
+        raw_layout = [("data", len(stream.Endpoint(trigger_layout).payload.raw_bits()))]
+
+        self.submodules.rx_streamer = PacketStreamer(raw_layout)
+        self.submodules.rx_recorder = RingRecorder("sys", port, RX_RING_BUFFER_BASE_ADDRESS, RX_RING_BUFFER_SIZE)
+        self.submodules.tx_streamer = PacketStreamer(raw_layout)
+        self.submodules.tx_recorder = RingRecorder("sys", port, TX_RING_BUFFER_BASE_ADDRESS, TX_RING_BUFFER_SIZE)
+
+        for streamer, recorder in [(self.rx_streamer, self.rx_recorder), (self.tx_streamer, self.tx_recorder)]:
+            self.comb += [
+                recorder.sink.valid.eq(streamer.source.valid),
+                streamer.source.ready.eq(recorder.sink.ready),
+                recorder.sink.payload.raw_bits().eq(streamer.source.data),
+            ]
 
         self.comb += [
-            self.rx_streamer.source.connect(self.rx_recorder.sink),
-            self.tx_streamer.source.connect(self.tx_recorder.sink),
             self.tx_recorder.forced.eq(self.rx_recorder.record),
             self.rx_recorder.forced.eq(self.tx_recorder.record),
         ]
@@ -191,9 +202,10 @@ def main_generator(dut):
 
     yield dut.tx_recorder.source.ready.eq(1)
 
-    delay = 0
+    rx_delay = 0
+    tx_delay = 0
 
-    for i in range(1500):
+    for i in range(2500):
         if i == 20:
             yield from dut.rx_recorder.start.write(1)
             
@@ -202,20 +214,314 @@ def main_generator(dut):
         else:
             yield dut.rx_recorder.source.ready.eq(1)
 
-        if (yield dut.rx_recorder.finished.status):
-            delay = delay + 1
-            if (delay == 100):
+        if (i > 40) and (yield dut.rx_recorder.finished.status):
+            rx_delay = rx_delay + 1
+            if (rx_delay == 100):
+                # Pointers are reset on stop, save them first
+                dut.rx_status["trigAddr"] = (yield dut.rx_recorder.trigAddr.status)
+                dut.rx_status["wrAddr"]   = (yield dut.rx_recorder.wrAddr.status)
                 yield from dut.rx_recorder.stop.write(1)
 
         if i == 1000:
             yield from dut.tx_recorder.start.write(1)
-        if (yield dut.tx_recorder.finished.status):
-            delay = delay + 1
-            if (delay == 100):
+        if (i > 1020) and (yield dut.tx_recorder.finished.status):
+            tx_delay = tx_delay + 1
+            if (tx_delay == 100):
                 yield from dut.tx_recorder.stop.write(1)
 
         yield
 
+@passive
+def dram_generator(dut):
+    # Store RX recorder writes, indexed by block address
+    while True:
+        if (yield dut.rx_recorder.source.valid) & (yield dut.rx_recorder.source.ready):
+            dut.dram[(yield dut.rx_recorder.source.address)] = (yield dut.rx_recorder.source.data)
+        yield
+
+# *********************************************************
+# *                                                       *
+# *                  Check ring buffer                    *
+# *                                                       *
+# *********************************************************
+
+def check_ring(dut):
+    base   = dut.rx_recorder.base.storage.reset.value
+    length = dut.rx_recorder.length.storage.reset.value
+    dw     = dut.rx_recorder.dw.value.value
+    nb     = dut.rx_recorder.nb.value.value
+
+    buf = b"".join(dut.dram.get((base + i)//(dw//8), 0).to_bytes(dw//8, "little")
+                   for i in range(0, length, dw//8))
+
+    ring    = RingCapture.from_buffer(buf, base, length, dw, dut.rx_status["trigAddr"], dut.rx_status["wrAddr"])
+    records = ring.decode(buf, RecordDecoder(nb, dw))
+    print("Ring wrapped: {}, {} records from {:d} to {:d}".format(ring.wrapped, len(records),
+        records["data"][0], records["data"][-1]))
+
+    # Streamed datas are a counter, they must come back in order
+    assert ((records["data"][1:] - records["data"][:-1]) == 1).all()
+
+# *********************************************************
+# *                                                       *
+# *                    Streaming mode                     *
+# *                                                       *
+# *********************************************************
+
+STREAM_RING_BUFFER_SIZE = 0x200 # 16 blocks, filled much faster than drained
+STREAM_DRAIN_PERIOD     = 300   # Host drains the ring every STREAM_DRAIN_PERIOD cycles
+
+class StreamTB(Module):
+    def __init__(self, backpressure):
+        self.backpressure = backpressure
+
+        port = DummyPort(32, 256)
+
+        self.dram    = {}
+        self.drained = []
+        self.status  = {}
+
+        raw_layout = [("data", len(stream.Endpoint(trigger_layout).payload.raw_bits()))]
+
+        self.submodules.streamer = PacketStreamer(raw_layout)
+        self.submodules.recorder = RingRecorder("sys", port, 0, STREAM_RING_BUFFER_SIZE)
+
+        self.comb += [
+            self.recorder.sink.valid.eq(self.streamer.source.valid),
+            self.streamer.source.ready.eq(self.recorder.sink.ready),
+            self.recorder.sink.payload.raw_bits().eq(self.streamer.source.data),
+            self.recorder.source.ready.eq(1),
+        ]
+
+def drain(dut):
+    # Host side: copy blocks from rdAddr up to wrAddr, then free them
+    base   = (yield dut.recorder.base.storage)
+    length = (yield dut.recorder.length.storage)
+    incr   = dut.recorder.dw.value.value//8
+    rd     = (yield dut.recorder.rdAddr.storage)
+    wr     = (yield dut.recorder.wrAddr.status)
+    while rd != wr:
+        dut.drained.append(dut.dram[rd//incr])
+        rd = base if rd + incr == base + length else rd + incr
+    yield from dut.recorder.rdAddr.write(rd)
+
+def stream_generator(dut):
+    dut.streamer.send(Packet([make_data(0, 0, 0b11, i) for i in range(2000)]))
+
+    yield from dut.recorder.rdAddr.write((yield dut.recorder.base.storage))
+    yield from dut.recorder.backpressure.write(dut.backpressure)
+    yield from dut.recorder.streaming.write(1)
+    yield from dut.recorder.start.write(1)
+
+    for i in range(8000):
+        if i % STREAM_DRAIN_PERIOD == 0:
+            yield from drain(dut)
+        yield
+
+    # Stop flushes the last block, wrAddr is final once finished:
+    # drain it before the second stop
+    yield from dut.recorder.stop.write(1)
+    while not (yield dut.recorder.finished.status):
+        yield
+    yield from drain(dut)
+    dut.status["overruns"] = (yield dut.recorder.overruns.status)
+    yield from dut.recorder.stop.write(1)
+
+@passive
+def stream_dram_generator(dut):
+    while True:
+        if (yield dut.recorder.source.valid) & (yield dut.recorder.source.ready):
+            dut.dram[(yield dut.recorder.source.address)] = (yield dut.recorder.source.data)
+        yield
+
+def check_stream(dut):
+    dw = dut.recorder.dw.value.value
+    nb = dut.recorder.nb.value.value
+
+    buf     = b"".join(block.to_bytes(dw//8, "little") for block in dut.drained)
+    records = RecordDecoder(nb, dw).decode(buf)
+    print("Streaming (backpressure {}): {} blocks drained, {} records from {:d} to {:d}, {} overruns".format(
+        dut.backpressure, len(dut.drained), len(records), records["data"][0], records["data"][-1],
+        dut.status["overruns"]))
+
+    # Records streamed before start are not recorded
+    sent  = 2000 - records["data"][0]
+    steps = records["data"][1:] - records["data"][:-1]
+    assert records["data"][-1] == 1999
+    if dut.backpressure:
+        # Nothing is lost, the capture pipeline waits for the host
+        assert dut.status["overruns"] == 0
+        assert len(records) == sent
+        assert (steps == 1).all()
+    else:
+        # Blocks are dropped when the ring is full, but never overwritten
+        assert dut.status["overruns"] > 0
+        assert (steps >= 1).all()
+        assert len(records) == sent - dut.status["overruns"]*nb
+
+# *********************************************************
+# *                                                       *
+# *                    Segmented mode                     *
+# *                                                       *
+# *********************************************************
+
+SEGMENT_RING_BUFFER_SIZE = 0x1000
+SEGMENTS                 = 4
+SEGMENT_TRIGGERS         = [400, 800, 850, 1200, 1600]  # 850 comes during the post trigger fill
+
+class SegmentTB(Module):
+    def __init__(self):
+        port = DummyPort(32, 256)
+
+        self.dram  = {}
+        self.table = []
+
+        raw_layout = [("data", len(stream.Endpoint(trigger_layout).payload.raw_bits()))]
+
+        self.submodules.streamer = PacketStreamer(raw_layout)
+        self.submodules.recorder = RingRecorder("sys", port, 0, SEGMENT_RING_BUFFER_SIZE)
+
+        # One time tick per clock cycle
+        self.sync += self.recorder.time.eq(self.recorder.time + 1)
+
+        self.comb += [
+            self.recorder.sink.valid.eq(self.streamer.source.valid),
+            self.streamer.source.ready.eq(self.recorder.sink.ready),
+            self.recorder.sink.payload.raw_bits().eq(self.streamer.source.data),
+            self.recorder.source.ready.eq(1),
+        ]
+
+def segment_generator(dut):
+    dut.streamer.send(Packet([make_data(0, int(i in SEGMENT_TRIGGERS), 0b11, i) for i in range(2000)]))
+
+    yield from dut.recorder.offset.write(0x40)
+    yield from dut.recorder.size.write(0x40)
+    yield from dut.recorder.segments.write(SEGMENTS)
+
+    # Unaligned segments, then segments past the end of the ring: refused
+    dut.refused = []
+    for size in [SEGMENT_RING_BUFFER_SIZE//SEGMENTS - 0x10, SEGMENT_RING_BUFFER_SIZE//SEGMENTS + 0x20]:
+        yield from dut.recorder.segmentSize.write(size)
+        yield from dut.recorder.start.write(1)
+        for i in range(20):
+            yield
+        dut.refused.append(((yield dut.recorder.configError.status), (yield dut.recorder.state.status)))
+
+    yield from dut.recorder.segmentSize.write(SEGMENT_RING_BUFFER_SIZE//SEGMENTS)
+    yield from dut.recorder.start.write(1)
+
+    for i in range(3000):
+        yield
+    dut.finished = (yield dut.recorder.finished.status)
+    dut.segment  = (yield dut.recorder.segment.status)
+    for i in range(SEGMENTS*len(SEGMENT_TABLE)):
+        dut.table.append((yield dut.recorder.table[i]))
+
+def check_segments(dut):
+    dw  = dut.recorder.dw.value.value
+    nb  = dut.recorder.nb.value.value
+    seg = SEGMENT_RING_BUFFER_SIZE//SEGMENTS
+
+    assert dut.refused == [(1, 0), (1, 0)]
+    assert dut.finished and dut.segment == SEGMENTS
+    trigs = []
+    for i in range(SEGMENTS):
+        entry = dict(zip(SEGMENT_TABLE, dut.table[i*len(SEGMENT_TABLE):(i + 1)*len(SEGMENT_TABLE)]))
+        base  = i*seg
+        buf   = b"".join(dut.dram.get((base + j)//(dw//8), 0).to_bytes(dw//8, "little")
+                         for j in range(0, seg, dw//8))
+        ring    = RingCapture.from_buffer(buf, base, seg, dw, entry["trigAddr"], entry["wrAddr"])
+        records = ring.decode(buf, RecordDecoder(nb, dw))
+        trig    = records["data"][records["trig"] == 1]
+        print("Segment {}: {} records from {:d} to {:d}, trig {}, time {}".format(i, len(records),
+            records["data"][0], records["data"][-1], list(trig), entry["trigTime"]))
+
+        # Each segment holds its own pre/post trigger window
+        assert ((records["data"][1:] - records["data"][:-1]) == 1).all()
+        assert (entry["preCount"], entry["postCount"]) == (0x40, 0x40)
+        assert records["data"][0] <= trig[0] - 0x40 and records["data"][-1] >= trig[0] + 0x40 - 1
+        trigs.append(trig[0])
+
+    # The trigger during the post trigger fill is ignored, in time order
+    assert trigs == [400, 800, 1200, 1600]
+    times = [dut.table[i*len(SEGMENT_TABLE) + SEGMENT_TABLE.index("trigTime")] for i in range(SEGMENTS)]
+    assert times == sorted(times)
+
+# *********************************************************
+# *                                                       *
+# *                  Run time ring config                 *
+# *                                                       *
+# *********************************************************
+
+CONFIG_DRAM_ADDRESS_WIDTH = 10      # 32 KiB of DRAM
+CONFIG_RING_BASE          = 0x7e00  # Last 16 blocks of the DRAM
+CONFIG_RING_SIZE          = 0x200
+
+class ConfigTB(Module):
+    def __init__(self):
+        port = DummyPort(CONFIG_DRAM_ADDRESS_WIDTH, 256)
+
+        self.dram   = {}
+        self.status = {}
+
+        raw_layout = [("data", len(stream.Endpoint(trigger_layout).payload.raw_bits()))]
+
+        self.submodules.streamer = PacketStreamer(raw_layout)
+        self.submodules.recorder = RingRecorder("sys", port, 0, 0x1000)
+
+        self.comb += [
+            self.recorder.sink.valid.eq(self.streamer.source.valid),
+            self.streamer.source.ready.eq(self.recorder.sink.ready),
+            self.recorder.sink.payload.raw_bits().eq(self.streamer.source.data),
+            self.recorder.source.ready.eq(1),
+        ]
+
+def config_generator(dut):
+    dut.streamer.send(Packet([make_data(0, int(i == 700), 0b11, i) for i in range(1500)]))
+
+    yield from dut.recorder.offset.write(0x40)
+    yield from dut.recorder.size.write(0x40)
+
+    # Past the end of the DRAM: start is refused
+    yield from dut.recorder.base.write(CONFIG_RING_BASE)
+    yield from dut.recorder.length.write(2*CONFIG_RING_SIZE)
+    yield from dut.recorder.start.write(1)
+    for i in range(20):
+        yield
+    dut.status["refused"] = ((yield dut.recorder.configError.status), (yield dut.recorder.state.status))
+
+    # Up to the end of the DRAM
+    yield from dut.recorder.length.write(CONFIG_RING_SIZE)
+    yield from dut.recorder.start.write(1)
+    for i in range(2500):
+        yield
+    for name in ["configError", "finished", "trigAddr", "wrAddr"]:
+        dut.status[name] = (yield getattr(dut.recorder, name).status)
+
+def check_config(dut):
+    dw = dut.recorder.dw.value.value
+    nb = dut.recorder.nb.value.value
+
+    assert dut.recorder.dramSize.value.value == 0x8000
+    assert dut.status["refused"] == (1, 0)
+    assert dut.status["configError"] == 0 and dut.status["finished"]
+
+    # All blocks are written in the ring, which wrapped
+    addrs = [addr*(dw//8) for addr in dut.dram]
+    assert min(addrs) == CONFIG_RING_BASE and max(addrs) == CONFIG_RING_BASE + CONFIG_RING_SIZE - dw//8
+
+    buf = b"".join(dut.dram.get((CONFIG_RING_BASE + i)//(dw//8), 0).to_bytes(dw//8, "little")
+                   for i in range(0, CONFIG_RING_SIZE, dw//8))
+    ring    = RingCapture.from_buffer(buf, CONFIG_RING_BASE, CONFIG_RING_SIZE, dw,
+                                      dut.status["trigAddr"], dut.status["wrAddr"])
+    records = ring.decode(buf, RecordDecoder(nb, dw))
+    trig    = records["data"][records["trig"] == 1]
+    print("Run time ring: wrapped {}, {} records from {:d} to {:d}, trig {}".format(ring.wrapped,
+        len(records), records["data"][0], records["data"][-1], list(trig)))
+    assert ring.wrapped
+    assert ((records["data"][1:] - records["data"][:-1]) == 1).all()
+    assert list(trig) == [700]
+
 # *********************************************************
 # *                                                       *
 # *                   Run simulation                      *
@@ -226,9 +532,39 @@ if __name__ == "__main__":
     tb = TB()
     generators = {
         "sys" :   [main_generator(tb),
+                   dram_generator(tb),
                    tb.rx_streamer.generator(),
                    tb.tx_streamer.generator()]
     }
     clocks = {"sys": 10}
 
     run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+    check_ring(tb)
+
+    for backpressure in [1, 0]:
+        tb = StreamTB(backpressure)
+        generators = {
+            "sys" :   [stream_generator(tb),
+                       stream_dram_generator(tb),
+                       tb.streamer.generator()]
+        }
+        run_simulation(tb, generators, clocks)
+        check_stream(tb)
+
+    tb = SegmentTB()
+    generators = {
+        "sys" :   [segment_generator(tb),
+                   stream_dram_generator(tb),
+                   tb.streamer.generator()]
+    }
+    run_simulation(tb, generators, clocks)
+    check_segments(tb)
+
+    tb = ConfigTB()
+    generators = {
+        "sys" :   [config_generator(tb),
+                   stream_dram_generator(tb),
+                   tb.streamer.generator()]
+    }
+    run_simulation(tb, generators, clocks)
+    check_config(tb)
@@ -0,0 +1,122 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from migen import *
+from migen.genlib.cdc import *
+
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect import stream
+
+from pcie_analyzer.common import *
+
+# *********************************************************
+# *                                                       *
+# *                 Run Length Encoder                    *
+# *                                                       *
+# *********************************************************
+
+# A record is suppressed when it is the same as the record period places
+# before it and neither of them, nor any record in between, has a trig,
+# time, sof or eof flag. Runs of suppressed records are replaced by one
+# token record (see RLE_COUNT_BITS in common.py), sent when the run ends.
+# Flagged records are never suppressed and a run never refers to records
+# before the last flagged one: decoding can start on any flagged record.
+#
+# Period 1 compresses logical idle, period 2 SKP ordered sets and
+# period 8 TS1/TS2 ordered sets (two symbols per record). A period out
+# of 1 to RLE_PERIOD_MAX disables the encoder.
+
+class RunLengthEncoder(Module, AutoCSR):
+    def __init__(self, clock_domain):
+
+        # *********************************************************
+        # *                    Interface                          *
+        # *********************************************************
+        self.enable = CSRStorage()             # 0 = Records go through unchanged
+        self.period = CSRStorage(4, reset=1)   # Run period in records (1 to 8, else disabled), set before start
+
+        self.sink   =   sink = stream.Endpoint(trigger_layout)
+        self.source = source = stream.Endpoint(trigger_layout)
+
+        # *********************************************************
+        # *                      Signals                          *
+        # *********************************************************
+        hist      = Array(Signal(18) for i in range(RLE_PERIOD_MAX)) # Last records data and ctrl
+        clean     = Signal(max=RLE_PERIOD_MAX + 1)                   # Records without flags in hist
+        flags     = Signal()
+        match     = Signal()
+        absorb    = Signal()
+
+        hold      = Signal(len(sink.payload.raw_bits()))             # Record or token to send
+        hold_valid= Signal()
+        run       = Signal()                                         # hold is a token
+        count     = Signal(RLE_COUNT_BITS)
+
+        token     = stream.Endpoint(trigger_layout)
+
+        _enable   = Signal()
+        _period   = Signal(4)
+        period_ok = Signal()                                         # _period in 1 to RLE_PERIOD_MAX
+        index     = Signal(RLE_PERIOD_BITS)                          # hist index, _period - 1
+
+        # *********************************************************
+        # *                         CDC                           *
+        # *********************************************************
+        self.specials += MultiReg(self.enable.storage, _enable, clock_domain)
+        self.specials += MultiReg(self.period.storage, _period, clock_domain)
+
+        # *********************************************************
+        # *                    Combinatorial                      *
+        # *********************************************************
+        self.comb += [
+            flags.eq(sink.trig | sink.time | sink.sof | sink.eof),
+
+            period_ok.eq((_period != 0) & (_period <= RLE_PERIOD_MAX)),
+            index.eq(_period - 1),
+
+            # Same as period records before, nothing flagged since
+            match.eq(_enable & period_ok & sink.valid & ~flags & (clean >= _period) &
+                     (Cat(sink.data, sink.ctrl) == hist[index])),
+
+            # A running token takes the record in
+            absorb.eq(run & hold_valid & match & (count != RLE_COUNT_MAX)),
+
+            token.time.eq(1),
+            token.sof.eq(1),
+            token.eof.eq(1),
+            token.data.eq(Cat(count, index)),
+
+            source.valid.eq(hold_valid & ~absorb),
+            If(run,
+                source.payload.raw_bits().eq(token.payload.raw_bits()),
+            ).Else(
+                source.payload.raw_bits().eq(hold),
+            ),
+            sink.ready.eq(absorb | ~hold_valid | source.ready),
+        ]
+
+        # *********************************************************
+        # *                   Synchronous                         *
+        # *********************************************************
+        sync = getattr(self.sync, clock_domain)
+        sync += [
+            # Input history
+            If(sink.valid & sink.ready,
+                hist[0].eq(Cat(sink.data, sink.ctrl)),
+                [hist[i].eq(hist[i - 1]) for i in range(1, RLE_PERIOD_MAX)],
+                If(flags,
+                    clean.eq(0),
+                ).Elif(clean != RLE_PERIOD_MAX,
+                    clean.eq(clean + 1),
+                ),
+            ),
+
+            If(absorb,
+                count.eq(count + 1),
+            ).Elif((source.valid & source.ready) | ~hold_valid,
+                hold_valid.eq(sink.valid),
+                hold.eq(sink.payload.raw_bits()),
+                run.eq(match),
+                count.eq(1),
+            ),
+        ]
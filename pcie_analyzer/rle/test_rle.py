@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+import numpy as np
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from pcie_analyzer.rle.rle import *
+from pcie_analyzer.common import *
+from pcie_analyzer.software.decoder import record_dtype, expand_runs, run_tokens
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_data(eof, sof, time, trig, ctrl, data):
+    return (eof << 21) + (sof << 20) + (time << 19) + (trig << 18) + (ctrl << 16) + data
+
+def to_records(values):
+    records = np.zeros(len(values), dtype=record_dtype)
+    records["data"] = [v & 0xffff for v in values]
+    records["ctrl"] = [(v >> 16) & 3 for v in values]
+    records["trig"] = [(v >> 18) & 1 for v in values]
+    records["time"] = [(v >> 19) & 1 for v in values]
+    records["sof"]  = [(v >> 20) & 1 for v in values]
+    records["eof"]  = [(v >> 21) & 1 for v in values]
+    return records
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+IDLE = make_data(0, 0, 0, 0, 0b00, 0x0000)
+SKP0 = make_data(0, 0, 0, 0, 0b11, 0xbc1c) # COM SKP
+SKP1 = make_data(0, 0, 0, 0, 0b11, 0x1c1c) # SKP SKP
+
+def make_stream():
+    random.seed(0)
+    datas = []
+    for i in range(20):
+        datas += [IDLE]*random.randint(1, 300)
+        datas += [SKP0, SKP1]*random.randint(1, 20)
+        # A frame
+        datas.append(make_data(0, 1, 0, 0, 0b10, 0xfb00))
+        datas += [make_data(0, 0, 0, random.random() < 0.05, 0, random.getrandbits(16)) for j in range(10)]
+        datas += [make_data(0, 0, 0, 0, 0, 0x0000)]*12
+        datas.append(make_data(1, 0, 0, 0, 0b01, 0x00fd))
+        # A time stamp
+        datas.append(make_data(0, 0, 1, 0, 0, 0x1234))
+        datas.append(make_data(0, 0, 1, 0, 0, 0x5678))
+    # A run longer than a token can hold
+    datas += [IDLE]*(RLE_COUNT_MAX + 100)
+    datas.append(make_data(0, 1, 0, 0, 0, 0xffff))
+    return datas
+
+# *********************************************************
+# *                                                       *
+# *                     Test bench                        *
+# *                                                       *
+# *********************************************************
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.rle = RunLengthEncoder("sys")
+        self.received = []
+
+def main_generator(dut, datas, period):
+    yield from dut.rle.enable.write(1)
+    yield from dut.rle.period.write(period)
+    for i in range(4):
+        yield
+    sink = dut.rle.sink
+    i = 0
+    while i < len(datas):
+        valid = random.random() > 0.1
+        yield sink.valid.eq(valid)
+        yield sink.payload.raw_bits().eq(datas[i])
+        yield
+        if valid and (yield sink.ready):
+            i += 1
+    yield sink.valid.eq(0)
+    for i in range(20):
+        yield
+
+@passive
+def receive_generator(dut):
+    source = dut.rle.source
+    while True:
+        yield source.ready.eq(random.random() > 0.2)
+        yield
+        if (yield source.valid) & (yield source.ready):
+            dut.received.append((yield source.payload.raw_bits()))
+
+# *********************************************************
+# *                                                       *
+# *                   Run simulation                      *
+# *                                                       *
+# *********************************************************
+
+if __name__ == "__main__":
+    datas = make_stream()
+    for period in [1, 2]:
+        tb = TB()
+        generators = {"sys": [main_generator(tb, datas, period), receive_generator(tb)]}
+        run_simulation(tb, generators, {"sys": 10}, vcd_name="sim.vcd")
+
+        received = to_records(tb.received)
+        expanded = expand_runs(received)
+        print("Period {}: {} records, {} recorded ({} tokens)".format(
+            period, len(datas), len(received), run_tokens(received).sum()))
+        assert (expanded == to_records(datas)).all()
+        assert len(received) < len(datas)//4
+
+    # Periods the history does not hold: records go through unchanged
+    for period in [0, RLE_PERIOD_MAX + 1, 15]:
+        tb = TB()
+        generators = {"sys": [main_generator(tb, datas, period), receive_generator(tb)]}
+        run_simulation(tb, generators, {"sys": 10}, vcd_name="sim.vcd")
+
+        print("Period {}: {} records, {} recorded".format(period, len(datas), len(tb.received)))
+        assert tb.received == datas
@@ -0,0 +1,240 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import numpy as np
+
+from pcie_analyzer.common import *
+from pcie_analyzer.software.decoder import RecordDecoder, RunExpander, expand_runs
+from pcie_analyzer.software.timestamps import TimestampTracker
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+# Capture file: header_dtype header padded to HEADER_SIZE bytes, then the
+# raw DDR blocks in time order.
+# Index file (<capture>.idx): index_header_dtype header padded to
+# HEADER_SIZE bytes, then one index_dtype entry per SOF.
+
+CAPTURE_MAGIC   = b"PCIECAP\0"
+INDEX_MAGIC     = b"PCIEIDX\0"
+CAPTURE_VERSION = 1
+HEADER_SIZE     = 256
+
+DIRECTIONS = ["rx", "tx"]
+
+header_dtype = np.dtype([
+    ("magic"      , "S8"),
+    ("version"    , "<u4"),
+    ("header_size", "<u4"),
+    ("nb"         , "<u4"), # Records per block
+    ("dw"         , "<u4"), # Block size in bits
+    ("direction"  , "u1"),  # Index in DIRECTIONS
+    ("wrapped"    , "u1"),  # Ring wrapped during the capture
+    ("rle"        , "u1"),  # Blocks hold run length tokens
+    ("reserved"   , "V1"),
+    ("nblocks"    , "<u8"), # Blocks in the file
+    ("base"       , "<u8"), # Ring base address
+    ("length"     , "<u8"), # Ring length
+    ("trig_block" , "<i8"), # Trigger block in the file (-1: unknown)
+    ("layout"     , "S96"), # Record layout, "name:width,..."
+])
+
+index_header_dtype = np.dtype([
+    ("magic"      , "S8"),
+    ("version"    , "<u4"),
+    ("header_size", "<u4"),
+    ("count"      , "<u8"), # Index entries
+])
+
+index_dtype = np.dtype([
+    ("timestamp", "<i8"), # Frame timestamp (TS_UNKNOWN before the first time token)
+    ("record"   , "<u8"), # SOF record number in the capture (runs expanded)
+    ("block"    , "<u8"), # Block holding the SOF record
+    ("slot"     , "<u4"), # SOF record position in this block (as stored)
+])
+
+def layout_string(layout):
+    return ",".join("{}:{}".format(name, width) for name, width in layout)
+
+def index_filename(filename):
+    return filename + ".idx"
+
+def _header(dtype, **fields):
+    header = np.zeros(1, dtype=dtype)
+    for name, value in fields.items():
+        header[name] = value
+    return header.tobytes().ljust(HEADER_SIZE, b"\0")
+
+def _read_header(filename, dtype, magic):
+    header = np.fromfile(filename, dtype=dtype, count=1)
+    if len(header) != 1 or header["magic"][0] != magic.rstrip(b"\0"):
+        raise ValueError("{} is not a capture file".format(filename))
+    if header["version"][0] != CAPTURE_VERSION:
+        raise ValueError("{}: unsupported version {}".format(filename, header["version"][0]))
+    return header[0]
+
+# *********************************************************
+# *                                                       *
+# *                    CaptureWriter                      *
+# *                                                       *
+# *********************************************************
+
+class CaptureWriter:
+    """Write raw DDR blocks to a capture file and build its SOF index.
+
+    Blocks are given in time order (RingCapture.segments()) and are
+    decoded chunk by chunk to find SOF records and their timestamps.
+    With rle, blocks are stored as recorded and runs are expanded to
+    number records and follow time.
+    """
+    def __init__(self, filename, nb, dw, direction="rx", ring=None, chunk_blocks=1 << 16, rle=False):
+        self.filename  = filename
+        self.nb        = nb
+        self.dw        = dw
+        self.direction = DIRECTIONS.index(direction)
+        self.ring      = ring
+        self.rle       = rle
+        self.decoder   = RecordDecoder(nb, dw, chunk_blocks=chunk_blocks)
+        self.expander  = RunExpander()
+        self.tracker   = TimestampTracker()
+        self.nblocks   = 0
+        self.nrecords  = 0
+        self.nindex    = 0
+
+        self._file  = open(filename, "wb")
+        self._index = open(index_filename(filename), "wb")
+        self._file.write(bytes(HEADER_SIZE))
+        self._index.write(bytes(HEADER_SIZE))
+
+    def write(self, buf):
+        """Append the blocks of buf to the capture"""
+        view = memoryview(buf).cast("B")
+        if len(view) % self.decoder.block_size:
+            raise ValueError("Capture data must be made of {} bytes blocks".format(self.decoder.block_size))
+        self._file.write(view)
+
+        # Stored record number of the first record of each block
+        counts = self.decoder.metadata(view)["count"]
+        starts = np.cumsum(counts, dtype=np.int64) - counts
+        for first, words in self.decoder.chunks(view):
+            size    = self.decoder.block_size
+            offset  = int(starts[first]) if len(starts) else 0
+            records = self.decoder.decode(view[first*size:(first + len(words))*size])
+            stored  = np.arange(len(records))
+            if self.rle:
+                records, stored = self.expander.update(records, with_source=True)
+            ts      = self.tracker.update(records)
+            sof     = np.flatnonzero(records["sof"].astype(bool) & ~records["time"].astype(bool))
+            block   = np.searchsorted(starts, offset + stored[sof], "right") - 1
+            index = np.empty(len(sof), dtype=index_dtype)
+            index["timestamp"] = ts[sof]
+            index["record"]    = self.nrecords + sof
+            index["block"]     = self.nblocks + block
+            index["slot"]      = offset + stored[sof] - starts[block]
+            self._index.write(index.tobytes())
+            self.nindex   += len(index)
+            self.nrecords += len(records)
+
+        self.nblocks  += len(counts)
+
+    def close(self):
+        ring = self.ring
+        self._file.seek(0)
+        self._file.write(_header(header_dtype,
+            magic       = CAPTURE_MAGIC,
+            version     = CAPTURE_VERSION,
+            header_size = HEADER_SIZE,
+            nb          = self.nb,
+            dw          = self.dw,
+            direction   = self.direction,
+            wrapped     = ring.wrapped if ring is not None else 0,
+            rle         = self.rle,
+            nblocks     = self.nblocks,
+            base        = ring.base if ring is not None else 0,
+            length      = ring.length if ring is not None else 0,
+            trig_block  = ring.trig_index if ring is not None else -1,
+            layout      = layout_string(trigger_layout)))
+        self._index.seek(0)
+        self._index.write(_header(index_header_dtype,
+            magic       = INDEX_MAGIC,
+            version     = CAPTURE_VERSION,
+            header_size = HEADER_SIZE,
+            count       = self.nindex))
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# *********************************************************
+# *                                                       *
+# *                     CaptureFile                       *
+# *                                                       *
+# *********************************************************
+
+class CaptureFile:
+    """Memory mapped capture file and SOF index.
+
+    Nothing is loaded: blocks and index entries are numpy.memmap views,
+    frames are found by timestamp with a binary search on the index and
+    only the blocks they span are decoded.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.header   = _read_header(filename, header_dtype, CAPTURE_MAGIC)
+        if self.header["layout"].decode() != layout_string(trigger_layout):
+            raise ValueError("{}: unsupported record layout {}".format(filename, self.header["layout"].decode()))
+
+        self.nb        = int(self.header["nb"])
+        self.dw        = int(self.header["dw"])
+        self.direction = DIRECTIONS[self.header["direction"]]
+        self.nblocks   = int(self.header["nblocks"])
+        self.rle       = bool(self.header["rle"])
+        self.decoder   = RecordDecoder(self.nb, self.dw, rle=self.rle)
+
+        self.blocks = self._memmap(filename, self.header, "u1", self.nblocks*self.decoder.block_size)
+
+        index_header = _read_header(index_filename(filename), index_header_dtype, INDEX_MAGIC)
+        self.index   = self._memmap(index_filename(filename), index_header, index_dtype, int(index_header["count"]))
+
+    @staticmethod
+    def _memmap(filename, header, dtype, count):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode="r", offset=int(header["header_size"]), shape=(count,))
+
+    def __len__(self):
+        """Number of frames (SOF records)"""
+        return len(self.index)
+
+    def find(self, timestamp):
+        """Return the number of the first frame starting at or after timestamp"""
+        return int(np.searchsorted(self.index["timestamp"], timestamp, "left"))
+
+    def decode_blocks(self, first, count=None):
+        """Decode count blocks (None: up to the end) from block first"""
+        last = self.nblocks if count is None else min(first + count, self.nblocks)
+        size = self.decoder.block_size
+        return self.decoder.decode(self.blocks[first*size:last*size])
+
+    def frame(self, n):
+        """Decode the records of frame n, up to the next SOF record"""
+        entry = self.index[n]
+        first = int(entry["block"])
+        size  = self.decoder.block_size
+        if n + 1 < len(self.index):
+            end    = self.index[n + 1]
+            blocks = self.blocks[first*size:(int(end["block"]) + 1)*size]
+            last   = self.decoder.metadata(blocks)["count"][:-1].sum(dtype=np.int64) + int(end["slot"])
+        else:
+            blocks = self.blocks[first*size:]
+            last   = None
+        # Runs never refer to records before a SOF: the frame expands on its own
+        records = self.decoder.decode(blocks, expand=False)[entry["slot"]:last]
+        return expand_runs(records) if self.rle else records
@@ -0,0 +1,88 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+# Ring left to a recorder that is not used (it may still be forced to
+# record by the other one)
+IDLE_RING_LENGTH = 0x10000
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def check_ring(base, length, dram_size, dw, segments=0, segment_size=0):
+    """Raise ValueError if the recorder would refuse the ring or its segments (see configError)"""
+    block = dw//8
+    if base % block or length % block:
+        raise ValueError("Ring base and length must be multiples of {} bytes".format(block))
+    if length < 2*block:
+        raise ValueError("Ring must hold at least two blocks")
+    if base + length > dram_size:
+        raise ValueError("Ring 0x{:08x}-0x{:08x} is outside of the DRAM (0x{:08x} bytes)".format(
+            base, base + length, dram_size))
+    if segments:
+        if segment_size % block or segment_size < 2*block:
+            raise ValueError("Segments must be multiples of {} bytes, two blocks at least".format(block))
+        if segments*segment_size > length:
+            raise ValueError("{} segments of {} bytes do not fit in the ring".format(segments, segment_size))
+
+def split_ddr(dram_size, dw, weights, reserved=0, idle_length=IDLE_RING_LENGTH):
+    """Split the DRAM from reserved up into consecutive rings, return [(base, length)].
+
+    Rings get DRAM in proportion to their weights, rings with a 0 weight
+    only get idle_length bytes: a single capturing direction can take
+    most of the DDR.
+    """
+    block = dw//8
+    total = sum(weights)
+    if not total:
+        raise ValueError("At least one ring needs a non zero weight")
+    idle  = idle_length//block*block
+    free  = (dram_size - reserved)//block - weights.count(0)*idle//block
+    rings = []
+    base  = -(-reserved//block)*block
+    for i, weight in enumerate(weights):
+        length = (free*weight//total)*block if weight else idle
+        rings.append((base, length))
+        base += length
+    for base, length in rings:
+        check_ring(base, length, dram_size, dw)
+    return rings
+
+# *********************************************************
+# *                                                       *
+# *                   Recorder rings                      *
+# *                                                       *
+# *********************************************************
+
+def recorder_ring(wb, name):
+    """Return the (base, length) ring of a recorder"""
+    return getattr(wb.regs, name + "_base").read(), getattr(wb.regs, name + "_length").read()
+
+def set_recorder_ring(wb, name, base, length):
+    """Move the ring of a stopped recorder, checked against the DRAM size and its segments"""
+    check_ring(base, length, getattr(wb.constants, name + "_dramsize"), getattr(wb.constants, name + "_dw"),
+               getattr(wb.regs, name + "_segments").read(), getattr(wb.regs, name + "_segmentSize").read())
+    getattr(wb.regs, name + "_base").write(base)
+    getattr(wb.regs, name + "_length").write(length)
+
+def allocate_rings(wb, weights, reserved=0, idle_length=IDLE_RING_LENGTH):
+    """Share the DRAM between recorders, weights is {name: weight}. Return {name: (base, length)}.
+
+    For example {"rx_capture_recorder": 1, "tx_capture_recorder": 0}
+    gives nearly all the DDR to RX when only RX is captured.
+    """
+    names     = list(weights)
+    dram_size = getattr(wb.constants, names[0] + "_dramsize")
+    dw        = getattr(wb.constants, names[0] + "_dw")
+    rings     = split_ddr(dram_size, dw, [weights[name] for name in names], reserved, idle_length)
+    for name, (base, length) in zip(names, rings):
+        set_recorder_ring(wb, name, base, length)
+    return dict(zip(names, rings))
@@ -0,0 +1,275 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import numpy as np
+
+from pcie_analyzer.common import *
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+# Meta data position in DDR blocks, counted from the MSb (see RingRecorder,
+# TRIG_ID_BITS is in common.py)
+VALID_TOKEN_BITS = 5
+SOF_COUNT_BITS   = 3
+
+RECORD_START      = 1
+VALID_TOKEN_COUNT = (RECORD_START + VALID_TOKEN_BITS, VALID_TOKEN_BITS)
+TRIG_EXT          = RECORD_START + VALID_TOKEN_BITS + 1
+SOF_COUNT         = (TRIG_EXT + SOF_COUNT_BITS, SOF_COUNT_BITS)
+TRIG_ID           = (SOF_COUNT[0] + TRIG_ID_BITS, TRIG_ID_BITS)
+
+# One decoded trigger_layout record
+record_dtype = np.dtype([(name, "<u2" if width > 8 else "u1") for name, width in trigger_layout])
+
+# Meta data of one DDR block
+block_dtype = np.dtype([
+    ("first"    , "u1"), # Block written first after recorder start
+    ("count"    , "u1"), # Number of valid records in the block
+    ("trig_ext" , "u1"), # Other recorder trigged while recording this block
+    ("sof_count", "u1"), # Number of SOF in this block
+    ("trig_id"  , "u1"), # Trigger pattern that fired (see Trigger fired)
+])
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def _field(words, offset, width):
+    """Extract a bit field (width <= 32) from each row of little endian 32-bit words"""
+    index, shift = divmod(offset, 32)
+    value = words[:, index] >> np.uint32(shift)
+    if shift + width > 32:
+        value = value | (words[:, index + 1] << np.uint32(32 - shift))
+    return value & np.uint32((1 << width) - 1)
+
+# *********************************************************
+# *                                                       *
+# *                  Run length tokens                    *
+# *                                                       *
+# *********************************************************
+
+def run_tokens(records):
+    """Return the mask of the RunLengthEncoder tokens of records"""
+    return (records["time"] & records["sof"] & records["eof"]).astype(bool)
+
+def token_runs(records):
+    """Return the (count, period) of each token of records"""
+    data = records["data"].astype(np.int64)
+    return data & RLE_COUNT_MAX, (data >> RLE_COUNT_BITS) + 1
+
+class RunExpander:
+    """Expand RunLengthEncoder tokens back into the records they replace.
+
+    A token with (count, period) stands for count records repeating the
+    last period records. Records are given chunk by chunk: the last
+    records are carried over for runs starting a chunk. A token whose
+    period records were not decoded (decoding started after them) is
+    dropped. Runs are expanded with index arithmetic, without any per
+    token Python loop.
+    """
+    def __init__(self):
+        self.last = np.empty(0, dtype=record_dtype) # Last RLE_PERIOD_MAX records
+
+    def _runs(self, records):
+        """Return the tokens of records, their periods and the number of records each record expands to"""
+        tokens = np.flatnonzero(run_tokens(records))
+        counts, periods = token_runs(records[tokens])
+        lengths = np.ones(len(records), dtype=np.int64)
+        lengths[tokens] = counts
+        # Tokens without their period records: only possible while less
+        # than RLE_PERIOD_MAX records were expanded
+        position = len(self.last)
+        previous = 0
+        for token, count, period in zip(tokens, counts, periods):
+            if position >= RLE_PERIOD_MAX:
+                break
+            position += token - previous
+            if position < period:
+                lengths[token] = 0
+            else:
+                position += count
+            previous = token + 1
+        return tokens, periods, lengths
+
+    def lengths(self, records):
+        """Return the number of records each record expands to (1 for literal records)"""
+        return self._runs(records)[2]
+
+    def update(self, records, with_source=False):
+        """Return records with tokens expanded.
+
+        With with_source, also return the index in records each expanded
+        record comes from (its token for repeated records).
+        """
+        tokens, periods, lengths = self._runs(records)
+        if not len(tokens):
+            out    = records
+            source = np.arange(len(records))
+        else:
+            # Positions in the last records followed by the expanded ones
+            nlast    = len(self.last)
+            source   = np.repeat(np.arange(len(records)), lengths)
+            starts   = nlast + np.cumsum(lengths) - lengths
+            period   = np.zeros(len(records), dtype=np.int64)
+            period[tokens] = periods
+            position = np.arange(nlast + len(source))
+            ref      = position.copy()
+            repeated = np.flatnonzero(period[source] != 0)
+            run_start  = starts[source[repeated]]
+            run_period = period[source[repeated]]
+            # A repeated record copies the one period records before its
+            # run: follow the copies down to a literal record
+            ref[nlast + repeated] = run_start - run_period + (nlast + repeated - run_start) % run_period
+            while True:
+                next_ref = ref[ref]
+                if (next_ref == ref).all():
+                    break
+                ref = next_ref
+            # Literal records are taken from the last records or records
+            pool     = np.concatenate([self.last, records])
+            pool_ref = position.copy()
+            pool_ref[nlast:] = nlast + source
+            out = pool[pool_ref[ref[nlast:]]]
+
+        self.last = np.concatenate([self.last, out[-RLE_PERIOD_MAX:]])[-RLE_PERIOD_MAX:]
+        return (out, source) if with_source else out
+
+def expand_runs(records):
+    """Expand the tokens of records, without any previous records (see RunExpander)"""
+    return RunExpander().update(records)
+
+# *********************************************************
+# *                                                       *
+# *                      Decoder                          *
+# *                                                       *
+# *********************************************************
+
+class RecordDecoder:
+    """Decode RingRecorder DDR blocks into trigger_layout records.
+
+    Each dw bits block holds nb records stored field by field (all the
+    data, then all the ctrl, ...) as produced by StrideConverter2, plus
+    meta data in the upper bits. Only the valid records of each block
+    are returned. Buffers are processed chunk_blocks blocks at a time,
+    without any per record Python loop.
+
+    With rle, the capture went through a RunLengthEncoder: tokens are
+    expanded, decode() results hold the records that were captured.
+    """
+    def __init__(self, nb, dw, chunk_blocks=1 << 16, rle=False):
+        self.nb           = nb
+        self.dw           = dw
+        self.block_size   = dw//8
+        self.chunk_blocks = chunk_blocks
+        self.rle          = rle
+
+        # Bit offset of each record field in a block
+        self.fields = []
+        offset = 0
+        for name, width in trigger_layout:
+            self.fields.append((name, offset, width))
+            offset += width*nb
+        assert offset <= dw - TRIG_ID[0]
+
+    @classmethod
+    def from_constants(cls, constants, name, **kwargs):
+        """Build a decoder from the <name>_nb and <name>_dw CSR constants"""
+        return cls(getattr(constants, name + "_nb"), getattr(constants, name + "_dw"), **kwargs)
+
+    def blocks(self, buf):
+        """View buf as an array of blocks of 32-bit words (no copy)"""
+        words = np.frombuffer(buf, dtype="<u4")
+        nwords = self.dw//32
+        return words[:len(words) - len(words) % nwords].reshape(-1, nwords)
+
+    def _metadata(self, words):
+        meta = np.empty(len(words), dtype=block_dtype)
+        meta["first"]     = _field(words, self.dw - RECORD_START, 1)
+        meta["count"]     = np.minimum(_field(words, self.dw - VALID_TOKEN_COUNT[0], VALID_TOKEN_COUNT[1]), self.nb)
+        meta["trig_ext"]  = _field(words, self.dw - TRIG_EXT, 1)
+        meta["sof_count"] = _field(words, self.dw - SOF_COUNT[0], SOF_COUNT[1])
+        meta["trig_id"]   = _field(words, self.dw - TRIG_ID[0], TRIG_ID[1])
+        return meta
+
+    def metadata(self, buf):
+        """Return the block_dtype meta data of each block of buf"""
+        return self._metadata(self.blocks(buf))
+
+    def _decode_field(self, words, offset, width):
+        if width == 16 and offset % 16 == 0:
+            # Half word aligned field: plain view on the blocks
+            return words.view("<u2")[:, offset//16:offset//16 + self.nb]
+        field = np.empty((len(words), self.nb), dtype=np.uint32)
+        if width*self.nb <= 32:
+            # Narrow field: extract all the records at once, then split
+            area = _field(words, offset, width*self.nb)
+            mask = np.uint32((1 << width) - 1)
+            for i in range(self.nb):
+                np.bitwise_and(area >> np.uint32(i*width), mask, out=field[:, i])
+        else:
+            for i in range(self.nb):
+                field[:, i] = _field(words, offset + i*width, width)
+        return field
+
+    def _decode_chunk(self, words, counts, out):
+        valid = None
+        if (counts != self.nb).any():
+            valid = np.arange(self.nb) < counts[:, np.newaxis]
+        for name, offset, width in self.fields:
+            field = self._decode_field(words, offset, width)
+            out[name] = field.reshape(-1) if valid is None else field[valid]
+
+    def chunks(self, buf):
+        """Yield (first block index, block words) chunks of buf"""
+        words = self.blocks(buf)
+        for first in range(0, len(words), self.chunk_blocks):
+            yield first, words[first:first + self.chunk_blocks]
+
+    def count(self, buf):
+        """Return the number of valid records in buf (expanded with rle)"""
+        if self.rle:
+            # Sum the run lengths, without expanding
+            return int(RunExpander().lengths(self.decode(buf, expand=False)).sum())
+        return int(self.metadata(buf)["count"].sum(dtype=np.int64))
+
+    def decode(self, buf, out=None, expand=True):
+        """Decode buf into a record_dtype array (allocated when out is None).
+
+        With rle, tokens are expanded unless expand is False.
+        """
+        if self.rle and expand:
+            records = expand_runs(self.decode(buf, expand=False))
+            if out is None:
+                return records
+            if len(out) != len(records):
+                raise ValueError("Output holds {} records, {} expected".format(len(out), len(records)))
+            out[:] = records
+            return out
+        counts = self.metadata(buf)["count"]
+        total  = int(counts.sum(dtype=np.int64))
+        if out is None:
+            out = np.empty(total, dtype=record_dtype)
+        elif len(out) != total:
+            raise ValueError("Output holds {} records, {} expected".format(len(out), total))
+        position = 0
+        for first, words in self.chunks(buf):
+            chunk_counts = counts[first:first + len(words)]
+            n = int(chunk_counts.sum(dtype=np.int64))
+            self._decode_chunk(words, chunk_counts, out[position:position + n])
+            position += n
+        return out
+
+    def iter_decode(self, buf):
+        """Yield decoded record arrays chunk by chunk (bounded memory)"""
+        expander = RunExpander()
+        for first, words in self.chunks(buf):
+            counts = self._metadata(words)["count"]
+            out = np.empty(int(counts.sum(dtype=np.int64)), dtype=record_dtype)
+            self._decode_chunk(words, counts, out)
+            yield expander.update(out) if self.rle else out
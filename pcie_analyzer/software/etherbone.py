@@ -0,0 +1,258 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import csv
+import struct
+import asyncio
+
+from pcie_analyzer.software.uploader import ETHERBONE_BURST_MAX, WORD_SIZE
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+ETHERBONE_MAGIC   = 0x4e6f
+ETHERBONE_VERSION = 1
+ETHERBONE_PORT    = 1234
+
+ADDR_SIZE = 4 # 32-bit addresses and datas
+
+# +--------------------------------+ Packet header (big endian)
+# | magic | version/flags | sizes  | 8 bytes (4 bytes padding)
+# +--------------------------------+ Record header
+# | flags | byte enable | wcount | rcount |
+# +--------------------------------+
+# | base write address | wcount datas   |
+# | base return address | rcount addrs  |
+# +--------------------------------+
+# Read responses are records writing the datas to the base return
+# address of the request: it is used as a tag to match responses.
+
+_packet_header = struct.Struct(">HBB4x")
+_record_header = struct.Struct(">BBBB")
+
+def encode_packet(writes=None, reads=None):
+    """Encode a one record packet.
+
+    writes is a (base address, datas) tuple, reads a (base return
+    address, addresses) tuple.
+    """
+    wbase, wdatas = writes if writes is not None else (0, [])
+    rbase, raddrs = reads if reads is not None else (0, [])
+    packet  = _packet_header.pack(ETHERBONE_MAGIC, ETHERBONE_VERSION << 4, (ADDR_SIZE << 4) | ADDR_SIZE)
+    packet += _record_header.pack(0, 0x0f, len(wdatas), len(raddrs))
+    if wdatas:
+        packet += struct.pack(">{:d}I".format(len(wdatas) + 1), wbase, *wdatas)
+    if raddrs:
+        packet += struct.pack(">{:d}I".format(len(raddrs) + 1), rbase, *raddrs)
+    return packet
+
+def decode_packet(datas):
+    """Decode a packet into a list of (writes, reads) records (see encode_packet())"""
+    magic, version, sizes = _packet_header.unpack_from(datas)
+    if magic != ETHERBONE_MAGIC:
+        raise ValueError("Not an Etherbone packet")
+    records = []
+    offset  = _packet_header.size
+    while offset + _record_header.size <= len(datas):
+        flags, byte_enable, wcount, rcount = _record_header.unpack_from(datas, offset)
+        offset += _record_header.size
+        writes = reads = None
+        if wcount:
+            words   = struct.unpack_from(">{:d}I".format(wcount + 1), datas, offset)
+            writes  = (words[0], list(words[1:]))
+            offset += (wcount + 1)*ADDR_SIZE
+        if rcount:
+            words   = struct.unpack_from(">{:d}I".format(rcount + 1), datas, offset)
+            reads   = (words[0], list(words[1:]))
+            offset += (rcount + 1)*ADDR_SIZE
+        records.append((writes, reads))
+    return records
+
+# *********************************************************
+# *                                                       *
+# *                    CSR helpers                        *
+# *                                                       *
+# *********************************************************
+
+class CSRElements:
+    def __init__(self, d):
+        self.__dict__.update(d)
+
+class AsyncCSRRegister:
+    """CSR register of csr_data_width bits words, accessed with await"""
+    def __init__(self, client, name, addr, length, mode):
+        self.client = client
+        self.name   = name
+        self.addr   = addr
+        self.length = length
+        self.mode   = mode
+
+    async def read(self):
+        datas = await self.client.read(self.addr, self.length)
+        value = 0
+        for data in datas:
+            value = (value << self.client.csr_data_width) | data
+        return value
+
+    async def write(self, value):
+        dw = self.client.csr_data_width
+        await self.client.write(self.addr,
+            [(value >> ((self.length - 1 - i)*dw)) & ((1 << dw) - 1) for i in range(self.length)])
+
+class CSRMemoryRegion:
+    def __init__(self, base, size, type):
+        self.base = base
+        self.size = size
+        self.type = type
+
+def _int(value):
+    return int(value, 0)
+
+# *********************************************************
+# *                                                       *
+# *                    Etherbone client                   *
+# *                                                       *
+# *********************************************************
+
+class _Protocol(asyncio.DatagramProtocol):
+    def __init__(self, client):
+        self.client = client
+
+    def datagram_received(self, datas, addr):
+        self.client._received(datas)
+
+class AsyncEtherbone:
+    """asyncio UDP Etherbone client keeping several requests in flight.
+
+    Unlike litex.RemoteClient, which waits for each response before
+    sending the next request, up to window read records are outstanding
+    at once. Responses are matched with their request tag (base return
+    address) and requests without response after timeout seconds are
+    sent again, up to retries times. Writes are not acknowledged by
+    Etherbone and are sent once.
+
+    regs, bases, mems and constants are built from csr_csv, as with
+    litex.RemoteClient (register read()/write() must be awaited).
+    """
+    def __init__(self, host="192.168.1.201", port=ETHERBONE_PORT, csr_csv=None,
+                 window=16, timeout=0.1, retries=10, csr_data_width=32):
+        self.host           = host
+        self.port           = port
+        self.window         = window
+        self.timeout        = timeout
+        self.retries        = retries
+        self.csr_data_width = csr_data_width
+
+        self.transport = None
+        self._tag      = 0
+        self._pending  = {}
+        self._slots    = None
+
+        self.sent    = 0 # Read records sent, retries included
+        self.resent  = 0 # Read records sent again after a timeout
+
+        if csr_csv is not None:
+            self._build_csr(csr_csv)
+
+    def _build_csr(self, csr_csv):
+        bases, regs, constants, mems = {}, {}, {}, {}
+        with open(csr_csv) as f:
+            for item in csv.reader(row for row in f if not row.startswith("#")):
+                group, name, value, size, mode = (item + [""]*5)[:5]
+                if group == "csr_base":
+                    bases[name] = _int(value)
+                elif group == "csr_register":
+                    regs[name] = AsyncCSRRegister(self, name, _int(value), int(size), mode)
+                elif group == "constant":
+                    try:
+                        constants[name] = _int(value)
+                    except ValueError:
+                        constants[name] = None if value == "None" else value
+                elif group == "memory_region":
+                    mems[name] = CSRMemoryRegion(_int(value), _int(size), mode)
+        self.csr_data_width = constants.get("config_csr_data_width", self.csr_data_width)
+        self.bases     = CSRElements(bases)
+        self.regs      = CSRElements(regs)
+        self.constants = CSRElements(constants)
+        self.mems      = CSRElements(mems)
+
+    async def open(self):
+        loop = asyncio.get_event_loop()
+        self._slots = asyncio.Semaphore(self.window)
+        self.transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _Protocol(self), remote_addr=(self.host, self.port))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def _received(self, datas):
+        try:
+            records = decode_packet(datas)
+        except (ValueError, struct.error):
+            return
+        for writes, reads in records:
+            if writes is None:
+                continue
+            future = self._pending.pop(writes[0], None)
+            if future is not None and not future.done():
+                future.set_result(writes[1])
+
+    async def _read_record(self, addr, count):
+        async with self._slots:
+            self._tag = (self._tag + 1) & 0xffffffff
+            tag    = self._tag
+            packet = encode_packet(reads=(tag, [addr + i*WORD_SIZE for i in range(count)]))
+            for retry in range(self.retries):
+                future = asyncio.get_event_loop().create_future()
+                self._pending[tag] = future
+                self.transport.sendto(packet)
+                self.sent   += 1
+                self.resent += retry > 0
+                try:
+                    return await asyncio.wait_for(future, self.timeout)
+                except asyncio.TimeoutError:
+                    self._pending.pop(tag, None)
+            raise TimeoutError("No response for read of {} words at 0x{:08x}".format(count, addr))
+
+    async def read(self, addr, length=None):
+        """Read length words from addr (one word as an int when length is None)"""
+        count  = 1 if length is None else length
+        bursts = [(addr + offset*WORD_SIZE, min(ETHERBONE_BURST_MAX, count - offset))
+                  for offset in range(0, count, ETHERBONE_BURST_MAX)]
+        results = await asyncio.gather(*[self._read_record(a, n) for a, n in bursts])
+        datas = [data for result in results for data in result]
+        return datas[0] if length is None else datas
+
+    async def read_into(self, addr, buf):
+        """Upload len(buf) bytes from addr into the writable buffer buf"""
+        view = memoryview(buf).cast("B")
+        if (addr | len(view)) % WORD_SIZE:
+            raise ValueError("Upload address and length must be 32-bit aligned")
+        offsets = iter(range(0, len(view), ETHERBONE_BURST_MAX*WORD_SIZE))
+        async def worker():
+            # Workers share the bursts, window of them are in flight
+            for offset in offsets:
+                count = min(ETHERBONE_BURST_MAX, (len(view) - offset)//WORD_SIZE)
+                datas = await self._read_record(addr + offset, count)
+                struct.pack_into("<{:d}I".format(count), view, offset, *datas)
+        await asyncio.gather(*[worker() for i in range(self.window)])
+        return buf
+
+    async def write(self, addr, datas):
+        """Write a word or a list of words from addr"""
+        datas = datas if isinstance(datas, list) else [datas]
+        for offset in range(0, len(datas), ETHERBONE_BURST_MAX):
+            self.transport.sendto(encode_packet(writes=(addr + offset*WORD_SIZE,
+                datas[offset:offset + ETHERBONE_BURST_MAX])))
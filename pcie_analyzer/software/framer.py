@@ -0,0 +1,81 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import numpy as np
+
+from pcie_analyzer.common import *
+from pcie_analyzer.software.frames import symbols
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+# Frame flags
+FRAME_UNTERMINATED = 1 # No END/EDB: K symbol, timeout or end of capture first
+FRAME_NULLIFIED    = 2 # Ended by EDB
+
+frame_dtype = np.dtype([
+    ("start", "<i8"), # Index of the STP/SDP symbol
+    ("end"  , "<i8"), # Index after the END/EDB symbol (or the last frame symbol)
+    ("type" , "u1"),  # STP.value or SDP.value
+    ("flags", "u1"),
+])
+
+def k_flags(ctrl):
+    """Return the K flag of each symbol, in link order (ctrl[1] first)"""
+    out = np.empty(2*len(ctrl), dtype=bool)
+    out[0::2] = ctrl & 2
+    out[1::2] = ctrl & 1
+    return out
+
+# *********************************************************
+# *                                                       *
+# *                       Framer                          *
+# *                                                       *
+# *********************************************************
+
+def find_frames(records, timeout=None):
+    """Find the TLP and DLLP frames of RAW mode records.
+
+    Works on the symbol stream (two symbols per record, see symbols()):
+    a frame starts on a STP or SDP K symbol and ends on the next K
+    symbol, which should be END or EDB. Frames ended by any other K
+    symbol, by the end of records or spanning more than timeout records
+    (as the Filter tlpDllpTimeoutCnt) are flagged FRAME_UNTERMINATED.
+    Return a frame_dtype array.
+    """
+    sym = symbols(records["data"])
+    k   = k_flags(records["ctrl"])
+
+    kidx   = np.flatnonzero(k)
+    ksym   = sym[kidx]
+    starts = np.flatnonzero((ksym == STP.value) | (ksym == SDP.value))
+
+    frames = np.empty(len(starts), dtype=frame_dtype)
+    frames["start"] = kidx[starts]
+    frames["type"]  = ksym[starts]
+
+    # Next K symbol after each frame start
+    last  = starts + 1 == len(kidx)
+    after = np.minimum(starts + 1, len(kidx) - 1)
+    nsym  = np.where(last, 0, ksym[after])
+    ended = ~last & ((nsym == END.value) | (nsym == EDB.value))
+
+    frames["end"]   = np.where(last, len(sym), kidx[after] + ended)
+    frames["flags"] = np.where(ended, 0, FRAME_UNTERMINATED)
+    frames["flags"] |= np.where(ended & (nsym == EDB.value), FRAME_NULLIFIED, 0).astype(np.uint8)
+
+    if timeout is not None:
+        first = frames["start"]//2
+        late  = (frames["end"] - 1)//2 - first + 1 > timeout
+        frames["end"][late]   = 2*(first[late] + timeout)
+        frames["flags"][late] = FRAME_UNTERMINATED
+    return frames
+
+def frame_symbols(records, frames):
+    """Yield the symbol bytes of each frame"""
+    sym = symbols(records["data"])
+    for start, end in zip(frames["start"], frames["end"]):
+        yield sym[start:end].tobytes()
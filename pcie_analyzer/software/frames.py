@@ -0,0 +1,88 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import numpy as np
+
+from pcie_analyzer.software.timestamps import TimestampTracker, strip_tokens
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def symbols(data):
+    """Return the symbol bytes of data words, in link order (data[8:16] first)"""
+    out = np.empty(2*len(data), dtype=np.uint8)
+    out[0::2] = data >> 8
+    out[1::2] = data & 0xff
+    return out
+
+# *********************************************************
+# *                                                       *
+# *                   FrameExtractor                      *
+# *                                                       *
+# *********************************************************
+
+class FrameExtractor:
+    """Split filtered records into frames using their sof/eof flags.
+
+    Records are given chunk by chunk (RecordDecoder.iter_decode()), time
+    tokens are removed and turned into frame timestamps. A frame still
+    open at the end of a chunk is carried over to the next one. A frame
+    without eof is closed by the next sof.
+    """
+    def __init__(self):
+        self.tracker = TimestampTracker()
+        self.pending = None # (timestamp, [symbol arrays]) of the open frame
+
+    def update(self, records):
+        """Return the (timestamp, symbol bytes) frames completed by records"""
+        records, ts = strip_tokens(records, self.tracker.update(records))
+        data    = symbols(records["data"])
+        sof     = np.flatnonzero(records["sof"])
+        eof     = np.flatnonzero(records["eof"])
+        frames  = []
+
+        # Frame started in a previous chunk
+        if self.pending is not None:
+            end    = len(records)
+            closed = False
+            if len(eof):
+                end    = eof[0] + 1
+                closed = True
+            if len(sof) and sof[0] < end:
+                end    = sof[0]
+                closed = True
+            self.pending[1].append(data[:2*end])
+            if closed:
+                timestamp, parts = self.pending
+                frames.append((timestamp, np.concatenate(parts).tobytes()))
+                self.pending = None
+
+        # End of each frame: its eof, or the record before the next sof
+        ends = np.full(len(sof), len(records))
+        if len(eof):
+            next_eof = np.searchsorted(eof, sof)
+            found    = next_eof < len(eof)
+            ends[found] = eof[next_eof[found]] + 1
+        ends[:-1] = np.minimum(ends[:-1], sof[1:])
+
+        complete = np.ones(len(sof), dtype=bool)
+        if len(sof) and (not len(eof) or eof[-1] < sof[-1]):
+            complete[-1] = False
+            self.pending = (int(ts[sof[-1]]), [data[2*sof[-1]:]])
+
+        for start, end in zip(sof[complete], ends[complete]):
+            frames.append((int(ts[start]), data[2*start:2*end].tobytes()))
+        return frames
+
+def iter_frames(chunks):
+    """Yield the (timestamp, symbol bytes) frames of record chunks"""
+    extractor = FrameExtractor()
+    for records in chunks:
+        for frame in extractor.update(records):
+            yield frame
+    if extractor.pending is not None:
+        timestamp, parts = extractor.pending
+        yield timestamp, np.concatenate(parts).tobytes()
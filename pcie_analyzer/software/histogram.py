@@ -0,0 +1,54 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+# *********************************************************
+# *                                                       *
+# *                  HistogramReader                      *
+# *                                                       *
+# *********************************************************
+
+class HistogramReader:
+    """Configure and read a Histogram unit.
+
+    The bins live in a CSR memory, read in one burst. Bin 0 counts the
+    values below the first edge, bin i the values from edge i-1 up to
+    below edge i and the last bin the values from the last edge up.
+    """
+    def __init__(self, wb, name):
+        self.wb      = wb
+        self.nbins   = getattr(wb.constants, name + "_nbins")
+        self._enable = getattr(wb.regs, name + "_enable")
+        self._clear  = getattr(wb.regs, name + "_clear")
+        self._edges  = [getattr(wb.regs, name + "_edge{:d}".format(i)) for i in range(self.nbins - 1)]
+        self._mem    = getattr(wb.bases, name + "_mem")
+        self.edges   = None
+
+    def configure(self, edges):
+        """Set the bin edges (nbins - 1 increasing values), clear the bins and start counting"""
+        edges = list(edges)
+        if len(edges) != self.nbins - 1:
+            raise ValueError("Histogram needs {} edges".format(self.nbins - 1))
+        if any(a >= b for a, b in zip(edges, edges[1:])):
+            raise ValueError("Histogram edges must be increasing")
+        self._enable.write(0)
+        for reg, edge in zip(self._edges, edges):
+            reg.write(edge)
+        self._clear.write(1)
+        self._enable.write(1)
+        self.edges = edges
+
+    def clear(self):
+        self._clear.write(1)
+
+    def read(self):
+        """Return the bin counts"""
+        return list(self.wb.read(self._mem, self.nbins))
+
+    def bins(self, counts=None):
+        """Return [(low, high, count)] bins, high is None for the last one"""
+        counts = self.read() if counts is None else counts
+        if self.edges is None:
+            self.edges = [reg.read() for reg in self._edges]
+        lows   = [0] + self.edges
+        highs  = self.edges + [None]
+        return list(zip(lows, highs, counts))
@@ -0,0 +1,30 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import heapq
+
+from pcie_analyzer.software.frames import iter_frames
+
+# *********************************************************
+# *                                                       *
+# *                        Merge                          *
+# *                                                       *
+# *********************************************************
+
+def _tagged(name, frames):
+    for timestamp, payload in frames:
+        yield timestamp, name, payload
+
+def merge_frames(streams):
+    """Merge (name, frames) streams into one (timestamp, name, payload) timeline.
+
+    Each stream yields (timestamp, payload) frames in time order (ie
+    iter_frames() of the RX and TX captures, which share the same time
+    counter). Streams are read lazily and merged with a heap in
+    O(n log k); frames with the same timestamp keep the stream order.
+    """
+    return heapq.merge(*[_tagged(name, frames) for name, frames in streams], key=lambda frame: frame[0])
+
+def merge_captures(captures):
+    """Merge the frames of (name, record chunks) captures into one timeline"""
+    return merge_frames([(name, iter_frames(chunks)) for name, chunks in captures])
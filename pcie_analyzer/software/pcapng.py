@@ -0,0 +1,110 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import struct
+
+from pcie_analyzer.software.merge import merge_captures
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+SHB_TYPE = 0x0a0d0d0a # Section Header Block
+IDB_TYPE = 0x00000001 # Interface Description Block
+EPB_TYPE = 0x00000006 # Enhanced Packet Block
+
+BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+OPT_ENDOFOPT = 0
+OPT_IF_NAME  = 2
+OPT_IF_DESCRIPTION = 3
+OPT_TSRESOL  = 9
+
+LINKTYPE_USER0 = 147   # Packets are raw link symbols, one byte each
+TSRESOL_NS     = 9     # Timestamps in 10^-9 s
+SNAPLEN        = 0     # No snapshot length limit
+
+TICK_NS = 8 # Time counter runs at 125 MHz
+
+def _pad(data):
+    return data + bytes(-len(data) % 4)
+
+def _option(code, value):
+    return struct.pack("<HH", code, len(value)) + _pad(value)
+
+def _block(block_type, body):
+    length = 12 + len(body)
+    return struct.pack("<II", block_type, length) + body + struct.pack("<I", length)
+
+# *********************************************************
+# *                                                       *
+# *                    PcapngWriter                       *
+# *                                                       *
+# *********************************************************
+
+class PcapngWriter:
+    """Stream packets to a PCAPNG file.
+
+    Blocks go through a buffered writer: memory use does not depend on
+    the number of packets written.
+    """
+    def __init__(self, filename, buffering=1 << 20):
+        self._file = open(filename, "wb", buffering=buffering)
+        self.interfaces = 0
+        self.packets    = 0
+        self._file.write(_block(SHB_TYPE,
+            struct.pack("<IHHq", BYTE_ORDER_MAGIC, 1, 0, -1) + _option(OPT_ENDOFOPT, b"")))
+
+    def add_interface(self, name, linktype=LINKTYPE_USER0, description=None):
+        """Describe a new interface and return its id"""
+        options  = _option(OPT_IF_NAME, name.encode())
+        if description is not None:
+            options += _option(OPT_IF_DESCRIPTION, description.encode())
+        options += _option(OPT_TSRESOL, bytes([TSRESOL_NS]))
+        options += _option(OPT_ENDOFOPT, b"")
+        self._file.write(_block(IDB_TYPE, struct.pack("<HHI", linktype, 0, SNAPLEN) + options))
+        self.interfaces += 1
+        return self.interfaces - 1
+
+    def write_packet(self, interface, timestamp, payload):
+        """Write payload captured on interface at timestamp (ns)"""
+        header = struct.pack("<IIIII", interface, timestamp >> 32, timestamp & 0xffffffff,
+                             len(payload), len(payload))
+        self._file.write(_block(EPB_TYPE, header + _pad(payload)))
+        self.packets += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# *********************************************************
+# *                                                       *
+# *                       Export                          *
+# *                                                       *
+# *********************************************************
+
+def export_pcapng(filename, captures, tick_ns=TICK_NS):
+    """Write the frames of each (interface name, record chunks) capture to a PCAPNG file.
+
+    Each capture gets its own interface, in the order given, named after
+    the capture (ie "rx" and "tx", names may repeat), and packets are
+    written in time order. Record chunks are typically
+    RecordDecoder.iter_decode() results, so the capture is never fully
+    decoded in memory. Frames seen before the first time token are
+    stamped 0.
+    """
+    with PcapngWriter(filename) as writer:
+        captures   = list(captures)
+        interfaces = [writer.add_interface(name, description="Capture {:d} ({})".format(i, name))
+                      for i, (name, chunks) in enumerate(captures)]
+        indexed    = [(i, chunks) for i, (name, chunks) in enumerate(captures)]
+        for timestamp, i, payload in merge_captures(indexed):
+            writer.write_packet(interfaces[i], max(timestamp, 0)*tick_ns, payload)
+        return writer.packets
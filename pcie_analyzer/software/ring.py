@@ -0,0 +1,116 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import numpy as np
+
+from pcie_analyzer.software.decoder import record_dtype, expand_runs
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def first_flag(block):
+    """Return the RECORD_START bit (MSb) of a little endian DDR block"""
+    return bytes(block)[-1] >> 7
+
+def blocks_for(records, nb):
+    """Number of blocks spanned by records, wherever the first one lands"""
+    return -(-records // nb) + 1
+
+# *********************************************************
+# *                                                       *
+# *                     RingCapture                       *
+# *                                                       *
+# *********************************************************
+
+class RingCapture:
+    """Time ordered view of a RingRecorder ring buffer.
+
+    buf holds the ring as uploaded: byte i of buf is DDR address
+    base + i. The recorder writes the first block of a capture at base
+    with its RECORD_START bit set: when it is still set once the capture
+    is done, the ring did not wrap and the capture spans [base, wrAddr),
+    else it spans [wrAddr, base + length) followed by [base, wrAddr).
+    Segments are returned as memoryviews over buf, nothing is copied.
+    """
+    def __init__(self, base, length, dw, trig_addr, wr_addr, wrapped):
+        self.base       = base
+        self.length     = length
+        self.block_size = dw//8
+        self.nblocks    = length//self.block_size
+        self.wrapped    = wrapped
+
+        # Block indexes, relative to base
+        self.trig_block = self._block(trig_addr)
+        self.wr_block   = self._block(wr_addr)
+
+    def _block(self, addr):
+        return ((addr - self.base)//self.block_size) % self.nblocks
+
+    @classmethod
+    def from_buffer(cls, buf, base, length, dw, trig_addr, wr_addr):
+        """Build a RingCapture getting the wrap flag from the first block of buf"""
+        wrapped = not first_flag(memoryview(buf)[:dw//8])
+        return cls(base, length, dw, trig_addr, wr_addr, wrapped)
+
+    def __len__(self):
+        """Number of recorded blocks"""
+        if self.wrapped:
+            return self.nblocks
+        # Not wrapped yet, but the write pointer just came back to base
+        return self.wr_block or self.nblocks
+
+    @property
+    def oldest_block(self):
+        return self.wr_block if self.wrapped else 0
+
+    @property
+    def trig_index(self):
+        """Index of the trigger block in time order"""
+        return (self.trig_block - self.oldest_block) % self.nblocks
+
+    def ranges(self, pre_blocks=None, post_blocks=None):
+        """Return the (offset, size) areas of the ring holding the capture window, in time order.
+
+        The window holds pre_blocks blocks before the trigger block and
+        post_blocks blocks from it (None: everything recorded).
+        """
+        first = 0
+        last  = len(self)
+        if pre_blocks is not None:
+            first = max(first, self.trig_index - pre_blocks)
+        if post_blocks is not None:
+            last = min(last, self.trig_index + post_blocks)
+        if last <= first:
+            return []
+        start = (self.oldest_block + first) % self.nblocks
+        count = last - first
+        areas = []
+        while count:
+            n = min(count, self.nblocks - start)
+            areas.append((start*self.block_size, n*self.block_size))
+            start  = 0
+            count -= n
+        return areas
+
+    def segments(self, buf, pre_blocks=None, post_blocks=None):
+        """Return the capture window as memoryviews over buf, in time order"""
+        view = memoryview(buf).cast("B")
+        return [view[offset:offset + size] for offset, size in self.ranges(pre_blocks, post_blocks)]
+
+    def decode(self, buf, decoder, pre_blocks=None, post_blocks=None):
+        """Decode the capture window into one time ordered record array"""
+        segments = self.segments(buf, pre_blocks, post_blocks)
+        if decoder.rle:
+            # Runs may span the ring wrap: expand once segments are joined
+            return expand_runs(np.concatenate([decoder.decode(segment, expand=False) for segment in segments]
+                                              or [np.empty(0, dtype=record_dtype)]))
+        counts   = [decoder.count(segment) for segment in segments]
+        records  = np.empty(sum(counts), dtype=record_dtype)
+        position = 0
+        for segment, count in zip(segments, counts):
+            decoder.decode(segment, out=records[position:position + count])
+            position += count
+        return records
@@ -0,0 +1,85 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from collections import namedtuple
+
+from pcie_analyzer.common import SEGMENT_TABLE
+from pcie_analyzer.software.ring import RingCapture
+from pcie_analyzer.software.uploader import Uploader
+from pcie_analyzer.software.ddr import recorder_ring
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+Segment = namedtuple("Segment", ["index", "base", "size"] + SEGMENT_TABLE)
+
+# *********************************************************
+# *                                                       *
+# *                  SegmentedCapture                     *
+# *                                                       *
+# *********************************************************
+
+class SegmentedCapture:
+    """Configure and read back a RingRecorder in segmented mode.
+
+    The ring is split in segments of segmentSize bytes, one capture
+    window each: the recorder re-arms the trigger after each window, up
+    to the number of segments. The status of the filled segments is read
+    from the table CSR memory in one burst, each segment is then a ring
+    of its own, uploaded and decoded with RingCapture.
+    """
+    def __init__(self, wb, name, uploader=None, mem_base=None):
+        self.wb   = wb
+        self.name = name
+
+        self._segments    = getattr(wb.regs, name + "_segments")
+        self._segmentSize = getattr(wb.regs, name + "_segmentSize")
+        self._segment     = getattr(wb.regs, name + "_segment")
+        self._table       = getattr(wb.bases, name + "_table")
+
+        self.base, self.length = recorder_ring(wb, name)
+        self.dw           = getattr(wb.constants, name + "_dw")
+        self.max_segments = getattr(wb.constants, name + "_maxsegments")
+
+        self.uploader = uploader if uploader is not None else Uploader(wb)
+        self.mem_base = mem_base if mem_base is not None else wb.mems.main_ram.base
+
+        self.size = None
+
+    def configure(self, segments):
+        """Split the ring in segments (0: back to a single ring), return the segment size"""
+        if not 0 <= segments <= self.max_segments:
+            raise ValueError("Recorder supports up to {} segments".format(self.max_segments))
+        self.base, self.length = recorder_ring(self.wb, self.name)
+        self.size = 0
+        if segments:
+            block     = self.dw//8
+            self.size = self.length//segments//block*block
+            if self.size < 2*block:
+                raise ValueError("Segments of {} bytes are too small".format(self.size))
+        self._segmentSize.write(self.size)
+        self._segments.write(segments)
+        return self.size
+
+    def table(self):
+        """Return the Segment status of the segments filled"""
+        if self.size is None:
+            self.size = self._segmentSize.read()
+        count = self._segment.read()
+        words = list(self.wb.read(self._table, count*len(SEGMENT_TABLE))) if count else []
+        return [Segment(i, self.base + i*self.size, self.size, *words[i*len(SEGMENT_TABLE):(i + 1)*len(SEGMENT_TABLE)])
+                for i in range(count)]
+
+    def upload(self, segment):
+        """Upload a segment, return its RingCapture and buffer"""
+        buf = self.uploader.upload_into(self.mem_base + segment.base, bytearray(segment.size))
+        return RingCapture.from_buffer(buf, segment.base, segment.size, self.dw, segment.trigAddr, segment.wrAddr), buf
+
+    def captures(self):
+        """Yield (segment, ring, buf) for each segment filled, in trigger order"""
+        for segment in self.table():
+            ring, buf = self.upload(segment)
+            yield segment, ring, buf
@@ -0,0 +1,100 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import time
+import asyncio
+import inspect
+
+from pcie_analyzer.software.uploader import WORD_SIZE
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+RECORDER_STATUS = ["finished", "state", "trigAddr", "wrAddr", "preCount", "postCount"]
+TRIGGER_STATUS  = ["trigged"]
+
+# *********************************************************
+# *                                                       *
+# *                    StatusPoller                       *
+# *                                                       *
+# *********************************************************
+
+class StatusPoller:
+    """Read a group of status CSRs in one burst and wait on them.
+
+    Registers are read with a single wb.read() spanning all of them (the
+    CSRs of a module are contiguous), instead of one request each.
+    wait() polls with an interval growing from min_interval to
+    max_interval, so that long waits do not hammer the Etherbone bridge.
+    With an AsyncEtherbone client, use wait_async().
+    """
+    def __init__(self, wb, name, fields, min_interval=1e-3, max_interval=0.1, backoff=2):
+        self.wb           = wb
+        self.registers    = {field: getattr(wb.regs, name + "_" + field) for field in fields}
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff      = backoff
+        self.polls        = 0
+
+        self.base   = min(reg.addr for reg in self.registers.values())
+        self.nwords = max(reg.addr + reg.length*WORD_SIZE for reg in self.registers.values()) - self.base
+        self.nwords //= WORD_SIZE
+
+    def _decode(self, datas):
+        status = {}
+        for field, reg in self.registers.items():
+            dw     = getattr(reg, "data_width", None) or self.wb.csr_data_width
+            offset = (reg.addr - self.base)//WORD_SIZE
+            value  = 0
+            for data in datas[offset:offset + reg.length]:
+                value = (value << dw) | data
+            status[field] = value
+        return status
+
+    def read(self):
+        """Return the {field: value} status, read in one burst"""
+        self.polls += 1
+        return self._decode(self.wb.read(self.base, self.nwords))
+
+    def _intervals(self, timeout):
+        deadline = None if timeout is None else time.time() + timeout
+        interval = self.min_interval
+        while True:
+            yield interval
+            if deadline is not None and time.time() + interval > deadline:
+                raise TimeoutError("Status wait timed out after {} s".format(timeout))
+            interval = min(interval*self.backoff, self.max_interval)
+
+    def wait(self, condition=None, timeout=None):
+        """Poll until condition(status) (default: status["finished"]), return the status"""
+        condition = condition or (lambda status: status["finished"])
+        for interval in self._intervals(timeout):
+            status = self.read()
+            if condition(status):
+                return status
+            time.sleep(interval)
+
+    async def read_async(self):
+        self.polls += 1
+        datas = self.wb.read(self.base, self.nwords)
+        if inspect.isawaitable(datas):
+            datas = await datas
+        return self._decode(datas)
+
+    async def wait_async(self, condition=None, timeout=None):
+        """Awaitable wait(), other tasks run between polls"""
+        condition = condition or (lambda status: status["finished"])
+        for interval in self._intervals(timeout):
+            status = await self.read_async()
+            if condition(status):
+                return status
+            await asyncio.sleep(interval)
+
+def recorder_status(wb, name, **kwargs):
+    return StatusPoller(wb, name, RECORDER_STATUS, **kwargs)
+
+def trigger_status(wb, name, **kwargs):
+    return StatusPoller(wb, name, TRIGGER_STATUS, **kwargs)
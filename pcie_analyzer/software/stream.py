@@ -0,0 +1,101 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import time
+
+from pcie_analyzer.software.uploader import Uploader
+from pcie_analyzer.software.status import recorder_status
+from pcie_analyzer.software.ddr import recorder_ring
+
+# *********************************************************
+# *                                                       *
+# *                     RingDrainer                       *
+# *                                                       *
+# *********************************************************
+
+class RingDrainer:
+    """Drain a RingRecorder ring buffer in streaming mode.
+
+    In streaming mode the recorder writes blocks from the host read
+    pointer (rdAddr) up to, but not including, it: the host uploads the
+    area between rdAddr and the live write pointer (wrAddr), then moves
+    rdAddr forward to free it. When the host falls behind, the recorder
+    drops blocks and counts them in overruns, or stalls the capture
+    pipeline when backpressure is set.
+    """
+    def __init__(self, wb, name, uploader=None, mem_base=None):
+        self.wb = wb
+
+        self._start        = getattr(wb.regs, name + "_start")
+        self._stop         = getattr(wb.regs, name + "_stop")
+        self._streaming    = getattr(wb.regs, name + "_streaming")
+        self._backpressure = getattr(wb.regs, name + "_backpressure")
+        self._rdAddr       = getattr(wb.regs, name + "_rdAddr")
+        self._wrAddr       = getattr(wb.regs, name + "_wrAddr")
+        self._overruns     = getattr(wb.regs, name + "_overruns")
+        self._status       = recorder_status(wb, name)
+
+        self.name   = name
+        self.base, self.length = recorder_ring(wb, name)
+        self.nb     = getattr(wb.constants, name + "_nb")
+        self.dw     = getattr(wb.constants, name + "_dw")
+
+        self.uploader = uploader if uploader is not None else Uploader(wb)
+        self.mem_base = mem_base if mem_base is not None else wb.mems.main_ram.base
+
+        self.rdAddr   = self.base
+        self.drained  = 0 # Bytes drained since start
+        self.overruns = 0 # Blocks dropped, read on stop
+
+    def start(self, backpressure=False):
+        # The ring may have been moved since
+        self.base, self.length = recorder_ring(self.wb, self.name)
+        self.rdAddr   = self.base
+        self.drained  = 0
+        self.overruns = 0
+        self._rdAddr.write(self.rdAddr)
+        self._backpressure.write(int(backpressure))
+        self._streaming.write(1)
+        self._start.write(1)
+
+    def ranges(self, wrAddr):
+        """Return the (addr, size) areas from rdAddr to wrAddr, in time order"""
+        end = self.base + self.length
+        if wrAddr >= self.rdAddr:
+            areas = [(self.rdAddr, wrAddr - self.rdAddr)]
+        else:
+            areas = [(self.rdAddr, end - self.rdAddr), (self.base, wrAddr - self.base)]
+        return [(addr, size) for addr, size in areas if size]
+
+    def drain(self, write):
+        """Upload the blocks written since the last drain, pass them to write(buf) and free them.
+
+        Return the number of bytes drained.
+        """
+        wrAddr = self._wrAddr.read()
+        length = 0
+        for addr, size in self.ranges(wrAddr):
+            write(self.uploader.upload_into(self.mem_base + addr, bytearray(size)))
+            length += size
+        self.rdAddr = wrAddr
+        self._rdAddr.write(self.rdAddr)
+        self.drained += length
+        return length
+
+    def run(self, write, duration, interval=0.01):
+        """Drain for duration seconds, every interval seconds at most"""
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            if not self.drain(write):
+                time.sleep(interval)
+
+    def stop(self, write, timeout=None):
+        """Stop recording, drain the last blocks and return the overrun count"""
+        self._stop.write(1)
+        self._status.wait(timeout=timeout)
+        self.drain(write)
+        self.overruns = self._overruns.read()
+        # Second stop: back to idle, pointers are reset
+        self._stop.write(1)
+        self._streaming.write(0)
+        return self.overruns
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from pcie_analyzer.software.capture_file import *
+from pcie_analyzer.software.test_decoder import make_block, encode_runs, pack_blocks
+from pcie_analyzer.software.test_timestamps import make_stream
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+DW = 256
+NB = (DW - 12)//22
+
+random.seed(1)
+records, expected = make_stream(300)
+
+blocks   = []
+position = 0
+while position < len(records):
+    count = NB if random.randint(0, 5) else random.randint(0, NB)
+    blocks.append(make_block(records[position:position + count].tolist(), NB, DW))
+    position += count
+buf = b"".join(blocks)
+
+sof = np.flatnonzero(records["sof"])
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def write_capture(filename):
+    with CaptureWriter(filename, NB, DW, "tx", chunk_blocks=7) as writer:
+        # Several writes, as for the two segments of a wrapped ring
+        half = (len(blocks)//2)*(DW//8)
+        writer.write(buf[:half])
+        writer.write(buf[half:])
+
+def test_index():
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "capture.bin")
+        write_capture(filename)
+        capture = CaptureFile(filename)
+        assert capture.direction == "tx"
+        assert capture.nblocks == len(blocks)
+        assert len(capture) == len(sof)
+        assert list(capture.index["record"]) == list(sof)
+        assert list(capture.index["timestamp"]) == list(expected[sof])
+        del capture
+
+def test_frame():
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "capture.bin")
+        write_capture(filename)
+        capture = CaptureFile(filename)
+        for n in [0, 1, len(sof)//2, len(sof) - 1]:
+            frame = capture.frame(n)
+            end   = sof[n + 1] if n + 1 < len(sof) else len(records)
+            assert list(frame["data"]) == list(records["data"][sof[n]:end])
+        # Search by timestamp
+        n = capture.find(expected[sof[100]] - 1)
+        assert n == 100
+        del capture
+
+def test_rle():
+    # Long idle stretches between frames, stored as run length tokens
+    idle = records.copy()
+    plain = ~(idle["time"] | idle["sof"]).astype(bool)
+    idle["data"][plain & (np.arange(len(idle)) % 40 < 30)] = 0
+    encoded = encode_runs(idle, 1)
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "capture.bin")
+        with CaptureWriter(filename, NB, DW, chunk_blocks=5, rle=True) as writer:
+            writer.write(pack_blocks(encoded, NB, DW))
+        capture = CaptureFile(filename)
+        assert capture.rle
+        assert capture.nblocks < len(blocks)
+        assert list(capture.index["record"]) == list(sof)
+        assert list(capture.index["timestamp"]) == list(expected[sof])
+        for n in [0, 1, len(sof)//2, len(sof) - 1]:
+            end = sof[n + 1] if n + 1 < len(sof) else len(idle)
+            assert (capture.frame(n) == idle[sof[n]:end]).all()
+        assert (capture.decode_blocks(0) == idle).all()
+        del capture
+
+def test_not_a_capture():
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "capture.bin")
+        with open(filename, "wb") as f:
+            f.write(bytes(HEADER_SIZE))
+        try:
+            CaptureFile(filename)
+        except ValueError:
+            return
+        assert False
+
+if __name__ == "__main__":
+    test_index()
+    test_frame()
+    test_rle()
+    test_not_a_capture()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import pytest
+
+from pcie_analyzer.software.ddr import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+DRAM_SIZE = 0x40000000 # 1 GiB
+DW        = 256
+
+class DummyRegister():
+    def __init__(self, client, name):
+        self.client = client
+        self.name   = name
+
+    def read(self):
+        return self.client.csr[self.name]
+
+    def write(self, value):
+        self.client.writes.append((self.name, value))
+        self.client.csr[self.name] = value
+
+class DummyClient():
+    """RX and TX recorders with their build time rings"""
+    class constants:
+        rx_recorder_dramsize = DRAM_SIZE
+        rx_recorder_dw       = DW
+        tx_recorder_dramsize = DRAM_SIZE
+        tx_recorder_dw       = DW
+
+    def __init__(self):
+        self.csr    = {"rx_base": 0, "rx_length": 0x100000, "tx_base": 0x100000, "tx_length": 0x100000,
+                       "rx_segments": 0, "rx_segmentSize": 0, "tx_segments": 0, "tx_segmentSize": 0}
+        self.writes = []
+        self.regs   = type("regs", (), {})()
+        for name in list(self.csr):
+            setattr(self.regs, name.replace("_", "_recorder_"), DummyRegister(self, name))
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_check_ring():
+    check_ring(DRAM_SIZE - 0x1000, 0x1000, DRAM_SIZE, DW)
+    with pytest.raises(ValueError):
+        check_ring(DRAM_SIZE - 0x1000, 0x2000, DRAM_SIZE, DW)
+    with pytest.raises(ValueError):
+        check_ring(0x10, 0x1000, DRAM_SIZE, DW)
+    with pytest.raises(ValueError):
+        check_ring(0, 0x20, DRAM_SIZE, DW)
+
+def test_check_segments():
+    check_ring(0, 0x1000, DRAM_SIZE, DW, segments=4, segment_size=0x400)
+    with pytest.raises(ValueError):
+        check_ring(0, 0x1000, DRAM_SIZE, DW, segments=4, segment_size=0x3f0)
+    with pytest.raises(ValueError):
+        check_ring(0, 0x1000, DRAM_SIZE, DW, segments=4, segment_size=0x420)
+
+def test_split():
+    assert split_ddr(DRAM_SIZE, DW, [1, 1]) == [(0, DRAM_SIZE//2), (DRAM_SIZE//2, DRAM_SIZE//2)]
+    # Idle TX: RX takes all but IDLE_RING_LENGTH
+    assert split_ddr(DRAM_SIZE, DW, [1, 0]) == [(0, DRAM_SIZE - IDLE_RING_LENGTH),
+                                                 (DRAM_SIZE - IDLE_RING_LENGTH, IDLE_RING_LENGTH)]
+    # Rings are block aligned, above the reserved area
+    rings = split_ddr(DRAM_SIZE, DW, [2, 1], reserved=0x1001)
+    assert rings[0][0] == 0x1020
+    assert all(base % 32 == 0 and length % 32 == 0 for base, length in rings)
+    assert sum(length for base, length in rings) <= DRAM_SIZE - 0x1020
+    with pytest.raises(ValueError):
+        split_ddr(DRAM_SIZE, DW, [0, 0])
+
+def test_allocate():
+    wb    = DummyClient()
+    rings = allocate_rings(wb, {"rx_recorder": 0, "tx_recorder": 1})
+    assert rings == {"rx_recorder": (0, IDLE_RING_LENGTH),
+                     "tx_recorder": (IDLE_RING_LENGTH, DRAM_SIZE - IDLE_RING_LENGTH)}
+    assert recorder_ring(wb, "tx_recorder") == (IDLE_RING_LENGTH, DRAM_SIZE - IDLE_RING_LENGTH)
+
+def test_set_ring_checked():
+    wb = DummyClient()
+    with pytest.raises(ValueError):
+        set_recorder_ring(wb, "rx_recorder", 0, DRAM_SIZE + 0x1000)
+    # Segments do not fit in a shorter ring
+    wb.csr.update({"rx_segments": 4, "rx_segmentSize": 0x40000})
+    with pytest.raises(ValueError):
+        set_recorder_ring(wb, "rx_recorder", 0, 0x80000)
+    # Nothing written
+    assert wb.writes == []
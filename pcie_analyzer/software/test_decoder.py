@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+import numpy as np
+
+from pcie_analyzer.common import *
+from pcie_analyzer.software.decoder import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_record(data, ctrl=0, trig=0, time=0, sof=0, eof=0):
+    return (data, ctrl, trig, time, sof, eof)
+
+def make_block(records, nb, dw, first=0, trig_ext=0, sof_count=0, trig_id=0):
+    """Pack records as RingRecorder does: field by field, then meta data"""
+    value  = 0
+    offset = 0
+    for f, (name, width) in enumerate(trigger_layout):
+        for i, record in enumerate(records):
+            value |= record[f] << (offset + i*width)
+        offset += width*nb
+    value |= first << (dw - 1)
+    value |= len(records) << (dw - 6)
+    value |= trig_ext << (dw - 7)
+    value |= sof_count << (dw - 10)
+    value |= trig_id << (dw - 12)
+    return value.to_bytes(dw//8, "little")
+
+def random_records(n):
+    return [make_record(random.getrandbits(16), random.getrandbits(2), random.getrandbits(1),
+                        random.getrandbits(1), random.getrandbits(1), random.getrandbits(1))
+            for i in range(n)]
+
+def encode_runs(records, period):
+    """RunLengthEncoder model: return records with runs replaced by tokens"""
+    out   = []
+    clean = 0
+    count = 0
+    for i, record in enumerate(records.tolist()):
+        flagged = any(record[2:])
+        match   = not flagged and clean >= period and record[:2] == records[i - period].tolist()[:2]
+        if count and (not match or count == RLE_COUNT_MAX):
+            out.append(make_record(count | (period - 1) << RLE_COUNT_BITS, time=1, sof=1, eof=1))
+            count = 0
+        if match:
+            count += 1
+        else:
+            out.append(record)
+        clean = 0 if flagged else min(clean + 1, RLE_PERIOD_MAX)
+    if count:
+        out.append(make_record(count | (period - 1) << RLE_COUNT_BITS, time=1, sof=1, eof=1))
+    return np.array(out, dtype=record_dtype)
+
+def pack_blocks(records, nb, dw):
+    return b"".join(make_block(records[i:i + nb].tolist(), nb, dw) for i in range(0, len(records), nb))
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+DW = 256
+NB = (DW - 12)//22
+
+random.seed(0)
+
+blocks  = []
+records = []
+for i in range(1000):
+    count = NB if i % 7 else random.randint(0, NB)
+    block_records = random_records(count)
+    records += block_records
+    blocks.append(make_block(block_records, NB, DW, first=(i == 0), trig_ext=(i == 3), sof_count=i % 8, trig_id=i % 4))
+buf = b"".join(blocks)
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def check(decoded, expected):
+    assert len(decoded) == len(expected)
+    for f, (name, width) in enumerate(trigger_layout):
+        assert list(decoded[name]) == [record[f] for record in expected]
+
+def test_decode():
+    decoder = RecordDecoder(NB, DW, chunk_blocks=100)
+    check(decoder.decode(buf), records)
+
+def test_metadata():
+    meta = RecordDecoder(NB, DW).metadata(buf)
+    assert len(meta) == len(blocks)
+    assert meta["first"][0] == 1 and meta["first"][1:].sum() == 0
+    assert list(np.flatnonzero(meta["trig_ext"])) == [3]
+    assert list(meta["sof_count"][:10]) == [i % 8 for i in range(10)]
+    assert list(meta["trig_id"][:10]) == [i % 4 for i in range(10)]
+
+def test_iter_decode():
+    decoder = RecordDecoder(NB, DW, chunk_blocks=64)
+    check(np.concatenate(list(decoder.iter_decode(buf))), records)
+
+def test_decode_out():
+    decoder = RecordDecoder(NB, DW)
+    out = np.zeros(decoder.count(buf) + 2, dtype=record_dtype)
+    decoder.decode(buf, out=out[1:-1])
+    check(out[1:-1], records)
+
+def test_from_constants():
+    class Constants:
+        rx_capture_recorder_nb = NB
+        rx_capture_recorder_dw = DW
+    decoder = RecordDecoder.from_constants(Constants, "rx_capture_recorder")
+    assert (decoder.nb, decoder.dw) == (NB, DW)
+
+def test_expand_runs():
+    idle = make_record(0x0000)
+    skp  = [make_record(0xbc1c, 3), make_record(0x1c1c, 3)]
+    sof  = make_record(0xfb00, 2, sof=1)
+    raw  = np.array([sof, idle] + [idle]*(RLE_COUNT_MAX + 10) + skp*50 + [sof] + skp*3, dtype=record_dtype)
+    for period in [1, 2, 8]:
+        encoded = encode_runs(raw, period)
+        assert (expand_runs(encoded) == raw).all()
+    assert len(encode_runs(raw, 1)) < 10 + 2*50 + 2*3
+    assert len(encode_runs(raw, 2)) < 16
+
+def test_expand_chunks():
+    random.seed(2)
+    raw = np.array([make_record(random.choice([0, 0x1c1c]), sof=random.random() < 0.01)
+                    for i in range(5000)], dtype=record_dtype)
+    for period in [1, 3, 8]:
+        encoded  = encode_runs(raw, period)
+        expander = RunExpander()
+        bounds   = [0] + sorted(random.sample(range(1, len(encoded)), 50)) + [len(encoded)]
+        parts    = [expander.update(encoded[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+        assert (np.concatenate(parts) == raw).all()
+
+def test_expand_no_history():
+    # Runs before the first decoded record are dropped
+    raw     = np.array([make_record(0x1234)]*10 + [make_record(0x5678, sof=1)], dtype=record_dtype)
+    encoded = encode_runs(raw, 1)
+    assert list(expand_runs(encoded[1:])["data"]) == [0x5678]
+    # Not counted either
+    decoder = RecordDecoder(NB, DW, rle=True)
+    assert decoder.count(pack_blocks(encoded[1:], NB, DW)) == 1
+
+def test_decode_rle():
+    random.seed(3)
+    raw = np.array([make_record(0 if (i//100) % 2 else random.getrandbits(16), time=(i % 500 == 0))
+                    for i in range(10000)], dtype=record_dtype)
+    encoded = encode_runs(raw, 1)
+    rle_buf = pack_blocks(encoded, NB, DW)
+    decoder = RecordDecoder(NB, DW, chunk_blocks=3, rle=True)
+    assert (decoder.decode(rle_buf) == raw).all()
+    assert decoder.count(rle_buf) == len(raw)
+    assert (np.concatenate(list(decoder.iter_decode(rle_buf))) == raw).all()
+    assert (decoder.decode(rle_buf, expand=False) == encoded).all()
+
+if __name__ == "__main__":
+    test_decode()
+    test_metadata()
+    test_iter_decode()
+    test_decode_out()
+    test_from_constants()
+    test_expand_runs()
+    test_expand_chunks()
+    test_expand_no_history()
+    test_decode_rle()
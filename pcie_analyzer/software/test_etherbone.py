@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import os
+import random
+import struct
+import asyncio
+import tempfile
+
+from pcie_analyzer.software.etherbone import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+class DummyServer(asyncio.DatagramProtocol):
+    """Etherbone server over a bytearray, dropping some read requests"""
+    def __init__(self, mem, drop=0):
+        self.mem      = mem
+        self.drop     = drop
+        self.requests = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, datas, addr):
+        for writes, reads in decode_packet(datas):
+            if writes is not None:
+                base, values = writes
+                for i, value in enumerate(values):
+                    struct.pack_into("<I", self.mem, base + 4*i, value)
+            if reads is not None:
+                self.requests += 1
+                if random.random() < self.drop:
+                    continue
+                tag, addrs = reads
+                values = [struct.unpack_from("<I", self.mem, a)[0] for a in addrs]
+                self.transport.sendto(encode_packet(writes=(tag, values)), addr)
+
+CSR_CSV = """\
+#--------------------------------------------------------------------------------
+# Auto-generated by Migen
+#--------------------------------------------------------------------------------
+csr_base,rx_capture,0x00000100,,
+csr_register,rx_capture_recorder_trigAddr,0x00000100,1,ro
+csr_register,rx_capture_recorder_wide,0x00000104,2,rw
+constant,config_csr_data_width,32,,
+constant,rx_capture_recorder_nb,11,,
+memory_region,main_ram,0x00008000,0x8000,cached
+"""
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+async def serve(mem, drop=0):
+    loop = asyncio.get_event_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: DummyServer(mem, drop), local_addr=("127.0.0.1", 0))
+    return transport, server
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+random.seed(0)
+mem = bytearray(random.getrandbits(8) for i in range(0x10000))
+
+def test_packet():
+    packet = encode_packet(writes=(0x100, [1, 2, 3]), reads=(0x55, [0x10, 0x14]))
+    assert decode_packet(packet) == [((0x100, [1, 2, 3]), (0x55, [0x10, 0x14]))]
+
+def test_read_write():
+    async def main():
+        transport, server = await serve(bytearray(mem))
+        async with AsyncEtherbone(*transport.get_extra_info("sockname")) as wb:
+            assert await wb.read(0x40) == struct.unpack_from("<I", mem, 0x40)[0]
+            assert await wb.read(0x40, 600) == list(struct.unpack_from("<600I", mem, 0x40))
+            await wb.write(0x80, [0x11223344, 0x55667788])
+            assert await wb.read(0x80, 2) == [0x11223344, 0x55667788]
+        transport.close()
+    run(main())
+
+def test_retries():
+    async def main():
+        transport, server = await serve(mem, drop=0.2)
+        async with AsyncEtherbone(*transport.get_extra_info("sockname"), window=8, timeout=0.02) as wb:
+            buf = await wb.read_into(0, bytearray(len(mem)))
+            assert buf == mem
+            assert wb.resent > 0
+        transport.close()
+    run(main())
+
+def test_csr():
+    async def main():
+        transport, server = await serve(bytearray(mem))
+        with tempfile.TemporaryDirectory() as d:
+            csr_csv = os.path.join(d, "csr.csv")
+            with open(csr_csv, "w") as f:
+                f.write(CSR_CSV)
+            wb = AsyncEtherbone(*transport.get_extra_info("sockname"), csr_csv=csr_csv)
+        await wb.open()
+        assert wb.bases.rx_capture == 0x100
+        assert wb.constants.rx_capture_recorder_nb == 11
+        assert wb.mems.main_ram.base == 0x8000
+        await wb.regs.rx_capture_recorder_wide.write(0x123456789)
+        assert await wb.regs.rx_capture_recorder_wide.read() == 0x123456789
+        assert server.mem[0x104:0x10c] == bytes([1, 0, 0, 0, 0x89, 0x67, 0x45, 0x23])
+        wb.close()
+        transport.close()
+    run(main())
+
+if __name__ == "__main__":
+    test_packet()
+    test_read_write()
+    test_retries()
+    test_csr()
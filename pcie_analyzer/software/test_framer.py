@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+import numpy as np
+
+from pcie_analyzer.common import *
+from pcie_analyzer.software.decoder import record_dtype
+from pcie_analyzer.software.framer import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_records(symbols):
+    """Pack (k, value) symbols into RAW mode records, two per record"""
+    if len(symbols) % 2:
+        symbols = symbols + [(0, 0)]
+    records = np.zeros(len(symbols)//2, dtype=record_dtype)
+    records["data"] = [(a << 8) | b for (ka, a), (kb, b) in zip(symbols[0::2], symbols[1::2])]
+    records["ctrl"] = [(ka << 1) | kb for (ka, a), (kb, b) in zip(symbols[0::2], symbols[1::2])]
+    return records
+
+def d(n):
+    return [(0, random.randint(0, 0xff)) for i in range(n)]
+
+def k(symbol):
+    return [(1, symbol.value)]
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+random.seed(0)
+
+# Symbol index, frame
+stream = d(3)                          # 0
+stream += k(STP) + d(20) + k(END)      # 3:25
+stream += k(SDP) + d(6) + k(END)       # 25:33
+stream += k(COM) + d(3)                # 33
+stream += k(STP) + d(9) + k(EDB)       # 37:48
+stream += k(STP) + d(5)                # 48:54, ended by COM
+stream += k(COM) + d(3) + d(2)         # 54
+stream += k(SDP) + d(40)               # 60:101, end of capture
+
+records = make_records(stream)
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_frames():
+    frames = find_frames(records)
+    assert list(frames["start"]) == [3, 25, 37, 48, 60]
+    assert list(frames["end"])   == [25, 33, 48, 54, 2*len(records)]
+    assert list(frames["type"])  == [STP.value, SDP.value, STP.value, STP.value, SDP.value]
+    assert list(frames["flags"]) == [0, 0, FRAME_NULLIFIED, FRAME_UNTERMINATED, FRAME_UNTERMINATED]
+
+def test_timeout():
+    frames = find_frames(records, timeout=8)
+    assert list(frames["flags"]) == [FRAME_UNTERMINATED, 0, FRAME_NULLIFIED, FRAME_UNTERMINATED, FRAME_UNTERMINATED]
+    assert frames["end"][0] == 2*(3//2 + 8)
+
+def test_symbols():
+    frames = find_frames(records)
+    payloads = list(frame_symbols(records, frames))
+    assert payloads[1] == bytes(v for kf, v in stream[25:33])
+
+def test_large():
+    # Vectorized framing of a few million symbols
+    frame  = k(STP) + d(30) + k(END)
+    big    = make_records(frame*50000)
+    frames = find_frames(big)
+    assert len(frames) == 50000
+    assert (frames["flags"] == 0).all()
+
+if __name__ == "__main__":
+    test_frames()
+    test_timeout()
+    test_symbols()
+    test_large()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+import numpy as np
+
+from pcie_analyzer.software.decoder import record_dtype
+from pcie_analyzer.software.frames import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_frames(nframes, ts=1000):
+    """Return filter like records and the (timestamp, symbols) of their frames"""
+    records = []
+    frames  = []
+    for i in range(nframes):
+        ts += random.randint(1, 100)
+        records += [(ts >> 16, 0, 0, 1, 0, 0), (ts & 0xffff, 0, 0, 1, 0, 0)]
+        length = random.randint(2, 20)
+        data   = [random.getrandbits(16) for j in range(length)]
+        for j, d in enumerate(data):
+            # Last frame has no eof
+            records.append((d, 0, 0, 0, j == 0, j == length - 1 and i != nframes - 1))
+        frames.append((ts, b"".join(d.to_bytes(2, "big") for d in data)))
+        ts += length
+    return np.array(records, dtype=record_dtype), frames
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+random.seed(0)
+records, frames = make_frames(300)
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_frames():
+    assert list(iter_frames([records])) == frames
+
+def test_chunks():
+    bounds = [0] + sorted(random.sample(range(1, len(records)), 150)) + [len(records)]
+    chunks = [records[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    assert list(iter_frames(chunks)) == frames
+
+def test_missing_eof():
+    # A frame without eof is closed by the next sof (time tokens are dropped)
+    lost = records.copy()
+    lost["eof"][np.flatnonzero(lost["eof"])[10]] = 0
+    assert list(iter_frames([lost])) == frames
+
+if __name__ == "__main__":
+    test_frames()
+    test_chunks()
+    test_missing_eof()
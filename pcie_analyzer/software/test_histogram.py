@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import pytest
+
+from pcie_analyzer.software.histogram import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+NBINS = 4
+
+class DummyRegister():
+    def __init__(self, client, name):
+        self.client = client
+        self.name   = name
+
+    def write(self, value):
+        self.client.writes.append((self.name, value))
+        self.client.csr[self.name] = value
+
+    def read(self):
+        return self.client.csr.get(self.name, 0)
+
+class DummyClient():
+    """Histogram CSRs and bins memory"""
+    class constants:
+        lengths_nbins = NBINS
+
+    class bases:
+        lengths_mem = 0x1000
+
+    def __init__(self):
+        self.csr    = {}
+        self.writes = []
+        self.reads  = []
+        self.regs   = type("regs", (), {})()
+        for name in ["enable", "clear"] + ["edge{:d}".format(i) for i in range(NBINS - 1)]:
+            setattr(self.regs, "lengths_" + name, DummyRegister(self, name))
+
+    def read(self, addr, length=None):
+        self.reads.append((addr, length))
+        return [10, 20, 30, 40][:length]
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_configure():
+    wb = DummyClient()
+    histogram = HistogramReader(wb, "lengths")
+    histogram.configure([4, 8, 16])
+    assert wb.writes == [("enable", 0), ("edge0", 4), ("edge1", 8), ("edge2", 16),
+                         ("clear", 1), ("enable", 1)]
+    with pytest.raises(ValueError):
+        histogram.configure([4, 8])
+    with pytest.raises(ValueError):
+        histogram.configure([4, 4, 16])
+
+def test_read():
+    wb = DummyClient()
+    histogram = HistogramReader(wb, "lengths")
+    histogram.configure([4, 8, 16])
+    assert histogram.bins() == [(0, 4, 10), (4, 8, 20), (8, 16, 30), (16, None, 40)]
+    # All bins in one burst
+    assert wb.reads == [(0x1000, NBINS)]
+
+def test_edges_from_board():
+    wb = DummyClient()
+    wb.csr.update({"edge0": 1, "edge1": 2, "edge2": 3})
+    histogram = HistogramReader(wb, "lengths")
+    assert [high for low, high, count in histogram.bins()] == [1, 2, 3, None]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+from pcie_analyzer.software.merge import *
+from pcie_analyzer.software.test_frames import make_frames
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_merge_frames():
+    random.seed(0)
+    streams = [("s{}".format(i), sorted(random.sample(range(1000), 100))) for i in range(4)]
+    merged  = list(merge_frames([(name, ((ts, b"") for ts in stamps)) for name, stamps in streams]))
+    assert [ts for ts, name, payload in merged] == sorted(ts for name, stamps in streams for ts in stamps)
+    for name, stamps in streams:
+        assert [ts for ts, n, payload in merged if n == name] == stamps
+
+def test_lazy():
+    # Streams are only read as far as needed
+    def frames(name, count):
+        for i in range(count):
+            pulled.append(name)
+            yield i, b""
+    pulled = []
+    merged = merge_frames([("rx", frames("rx", 10**9)), ("tx", frames("tx", 10**9))])
+    for i in range(10):
+        next(merged)
+    assert len(pulled) <= 12
+
+def test_merge_captures():
+    random.seed(0)
+    rx_records, rx_frames = make_frames(100)
+    tx_records, tx_frames = make_frames(100)
+    merged = list(merge_captures([("rx", [rx_records[:500], rx_records[500:]]), ("tx", [tx_records])]))
+    assert len(merged) == 200
+    assert [ts for ts, name, payload in merged] == sorted(ts for ts, payload in rx_frames + tx_frames)
+    assert [(ts, payload) for ts, name, payload in merged if name == "tx"] == tx_frames
+
+if __name__ == "__main__":
+    test_merge_frames()
+    test_lazy()
+    test_merge_captures()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import os
+import struct
+import tempfile
+
+from pcie_analyzer.software.pcapng import *
+from pcie_analyzer.software.test_frames import make_frames
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def read_blocks(filename):
+    """Return the (type, body) blocks of a PCAPNG file"""
+    blocks = []
+    with open(filename, "rb") as f:
+        datas = f.read()
+    offset = 0
+    while offset < len(datas):
+        block_type, length = struct.unpack_from("<II", datas, offset)
+        assert struct.unpack_from("<I", datas, offset + length - 4)[0] == length
+        assert length % 4 == 0
+        blocks.append((block_type, datas[offset + 8:offset + length - 4]))
+        offset += length
+    return blocks
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_export():
+    rx_records, rx_frames = make_frames(50)
+    tx_records, tx_frames = make_frames(30)
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "capture.pcapng")
+        assert export_pcapng(filename, [("rx", [rx_records]), ("tx", [tx_records[:100], tx_records[100:]])]) == 80
+        blocks = read_blocks(filename)
+
+    assert [t for t, body in blocks[:3]] == [SHB_TYPE, IDB_TYPE, IDB_TYPE]
+    assert struct.unpack_from("<I", blocks[0][1])[0] == BYTE_ORDER_MAGIC
+    assert struct.unpack_from("<H", blocks[1][1])[0] == LINKTYPE_USER0
+
+    packets = []
+    for block_type, body in blocks[3:]:
+        assert block_type == EPB_TYPE
+        interface, high, low, caplen, length = struct.unpack_from("<IIIII", body)
+        packets.append((interface, ((high << 32) | low)//TICK_NS, body[20:20 + caplen]))
+    expected = [(0, ts, data) for ts, data in rx_frames] + [(1, ts, data) for ts, data in tx_frames]
+    assert packets == sorted(expected, key=lambda packet: packet[1])
+
+def test_same_direction():
+    # Two RX captures, ie from two boards, keep their own interface
+    first, first_frames   = make_frames(20)
+    second, second_frames = make_frames(10)
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "capture.pcapng")
+        assert export_pcapng(filename, iter([("rx", [first]), ("rx", [second])])) == 30
+        blocks = read_blocks(filename)
+
+    assert [t for t, body in blocks[:3]] == [SHB_TYPE, IDB_TYPE, IDB_TYPE]
+    for i, (block_type, body) in enumerate(blocks[1:3]):
+        assert struct.pack("<HH", OPT_IF_NAME, 2) + b"rx" in body
+        description = "Capture {:d} (rx)".format(i).encode()
+        assert struct.pack("<HH", OPT_IF_DESCRIPTION, len(description)) + description in body
+    interfaces = [struct.unpack_from("<I", body)[0] for block_type, body in blocks[3:]]
+    assert sorted(interfaces) == [0]*20 + [1]*10
+
+if __name__ == "__main__":
+    test_export()
+    test_same_direction()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from pcie_analyzer.software.decoder import *
+from pcie_analyzer.software.ring import *
+from pcie_analyzer.software.test_decoder import make_record, make_block
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+DW     = 256
+NB     = (DW - 12)//22
+BLOCK  = DW//8
+BASE   = 0x1000
+NBLOCK = 16
+
+def make_ring(nwritten):
+    """Simulate a ring where nwritten blocks have been recorded.
+
+    Block n holds the records n*NB .. n*NB + NB - 1 and is written at
+    block n % NBLOCK. Return the ring buffer and the next write address.
+    """
+    ring = [bytes(BLOCK)]*NBLOCK
+    for n in range(nwritten):
+        records = [make_record((n*NB + i) & 0xffff) for i in range(NB)]
+        ring[n % NBLOCK] = make_block(records, NB, DW, first=(n == 0))
+    return b"".join(ring), BASE + (nwritten % NBLOCK)*BLOCK
+
+def data(records):
+    return [int(d) for d in records["data"]]
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_not_wrapped():
+    buf, wr_addr = make_ring(10)
+    ring = RingCapture.from_buffer(buf, BASE, len(buf), DW, BASE + 4*BLOCK, wr_addr)
+    assert not ring.wrapped
+    assert len(ring) == 10
+    assert ring.ranges() == [(0, 10*BLOCK)]
+    assert data(ring.decode(buf, RecordDecoder(NB, DW))) == list(range(10*NB))
+
+def test_full_not_wrapped():
+    buf, wr_addr = make_ring(NBLOCK)
+    ring = RingCapture.from_buffer(buf, BASE, len(buf), DW, BASE, wr_addr)
+    assert not ring.wrapped
+    assert len(ring) == NBLOCK
+
+def test_wrapped():
+    buf, wr_addr = make_ring(NBLOCK + 5)
+    ring = RingCapture.from_buffer(buf, BASE, len(buf), DW, BASE + 8*BLOCK, wr_addr)
+    assert ring.wrapped
+    assert ring.ranges() == [(5*BLOCK, (NBLOCK - 5)*BLOCK), (0, 5*BLOCK)]
+    assert data(ring.decode(buf, RecordDecoder(NB, DW))) == list(range(5*NB, (NBLOCK + 5)*NB))
+
+def test_window():
+    buf, wr_addr = make_ring(NBLOCK + 5)
+    # Trigger in block 18, stored at ring block 2
+    ring = RingCapture.from_buffer(buf, BASE, len(buf), DW, BASE + 2*BLOCK, wr_addr)
+    assert ring.trig_index == 13
+    assert ring.ranges(pre_blocks=4, post_blocks=2) == [(14*BLOCK, 2*BLOCK), (0, 4*BLOCK)]
+    segments = ring.segments(buf, pre_blocks=4, post_blocks=2)
+    assert [s.obj is memoryview(buf).obj for s in segments] == [True, True]
+    assert data(ring.decode(buf, RecordDecoder(NB, DW), 4, 2)) == list(range(14*NB, 20*NB))
+
+def test_blocks_for():
+    assert blocks_for(NB, NB) == 2
+    assert blocks_for(NB + 1, NB) == 3
+
+if __name__ == "__main__":
+    test_not_wrapped()
+    test_full_not_wrapped()
+    test_wrapped()
+    test_window()
+    test_blocks_for()
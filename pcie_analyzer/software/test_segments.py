@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import struct
+
+import pytest
+
+from pcie_analyzer.software.decoder import *
+from pcie_analyzer.software.segments import *
+from pcie_analyzer.software.test_decoder import make_record, make_block
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+MEM_BASE = 0x40000000
+TABLE    = 0x2000
+BASE     = 0x1000
+DW       = 256
+NB       = (DW - 12)//22
+BLOCK    = DW//8
+LENGTH   = 16*BLOCK
+
+class DummyRegister():
+    def __init__(self, client, name):
+        self.client = client
+        self.name   = name
+
+    def read(self):
+        return self.client.csr.get(self.name, 0)
+
+    def write(self, value):
+        self.client.writes.append((self.name, value))
+        self.client.csr[self.name] = value
+
+class DummyClient():
+    """Segmented RingRecorder CSRs, its table and the ring in DDR"""
+    class constants:
+        rx_recorder_dw          = DW
+        rx_recorder_maxsegments = 4
+
+    class bases:
+        rx_recorder_table = TABLE
+
+    class mems:
+        class main_ram:
+            base = MEM_BASE
+
+    def __init__(self, table, ring):
+        self.csr    = {"base": BASE, "length": LENGTH}
+        self.writes = []
+        self.reads  = []
+        self.table  = table
+        self.ring   = ring
+        self.regs   = type("regs", (), {})()
+        for name in ["segments", "segmentSize", "segment", "base", "length"]:
+            setattr(self.regs, "rx_recorder_" + name, DummyRegister(self, name))
+
+    def read(self, addr, length=None):
+        self.reads.append((addr, length))
+        if addr >= MEM_BASE:
+            offset = addr - MEM_BASE - BASE
+            return list(struct.unpack_from("<{:d}I".format(length), self.ring, offset))
+        return self.table[(addr - TABLE)//4:(addr - TABLE)//4 + length]
+
+def make_segments(windows):
+    """Two segments of 8 blocks, windows[i] blocks recorded in segment i from record 1000*i"""
+    ring  = b""
+    table = []
+    for i, nwritten in enumerate(windows):
+        base   = BASE + i*8*BLOCK
+        blocks = [bytes(BLOCK)]*8
+        for n in range(nwritten):
+            records = [make_record(1000*i + n*NB + j) for j in range(NB)]
+            blocks[n % 8] = make_block(records, NB, DW, first=(n == 0))
+        ring += b"".join(blocks)
+        # trigAddr, wrAddr, trigTime, preCount, postCount
+        table += [base + 2*BLOCK, base + (nwritten % 8)*BLOCK, 100*(i + 1), 2*NB, 3*NB]
+    return table, ring
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_configure():
+    wb       = DummyClient([], b"")
+    segments = SegmentedCapture(wb, "rx_recorder")
+    assert segments.configure(3) == 5*BLOCK
+    assert wb.writes == [("segmentSize", 5*BLOCK), ("segments", 3)]
+    assert segments.configure(0) == 0
+    with pytest.raises(ValueError):
+        segments.configure(5)
+
+def test_table():
+    table, ring = make_segments([5, 10])
+    wb       = DummyClient(table, ring)
+    segments = SegmentedCapture(wb, "rx_recorder")
+    segments.configure(2)
+    wb.csr["segment"] = 2
+    entries = segments.table()
+    # One burst for the whole table
+    assert wb.reads == [(TABLE, 10)]
+    assert [(entry.index, entry.base, entry.size) for entry in entries] == [(0, BASE, 8*BLOCK),
+                                                                           (1, BASE + 8*BLOCK, 8*BLOCK)]
+    assert [entry.trigTime for entry in entries] == [100, 200]
+    assert entries[1].wrAddr == BASE + 10*BLOCK
+
+    # Nothing filled yet
+    wb.csr["segment"] = 0
+    assert segments.table() == []
+
+def test_captures():
+    table, ring = make_segments([5, 10])
+    wb       = DummyClient(table, ring)
+    segments = SegmentedCapture(wb, "rx_recorder", mem_base=MEM_BASE)
+    wb.csr.update({"segmentSize": 8*BLOCK, "segment": 2})
+    decoder  = RecordDecoder(NB, DW)
+    datas    = []
+    for entry, ring, buf in segments.captures():
+        datas.append([int(d) for d in ring.decode(buf, decoder)["data"]])
+    # Segment 0 did not wrap, segment 1 did
+    assert datas[0] == list(range(5*NB))
+    assert datas[1] == list(range(1000 + 2*NB, 1000 + 10*NB))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import asyncio
+
+from pcie_analyzer.software.status import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+class DummyRegister():
+    def __init__(self, addr, length=1):
+        self.addr       = addr
+        self.length     = length
+        self.data_width = 32
+
+class DummyClient():
+    """RingRecorder status CSRs, finished after some reads"""
+    csr_data_width = 32
+
+    class regs:
+        rx_recorder_finished  = DummyRegister(0x08)
+        rx_recorder_size      = DummyRegister(0x0c)
+        rx_recorder_offset    = DummyRegister(0x10)
+        rx_recorder_trigAddr  = DummyRegister(0x14)
+        rx_recorder_wrAddr    = DummyRegister(0x18)
+        rx_recorder_state     = DummyRegister(0x1c)
+        rx_recorder_mode      = DummyRegister(0x20)
+        rx_recorder_preCount  = DummyRegister(0x24)
+        rx_recorder_postCount = DummyRegister(0x28, 2)
+
+    def __init__(self, finish_after):
+        self.finish_after = finish_after
+        self.reads = []
+
+    def read(self, addr, length=None):
+        self.reads.append((addr, length))
+        finished = len(self.reads) >= self.finish_after
+        mem = {0x08: finished, 0x14: 0x1234, 0x18: 0x5678, 0x1c: 6, 0x24: 10, 0x28: 1, 0x2c: 2}
+        return [mem.get(addr + 4*i, 0) for i in range(length)]
+
+class AsyncClient(DummyClient):
+    async def read(self, addr, length=None):
+        return DummyClient.read(self, addr, length)
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_read():
+    wb = DummyClient(1)
+    status = recorder_status(wb, "rx_recorder").read()
+    assert wb.reads == [(0x08, 10)]
+    assert status == {"finished": 1, "state": 6, "trigAddr": 0x1234, "wrAddr": 0x5678,
+                      "preCount": 10, "postCount": (1 << 32) | 2}
+
+def test_wait():
+    wb = DummyClient(5)
+    status = recorder_status(wb, "rx_recorder", min_interval=1e-4).wait(timeout=1)
+    assert status["finished"]
+    assert len(wb.reads) == 5
+
+def test_timeout():
+    poller = recorder_status(DummyClient(10**9), "rx_recorder", min_interval=1e-3, max_interval=1e-2)
+    try:
+        poller.wait(timeout=0.05)
+    except TimeoutError:
+        # Backoff keeps the number of polls low
+        assert poller.polls < 15
+        return
+    assert False
+
+def test_wait_async():
+    wb = AsyncClient(3)
+    poller = recorder_status(wb, "rx_recorder", min_interval=1e-4)
+    status = asyncio.get_event_loop().run_until_complete(poller.wait_async(timeout=1))
+    assert status["trigAddr"] == 0x1234
+
+if __name__ == "__main__":
+    test_read()
+    test_wait()
+    test_timeout()
+    test_wait_async()
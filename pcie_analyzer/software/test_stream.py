@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import struct
+
+from pcie_analyzer.software.stream import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+MEM_BASE = 0x40000000
+BASE     = 0x1000
+LENGTH   = 0x200
+BLOCK    = 32
+
+class DummyRegister():
+    def __init__(self, client, name, addr, length=1):
+        self.client = client
+        self.name   = name
+        self.addr   = addr
+        self.length = length
+
+    def read(self):
+        return self.client.csr[self.name]
+
+    def write(self, value):
+        self.client.writes.append((self.name, value))
+        self.client.csr[self.name] = value
+
+class DummyClient():
+    """Streaming RingRecorder CSRs, the ring is a DDR area of blocks holding their address"""
+    csr_data_width = 32
+
+    class constants:
+        rx_recorder_nb     = 11
+        rx_recorder_dw     = 8*BLOCK
+
+    class mems:
+        class main_ram:
+            base = MEM_BASE
+
+    def __init__(self):
+        self.csr    = {"finished": 0, "wrAddr": BASE, "overruns": 3, "base": BASE, "length": LENGTH}
+        self.writes = []
+        self.regs   = type("regs", (), {})()
+        names = ["finished", "state", "trigAddr", "wrAddr", "preCount", "postCount",
+                 "start", "stop", "streaming", "backpressure", "rdAddr", "overruns", "base", "length"]
+        for i, name in enumerate(names):
+            setattr(self.regs, "rx_recorder_" + name, DummyRegister(self, name, 4*i))
+        self.mem = b"".join(struct.pack("<I", addr)*(BLOCK//4) for addr in range(BASE, BASE + LENGTH, BLOCK))
+
+    def read(self, addr, length=None):
+        if addr >= MEM_BASE:
+            offset = addr - MEM_BASE - BASE
+            return list(struct.unpack_from("<{:d}I".format(length), self.mem, offset))
+        # Status burst
+        names = ["finished", "state", "trigAddr", "wrAddr", "preCount", "postCount"]
+        return [self.csr.get(names[addr//4 + i], 0) if addr//4 + i < len(names) else 0
+                for i in range(length)]
+
+def block_addrs(buf):
+    return [struct.unpack_from("<I", buf, offset)[0] for offset in range(0, len(buf), BLOCK)]
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_ranges():
+    drainer = RingDrainer(DummyClient(), "rx_recorder")
+    drainer.rdAddr = BASE + 0x40
+    assert drainer.ranges(BASE + 0x40) == []
+    assert drainer.ranges(BASE + 0x100) == [(BASE + 0x40, 0xc0)]
+    assert drainer.ranges(BASE + 0x20) == [(BASE + 0x40, 0x1c0), (BASE, 0x20)]
+    assert drainer.ranges(BASE) == [(BASE + 0x40, 0x1c0)]
+
+def test_drain():
+    wb      = DummyClient()
+    drainer = RingDrainer(wb, "rx_recorder")
+    drainer.start(backpressure=True)
+    assert wb.writes == [("rdAddr", BASE), ("backpressure", 1), ("streaming", 1), ("start", 1)]
+
+    blocks = []
+    write  = lambda buf: blocks.extend(block_addrs(buf))
+
+    # Nothing written yet
+    assert drainer.drain(write) == 0
+
+    wb.csr["wrAddr"] = BASE + 0x180
+    assert drainer.drain(write) == 0x180
+    assert wb.csr["rdAddr"] == BASE + 0x180
+
+    # Ring wrapped
+    wb.csr["wrAddr"] = BASE + 0x40
+    assert drainer.drain(write) == 0xc0
+    assert wb.csr["rdAddr"] == BASE + 0x40
+
+    # Blocks come out in time order, across the wrap
+    expected = list(range(BASE, BASE + LENGTH, BLOCK)) + [BASE, BASE + BLOCK]
+    assert blocks == expected
+    assert drainer.drained == 0x240
+
+def test_stop():
+    wb      = DummyClient()
+    drainer = RingDrainer(wb, "rx_recorder")
+    drainer.start()
+    wb.csr["finished"] = 1
+    wb.csr["wrAddr"]   = BASE + 0x20
+
+    blocks = []
+    assert drainer.stop(lambda buf: blocks.extend(block_addrs(buf)), timeout=1) == 3
+    assert blocks == [BASE]
+    # Two stops: one to flush and drain the last block, one back to idle
+    assert [name for name, value in wb.writes].count("stop") == 2
+    assert wb.csr["streaming"] == 0
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+import numpy as np
+
+from pcie_analyzer.software.decoder import record_dtype
+from pcie_analyzer.software.timestamps import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_stream(nframes, ts=0x1234fff0):
+    """Return filter like records and the expected timestamp of each of them"""
+    records  = []
+    expected = []
+    for i in range(nframes):
+        ts += random.randint(1, 100)
+        records  += [((ts >> 16) & 0xffff, 0, 0, 1, 0, 0), (ts & 0xffff, 0, 0, 1, 0, 0)]
+        expected += [TS_UNKNOWN, TS_UNKNOWN]
+        for j in range(random.randint(1, 20)):
+            records.append((random.getrandbits(16), 0, 0, 0, j == 0, 0))
+            expected.append(ts + j)
+        ts += j
+    return np.array(records, dtype=record_dtype), np.array(expected)
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+random.seed(0)
+records, expected = make_stream(500)
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_update():
+    assert (TimestampTracker().update(records) == expected).all()
+
+def test_chunks():
+    # Chunk boundaries fall everywhere, including between token halves
+    tracker = TimestampTracker()
+    bounds  = [0] + sorted(random.sample(range(1, len(records)), 200)) + [len(records)]
+    ts = np.concatenate([tracker.update(records[a:b]) for a, b in zip(bounds[:-1], bounds[1:])])
+    assert (ts == expected).all()
+
+def test_orphan_lsb():
+    # Capture starting on the LSB half of a token
+    ts = TimestampTracker().update(records[1:])
+    first = np.flatnonzero(records["time"][3:])[0] + 3
+    assert (ts[:first - 1] == TS_UNKNOWN).all()
+    assert (ts[first - 1:] == expected[first:]).all()
+
+def test_wrap():
+    # Time counter wrapping twice, with a trigger token slightly ahead
+    # (tokens less than half a period apart)
+    records, expected = make_stream(200, ts=0xffffff00)
+    for ts in [0x7fffff00, 0xffffff00]:
+        records2, expected2 = make_stream(200, ts=ts)
+        records  = np.concatenate([records, records2])
+        expected = np.concatenate([expected, np.where(expected2 < 0, expected2, expected2 + (1 << 32))])
+    ahead    = np.array([(0xffff, 0, 1, 1, 0, 0), (0xff80, 0, 1, 1, 0, 0)], dtype=records.dtype)
+    records  = np.concatenate([ahead, records])
+    expected = np.concatenate([[TS_UNKNOWN, TS_UNKNOWN], expected])
+    ts = TimestampTracker().update(records)
+    assert ts.max() > (2 << 32)
+    assert (ts == expected).all()
+
+def test_behind_wrap():
+    # A token slightly behind the previous one, across a wrap
+    values  = [0xfffffff0, 0x10, 0xfffffff8, 0x20]
+    records = np.array([record for value in values for record in
+                        [(value >> 16, 0, 0, 1, 0, 0), (value & 0xffff, 0, 0, 1, 0, 0), (0, 0, 0, 0, 0, 0)]],
+                       dtype=record_dtype)
+    ts = TimestampTracker().update(records)
+    assert list(ts[2::3]) == [0xfffffff0, 0x100000010, 0x0fffffff8, 0x100000020]
+
+def test_extract():
+    compact, ts = zip(*extract_timestamps([records[:1001], records[1001:]]))
+    compact, ts = np.concatenate(compact), np.concatenate(ts)
+    assert not compact["time"].any()
+    assert (ts == expected[expected != TS_UNKNOWN]).all()
+
+if __name__ == "__main__":
+    test_update()
+    test_chunks()
+    test_orphan_lsb()
+    test_wrap()
+    test_extract()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import pytest
+
+from pcie_analyzer.software.traffic_stats import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+class DummyRegister():
+    def __init__(self, client, addr, length=1):
+        self.client     = client
+        self.addr       = addr
+        self.length     = length
+        self.data_width = 32
+
+    def write(self, value):
+        self.client.snapshot()
+
+class DummyClient():
+    """TrafficStats CSRs: 32-bit snapshots, 48-bit counters"""
+    csr_data_width = 32
+
+    def __init__(self, latency=2, stuck=False):
+        self.latency = latency  # Reads before the snapshot is done
+        self.stuck   = stuck
+        self.mem     = {}
+        self.reads   = []
+        self.pending = None
+        self.regs    = type("regs", (), {})()
+
+        self.regs.rx_stats_snapshot = DummyRegister(self, 0x00)
+        addr = 0x04
+        for name in ["snapshots", "cycles"] + STATS_COUNTERS:
+            length = 1 if name == "snapshots" else 2
+            setattr(self.regs, "rx_stats_" + name, DummyRegister(self, addr, length))
+            addr += 4*length
+        self.snapshots = self.regs.rx_stats_snapshots.addr
+        self.cycles    = self.regs.rx_stats_cycles.addr
+
+    def snapshot(self):
+        self.pending = self.latency
+
+    def read(self, addr, length=None):
+        self.reads.append((addr, length))
+        if self.pending is not None and not self.stuck:
+            self.pending -= 1
+            if self.pending == 0:
+                self.pending = None
+                self.mem[self.snapshots] = self.mem.get(self.snapshots, 0) + 1
+                # 2^32 + 125e6 cycles, split in two 32-bit words
+                self.mem[self.cycles]     = 1
+                self.mem[self.cycles + 4] = 125000000
+                self.mem[self.regs.rx_stats_tlpFrames.addr + 4]          = 1000
+                self.mem[self.regs.rx_stats_tlpSymbols.addr + 4]         = 60
+                self.mem[self.regs.rx_stats_logicalIdleSymbols.addr + 4] = 40
+        return [self.mem.get(addr + 4*i, 0) for i in range(length)]
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_snapshot():
+    wb    = DummyClient()
+    stats = TrafficStats(wb, "rx_stats")
+    values = stats.snapshot()
+    assert values["snapshots"] == 1
+    assert values["cycles"] == (1 << 32) + 125000000
+    assert values["tlpFrames"] == 1000
+    # All counters are read in one burst per poll
+    assert len(set(wb.reads)) == 1
+    assert set(values) == set(["snapshots", "cycles"] + STATS_COUNTERS)
+
+def test_rates():
+    stats = TrafficStats(DummyClient(), "rx_stats")
+    values = stats.snapshot()
+    values["cycles"] = 125000000
+    rates = stats.rates(values)
+    assert rates["tlp"] == (1000, 0.6)
+    assert rates["logicalIdle"] == (0, 0.4)
+    assert rates["dllp"] == (0, 0)
+
+def test_timeout():
+    stats = TrafficStats(DummyClient(stuck=True), "rx_stats")
+    with pytest.raises(TimeoutError):
+        stats.snapshot(timeout=0.05)
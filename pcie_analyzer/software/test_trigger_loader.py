@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from pcie_analyzer.software.trigger_loader import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+class DummyRegister():
+    def __init__(self):
+        self.value  = None
+        self.writes = 0
+
+    def write(self, value):
+        self.value   = value
+        self.writes += 1
+
+    def read(self):
+        return self.value
+
+class DummyClient():
+    """Record wb.write() bursts"""
+    class regs:
+        rx_trigger_size = DummyRegister()
+    class bases:
+        rx_trigger_mem = 0x1000
+
+    def __init__(self):
+        self.mem    = {}
+        self.writes = 0
+
+    def write(self, addr, datas):
+        self.writes += 1
+        for i, data in enumerate(datas):
+            self.mem[addr + 4*i] = data
+
+class SequenceClient(DummyClient):
+    """Trigger with a 2 stages sequencer or bank"""
+    def __init__(self):
+        DummyClient.__init__(self)
+        self.regs = type("regs", (), {})()
+        for name in ["size", "stages", "base1", "size1", "count0", "count1",
+                     "timeout0", "timeout1", "restart0", "restart1",
+                     "bank", "bankEnable", "fired",
+                     "qualifier", "nth", "rateCount", "rateWindow", "matches",
+                     "errorEnable", "errorClass",
+                     "inactivityTicks", "elecIdleTicks", "trainingTicks", "linkTimeout", "reload"]:
+            setattr(self.regs, "rx_trigger_" + name, DummyRegister())
+
+    def reg(self, name):
+        return getattr(self.regs, "rx_trigger_" + name).value
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+pattern = [(0, make_mem_data(0b00, 0b11, 0xbcf7)),
+           (1, make_mem_data(0b11, 0b00, 0x0000)),
+           (2, make_mem_data(0b11, 0b00, 0x0000)),
+           (3, make_mem_data(0b00, 0b00, 0x4a4a))]
+
+def test_load():
+    wb = DummyClient()
+    loader = TriggerLoader(wb, "rx_trigger")
+    assert loader.load(pattern)
+    assert wb.writes == 1
+    assert [wb.mem[0x1000 + 4*addr] for addr, word in pattern] == [word for addr, word in pattern]
+    assert wb.regs.rx_trigger_size.value == 4
+
+def test_cache():
+    wb = DummyClient()
+    assert TriggerLoader(wb, "rx_trigger").load(pattern)
+    # Another loader of the same client shares the cache
+    assert not TriggerLoader(wb, "rx_trigger").load([word for addr, word in pattern])
+    assert wb.writes == 1
+    assert TriggerLoader(wb, "rx_trigger").load(pattern, force=True)
+    assert TriggerLoader(wb, "rx_trigger").load(pattern[:2])
+    assert wb.writes == 3
+
+def test_too_large():
+    loader = TriggerLoader(DummyClient(), "rx_trigger", mem_size=2)
+    try:
+        loader.load(pattern)
+    except ValueError:
+        return
+    assert False
+
+def test_sequence():
+    wb = SequenceClient()
+    loader = TriggerLoader(wb, "rx_trigger")
+    request = [make_mem_data(0b00, 0b10, 0xfb00), make_mem_data(0b00, 0b00, 0x0004)]
+    assert loader.load_sequence([Stage(pattern, count=2), Stage(request, timeout=1000, restart=True)])
+    assert wb.writes == 1
+    assert [wb.mem[0x1000 + 4*i] for i in range(6)] == [word for addr, word in pattern] + request
+    assert (wb.reg("size"), wb.reg("count0"), wb.reg("timeout0"), wb.reg("restart0")) == (4, 2, 0, 0)
+    assert (wb.reg("base1"), wb.reg("size1"), wb.reg("count1"), wb.reg("timeout1"), wb.reg("restart1")) == (4, 2, 1, 1000, 1)
+    assert wb.reg("stages") == 2
+    assert wb.regs.rx_trigger_reload.writes == 1
+
+    # Cached, then back to a single pattern
+    assert not loader.load_sequence([(pattern, 2), (request, 1, 1000, True)])
+    assert loader.load(request)
+    assert wb.reg("stages") == 1
+    assert wb.reg("bank") == 0
+
+def test_load_after_sequence():
+    # Stage 0 settings of a sequence do not apply to a single pattern
+    wb = SequenceClient()
+    loader = TriggerLoader(wb, "rx_trigger")
+    assert Stage(pattern) == (pattern, 1, 0, False)
+    assert loader.load_sequence([Stage(pattern, count=3, timeout=500, restart=True), Stage(pattern)])
+    assert loader.load(pattern)
+    assert (wb.reg("stages"), wb.reg("count0"), wb.reg("timeout0"), wb.reg("restart0")) == (1, 1, 0, 0)
+
+def test_sequence_too_long():
+    loader = TriggerLoader(SequenceClient(), "rx_trigger")
+    for stages in [[], [pattern]*3]:
+        try:
+            loader.load_sequence(stages)
+        except ValueError:
+            continue
+        assert False
+
+def test_bank():
+    wb = SequenceClient()
+    loader = TriggerLoader(wb, "rx_trigger")
+    request = [make_mem_data(0b00, 0b10, 0xfb00), make_mem_data(0b00, 0b00, 0x0004)]
+    assert loader.load_bank([pattern, request])
+    assert [wb.mem[0x1000 + 4*i] for i in range(6)] == [word for addr, word in pattern] + request
+    assert (wb.reg("size"), wb.reg("base1"), wb.reg("size1")) == (4, 4, 2)
+    assert (wb.reg("bank"), wb.reg("bankEnable")) == (1, 0b11)
+
+    # Not the same as the sequence of the same patterns
+    assert not loader.load_bank([pattern, request])
+    assert loader.load_sequence([Stage(pattern), Stage(request)])
+    assert wb.reg("bank") == 0
+
+    loader.load_bank([pattern, request])
+    loader.enable_patterns([1])
+    assert wb.reg("bankEnable") == 0b10
+    wb.regs.rx_trigger_fired.write(1)
+    assert loader.fired() == 1
+
+def test_qualify():
+    wb = SequenceClient()
+    loader = TriggerLoader(wb, "rx_trigger")
+    loader.qualify(nth=1000)
+    assert (wb.reg("qualifier"), wb.reg("nth")) == (QUALIFIER_NTH, 1000)
+    loader.qualify(rate=(10, 5000))
+    assert (wb.reg("qualifier"), wb.reg("rateCount"), wb.reg("rateWindow")) == (QUALIFIER_RATE, 10, 5000)
+    loader.qualify()
+    assert wb.reg("qualifier") == QUALIFIER_FIRST
+    try:
+        loader.qualify(nth=2, rate=(10, 5000))
+    except ValueError:
+        pass
+    else:
+        assert False
+    wb.regs.rx_trigger_matches.write(12)
+    assert loader.matches() == 12
+
+def test_errors():
+    wb = SequenceClient()
+    loader = TriggerLoader(wb, "rx_trigger")
+    loader.load(pattern)
+    loader.trigger_on_errors(["edb", "filter"])
+    assert wb.reg("errorEnable") == 0b11
+    assert wb.reg("size") == 4
+
+    # Errors only: the pattern is loaded again afterwards
+    loader.trigger_on_errors(["disparity"], patterns=False)
+    assert (wb.reg("errorEnable"), wb.reg("size")) == (0b100, 0)
+    assert loader.load(pattern)
+    try:
+        loader.trigger_on_errors(["crc"])
+    except ValueError:
+        pass
+    else:
+        assert False
+
+    wb.regs.rx_trigger_errorClass.write(0b1010)
+    assert loader.fired_errors() == ["edb", "notintable"]
+
+def test_timeouts():
+    wb = SequenceClient()
+    loader = TriggerLoader(wb, "rx_trigger")
+    loader.trigger_on_timeouts(inactivity=125000, training=250000)
+    assert (wb.reg("inactivityTicks"), wb.reg("elecIdleTicks"), wb.reg("trainingTicks")) == (125000, 0, 250000)
+    wb.regs.rx_trigger_linkTimeout.write(0b100)
+    assert loader.fired_timeouts() == ["training"]
+
+if __name__ == "__main__":
+    test_load()
+    test_cache()
+    test_too_large()
+    test_sequence()
+    test_load_after_sequence()
+    test_sequence_too_long()
+    test_bank()
+    test_qualify()
+    test_errors()
+    test_timeouts()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+import socket
+import struct
+
+import numpy as np
+
+from pcie_analyzer.software.udp_receiver import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+BLOCK_SIZE = 32
+
+random.seed(0)
+dram = bytes(random.getrandbits(8) for i in range(0x4000))
+
+class DummyRegister():
+    def __init__(self, client, name):
+        self.client = client
+        self.name   = name
+
+    def read(self):
+        if self.name == "finished":
+            return self.client.finished()
+        return self.client.csr[self.name]
+
+    def write(self, value):
+        self.client.csr[self.name] = value
+        if self.name == "start":
+            self.client.push()
+
+class DummyClient():
+    """UDPStreamer CSRs, datagrams are sent from a local socket on start"""
+    class constants:
+        udp_streamer_dw        = 8*BLOCK_SIZE
+        udp_streamer_maxblocks = 45
+
+    def __init__(self, lost=(), busy=3):
+        self.csr    = {}
+        self.lost   = set(lost) # Sequence numbers lost, on the first start only
+        self.starts = 0
+        self.busy   = busy      # finished reads at 0 after a start
+        self.left   = 0
+        self.regs   = type("regs", (), {})()
+        for name in ["start", "finished", "ipAddress", "dstPort", "addr", "size", "blocks"]:
+            setattr(self.regs, "udp_streamer_" + name, DummyRegister(self, name))
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def finished(self):
+        if self.left:
+            self.left -= 1
+            return 0
+        return 1
+
+    def push(self):
+        # The streamer ignores a start until finished
+        assert self.left == 0
+        self.left = self.busy
+        addr, size, blocks = self.csr["addr"], self.csr["size"], self.csr["blocks"]
+        for seq, offset in enumerate(range(0, size, blocks*BLOCK_SIZE)):
+            if self.starts == 0 and seq in self.lost:
+                continue
+            payload = dram[addr + offset:addr + min(offset + blocks*BLOCK_SIZE, size)]
+            self.sock.sendto(struct.pack("<II", seq, addr + offset) + payload,
+                             ("127.0.0.1", self.csr["dstPort"]))
+        self.starts += 1
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_decode():
+    seq, address, payload = decode_datagram(struct.pack("<II", 3, 0x1000) + b"\x01\x02")
+    assert (seq, address, bytes(payload)) == (3, 0x1000, b"\x01\x02")
+    assert ip_to_int("192.168.1.100") == 0xc0a80164
+
+def test_missing():
+    received = np.array([1, 0, 0, 1, 1, 0], dtype=bool)
+    assert missing_areas(received, BLOCK_SIZE) == [(BLOCK_SIZE, 2*BLOCK_SIZE), (5*BLOCK_SIZE, BLOCK_SIZE)]
+    assert missing_areas(np.ones(4, dtype=bool), BLOCK_SIZE) == []
+
+def test_upload():
+    wb = DummyClient()
+    with UDPReceiver(port=0) as receiver:
+        uploader = PushUploader(wb, "127.0.0.1", receiver=receiver, blocks=4)
+        assert wb.csr["dstPort"] == receiver.port
+        buf = uploader.upload(0x400, 0x1000)
+    assert buf == dram[0x400:0x1400]
+    assert uploader.requests == 1
+    assert receiver.datagrams == 0x1000//(4*BLOCK_SIZE)
+
+def test_blocks():
+    with UDPReceiver(port=0) as receiver:
+        for blocks in [0, 46]:
+            try:
+                PushUploader(DummyClient(), "127.0.0.1", receiver=receiver, blocks=blocks)
+            except ValueError:
+                continue
+            assert False
+
+def test_upload_lost():
+    wb = DummyClient(lost=[2, 5, 6])
+    with UDPReceiver(port=0, timeout=0.05) as receiver:
+        uploader = PushUploader(wb, "127.0.0.1", receiver=receiver, blocks=4)
+        buf = uploader.upload(0, 0x1000)
+    assert buf == dram[:0x1000]
+    # Lost datagrams are requested again, as two areas
+    assert uploader.requests == 3
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import io
+import os
+import random
+import struct
+import tempfile
+
+from pcie_analyzer.software.uploader import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+class DummyClient():
+    """Serve wb.read() bursts from a bytes buffer mapped at base"""
+    def __init__(self, base, mem):
+        self.base  = base
+        self.mem   = mem
+        self.reads = 0
+
+    def read(self, addr, length=None):
+        assert length <= ETHERBONE_BURST_MAX
+        self.reads += 1
+        offset = addr - self.base
+        return list(struct.unpack_from("<{:d}I".format(length), self.mem, offset))
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+BASE = 0x40000000
+SIZE = 0x10000
+
+random.seed(0)
+mem = bytes(random.getrandbits(8) for i in range(SIZE))
+
+# *********************************************************
+# *                                                       *
+# *                      Run tests                        *
+# *                                                       *
+# *********************************************************
+
+def test_upload():
+    wb = DummyClient(BASE, mem)
+    uploader = Uploader(wb)
+    datas = uploader.upload(BASE + 0x100, 0x2000)
+    assert datas == mem[0x100:0x2100]
+    assert wb.reads == -(-0x2000 // (4*ETHERBONE_BURST_MAX))
+
+def test_upload_clients():
+    clients = [DummyClient(BASE, mem) for i in range(4)]
+    uploader = Uploader(clients[0], clients=clients)
+    uploaded = []
+    datas = uploader.upload(BASE, SIZE, progress=uploaded.append)
+    assert datas == mem
+    assert sum(uploaded) == SIZE
+    assert all(client.reads > 0 for client in clients)
+
+def test_upload_to_file():
+    wb = DummyClient(BASE, mem)
+    uploader = Uploader(wb, burst_length=64)
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "capture.bin")
+        uploader.upload_to_file(BASE + 4, SIZE - 8, filename)
+        with open(filename, "rb") as f:
+            assert f.read() == mem[4:SIZE - 4]
+
+def test_upload_unaligned():
+    uploader = Uploader(DummyClient(BASE, mem))
+    try:
+        uploader.upload(BASE + 2, 0x100)
+    except ValueError:
+        return
+    assert False
+
+def test_upload_concurrent():
+    rx = Uploader(DummyClient(BASE, mem))
+    tx = Uploader(DummyClient(BASE, mem), clients=[DummyClient(BASE, mem) for i in range(2)])
+    out = io.StringIO()
+    progress = UploadProgress({"rx": 0x1000, "tx": 0x3000}, out=out)
+    bufs = upload_concurrent([("rx", rx, BASE, 0x1000), ("tx", tx, BASE + 0x8000, 0x3000)], progress)
+    assert bufs["rx"] == mem[:0x1000]
+    assert bufs["tx"] == mem[0x8000:0xb000]
+    assert progress.done == progress.totals
+    assert out.getvalue().endswith("rx 100% | tx 100%\n")
+
+if __name__ == "__main__":
+    test_upload()
+    test_upload_clients()
+    test_upload_to_file()
+    test_upload_unaligned()
+    test_upload_concurrent()
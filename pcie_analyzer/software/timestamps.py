@@ -0,0 +1,125 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import numpy as np
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+# Timestamp of records seen before the first time token
+TS_UNKNOWN = -1
+
+# Time tokens carry the 32-bit time counter
+TOKEN_BITS = 32
+TOKEN_MASK = (1 << TOKEN_BITS) - 1
+
+# *********************************************************
+# *                                                       *
+# *                  TimestampTracker                     *
+# *                                                       *
+# *********************************************************
+
+class TimestampTracker:
+    """Rebuild record timestamps from the filter time tokens.
+
+    The filter inserts the timestamp of a frame as two records with
+    time = 1 (ts[16:32], then ts[0:16]) and each following record is one
+    tick later. Records are given chunk by chunk: the last token and a
+    token split across two chunks are carried over.
+
+    The 32-bit time counter wraps about every 34 s: a token much lower
+    than the previous one starts a new epoch, a token much higher goes
+    back to the previous epoch (a token slightly behind, across a wrap),
+    so timestamps are absolute 64-bit ticks. A wrap is missed if no token
+    is seen for half a period.
+    """
+    def __init__(self):
+        self.token = None # Last complete token (64-bit)
+        self.since = 0    # Records seen since the last token
+        self.msb   = None # MSB half of a token split across chunks
+        self.start = True # No record seen yet
+
+    def _tokens(self, time):
+        """Return the (msb, lsb) indexes of the complete tokens in time"""
+        index  = np.flatnonzero(time)
+        if not len(index):
+            return index, index, False
+        # Runs of consecutive time records
+        starts = np.flatnonzero(np.diff(index, prepend=-2) != 1)
+        ends   = np.append(starts[1:], len(index))
+        run    = np.repeat(np.arange(len(starts)), ends - starts)
+        first  = starts[run]
+        length = (ends - starts)[run]
+        # An odd run at the start of the capture begins with an orphan LSB
+        orphan = self.start & (index[first] == 0) & (length % 2 == 1)
+        pos    = np.arange(len(index)) - first - orphan
+        # An odd run at the end of the chunk ends with an MSB half
+        pending = bool(length[-1] % 2 != orphan[-1]) and index[-1] == len(time) - 1
+        msb = index[(pos >= 0) & (pos % 2 == 0) & (pos + 1 < length - orphan)]
+        return msb, msb + 1, pending
+
+    def update(self, records):
+        """Return the int64 timestamps of records (TS_UNKNOWN for time tokens and unknown)"""
+        time = records["time"].astype(bool)
+        data = records["data"]
+        if self.msb is not None:
+            time = np.concatenate([[True], time])
+            data = np.concatenate([[self.msb], data])
+        msb, lsb, pending = self._tokens(time)
+        self.start = False
+
+        tokens = (data[msb].astype(np.int64) << 16) | data[lsb]
+        if len(tokens):
+            # Extend tokens to 64-bit, from the signed modular delta to
+            # the previous token. Trigger tokens may be slightly ahead of
+            # frame tokens: a drop of more than half a period is a wrap,
+            # a rise of more than half a period a token behind a wrap.
+            epoch  = 0 if self.token is None else self.token >> TOKEN_BITS
+            last   = tokens[0] if self.token is None else self.token & TOKEN_MASK
+            delta  = tokens - np.concatenate([[last], tokens[:-1]])
+            wraps  = np.cumsum((delta < -(TOKEN_MASK >> 1)).astype(np.int64) -
+                               (delta > (TOKEN_MASK >> 1)))
+            tokens = tokens + ((epoch + wraps) << TOKEN_BITS)
+        count  = np.cumsum(~time)
+
+        # Last token before each record
+        k  = np.searchsorted(lsb, np.arange(len(time)), "right") - 1
+        ts = np.full(len(time), TS_UNKNOWN, dtype=np.int64)
+        after = k >= 0
+        ts[after] = tokens[k[after]] + count[after] - count[lsb[k[after]]] - 1
+        if self.token is not None:
+            ts[~after] = self.token + self.since + count[~after] - 1
+        ts[time] = TS_UNKNOWN
+
+        if len(lsb):
+            self.token = int(tokens[-1])
+            self.since = int(count[-1] - count[lsb[-1]])
+        elif len(count):
+            self.since += int(count[-1])
+        self.msb = int(data[-1]) if pending else None
+
+        return ts[1:] if len(time) > len(records) else ts
+
+# *********************************************************
+# *                                                       *
+# *                     Extraction                        *
+# *                                                       *
+# *********************************************************
+
+def strip_tokens(records, ts):
+    """Return records and their timestamps without the time token records"""
+    keep = ~records["time"].astype(bool)
+    return records[keep], ts[keep]
+
+def extract_timestamps(chunks):
+    """Yield (records, timestamps) of record chunks, without time tokens.
+
+    Records are a compact record_dtype array, timestamps absolute 64-bit
+    ticks of the time counter (TS_UNKNOWN before the first token).
+    """
+    tracker = TimestampTracker()
+    for records in chunks:
+        yield strip_tokens(records, tracker.update(records))
@@ -0,0 +1,51 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from pcie_analyzer.common import *
+from pcie_analyzer.software.status import StatusPoller
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+STATS_COUNTERS = ([c + "Frames" for c in STATS_CATEGORIES] +
+                  [c + "Symbols" for c in STATS_CATEGORIES] +
+                  ["logicalIdleSymbols", "errors"])
+
+# *********************************************************
+# *                                                       *
+# *                    TrafficStats                       *
+# *                                                       *
+# *********************************************************
+
+class TrafficStats:
+    """Read the TrafficStats counters of a capture pipeline.
+
+    snapshot() copies and clears the counters in gateware, waits for the
+    copy and reads all of them in one burst: each snapshot covers the
+    traffic since the previous one. Rates are computed with the capture
+    pipeline clock frequency (125 MHz for 2.5 GT/s links).
+    """
+    def __init__(self, wb, name, clk_freq=125e6):
+        self.clk_freq  = clk_freq
+        self._snapshot = getattr(wb.regs, name + "_snapshot")
+        self._status   = StatusPoller(wb, name, ["snapshots", "cycles"] + STATS_COUNTERS)
+
+    def snapshot(self, timeout=1):
+        """Return the {counter: value} counts since the last snapshot"""
+        count = self._status.read()["snapshots"]
+        self._snapshot.write(1)
+        return self._status.wait(lambda status: status["snapshots"] != count, timeout)
+
+    def rates(self, stats):
+        """Return {category: (frames per second, share of the symbols)} for a snapshot"""
+        duration = stats["cycles"]/self.clk_freq
+        symbols  = sum(stats[c + "Symbols"] for c in STATS_CATEGORIES) + stats["logicalIdleSymbols"]
+        rates    = {}
+        for category in STATS_CATEGORIES + ["logicalIdle"]:
+            frames = stats.get(category + "Frames", 0)
+            rates[category] = (frames/duration if duration else 0,
+                               stats[category + "Symbols"]/symbols if symbols else 0)
+        return rates
@@ -0,0 +1,258 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import struct
+import weakref
+import hashlib
+from collections import namedtuple
+
+from pcie_analyzer.common import ERROR_CLASSES, LINK_TIMEOUTS
+from pcie_analyzer.software.uploader import ETHERBONE_BURST_MAX, WORD_SIZE
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_mem_data(dc, ctrl, data):
+    """Trigger memory word: don't care bits, K flags and data to match"""
+    return (dc << 18) + (ctrl << 16) + data
+
+def pattern_words(pattern):
+    """Return the memory words of a pattern given as words or (address, word) pairs"""
+    pattern = list(pattern)
+    if pattern and isinstance(pattern[0], tuple):
+        words = [0]*(max(addr for addr, word in pattern) + 1)
+        for addr, word in pattern:
+            words[addr] = word
+        return words
+    return pattern
+
+# Trigger qualifier modes
+QUALIFIER_FIRST = 0
+QUALIFIER_NTH   = 1
+QUALIFIER_RATE  = 2
+
+# A Trigger sequence stage: pattern (as for load()), times it must be
+# found, window in time ticks (0 = none), and whether finding it
+# restarts the sequence instead of moving it forward.
+Stage = namedtuple("Stage", ["pattern", "count", "timeout", "restart"])
+Stage.__new__.__defaults__ = (1, 0, False) # No namedtuple defaults before Python 3.7
+
+# *********************************************************
+# *                                                       *
+# *                   TriggerLoader                       *
+# *                                                       *
+# *********************************************************
+
+class TriggerLoader:
+    """Load Trigger patterns with burst writes.
+
+    The whole pattern is written in bursts of up to 255 words, then its
+    size. A hash of the pattern loaded in each trigger memory is kept on
+    the host (shared by all loaders of a client): loading the same
+    pattern again does not access the board. Use force=True (or
+    invalidate()) after the board was reset or reloaded.
+    """
+    _loaded = weakref.WeakKeyDictionary() # {client: {name: hash}}
+
+    def __init__(self, wb, name, mem_size=128):
+        self.wb       = wb
+        self.name     = name
+        self.mem_size = mem_size
+        self._size    = getattr(wb.regs, name + "_size")
+        self._stages  = getattr(wb.regs, name + "_stages", None) # Not in older gateware
+        self._bank    = getattr(wb.regs, name + "_bank", None)
+        self._reload  = getattr(wb.regs, name + "_reload", None) # Not in older gateware
+        self._mem     = getattr(wb.bases, name + "_mem")
+
+    @property
+    def _cache(self):
+        return self._loaded.setdefault(self.wb, {})
+
+    def load(self, pattern, force=False):
+        """Load pattern, return False when it was already loaded"""
+        words = pattern_words(pattern)
+        if not 0 < len(words) <= self.mem_size:
+            raise ValueError("Trigger pattern must hold 1 to {} words".format(self.mem_size))
+        digest = hashlib.sha1(struct.pack("<{:d}I".format(len(words)), *words)).digest()
+        if not force and self._cache.get(self.name) == digest:
+            return False
+
+        self.invalidate()
+        self._write(words)
+        self._size.write(len(words))
+        if self._stages is not None:
+            # A single stage, found once: clear what a sequence left
+            self._reg("count", 0).write(1)
+            self._reg("timeout", 0).write(0)
+            self._reg("restart", 0).write(0)
+            self._stages.write(1)
+        self._set_bank(False)
+        self._cache[self.name] = digest
+        return True
+
+    def load_sequence(self, stages, force=False):
+        """Load a sequence of Stage, patterns one after the other in memory.
+
+        Return False when it was already loaded.
+        """
+        stages = [stage if isinstance(stage, Stage) else Stage(*stage) for stage in stages]
+        if self._stages is None or not 0 < len(stages) <= self._nstages():
+            raise ValueError("Trigger sequence must hold 1 to {} stages".format(self._nstages()))
+        words  = []
+        config = []
+        for stage in stages:
+            pattern = pattern_words(stage.pattern)
+            if not 0 < len(pattern) < 256:
+                raise ValueError("Trigger stage pattern must hold 1 to 255 words")
+            config += [len(words), len(pattern), stage.count, stage.timeout, int(stage.restart)]
+            words  += pattern
+        if len(words) > self.mem_size:
+            raise ValueError("Trigger sequence must hold 1 to {} words".format(self.mem_size))
+        digest = hashlib.sha1(struct.pack("<{:d}I".format(len(words) + len(config)), *(words + config))).digest()
+        if not force and self._cache.get(self.name) == digest:
+            return False
+
+        self.invalidate()
+        self._write(words)
+        for i in range(len(stages)):
+            base, size, count, timeout, restart = config[5*i:5*i + 5]
+            if i == 0:
+                self._size.write(size)
+            else:
+                self._reg("base", i).write(base)
+                self._reg("size", i).write(size)
+            self._reg("count", i).write(count)
+            self._reg("timeout", i).write(timeout)
+            self._reg("restart", i).write(restart)
+        self._stages.write(len(stages))
+        self._set_bank(False)
+        self._cache[self.name] = digest
+        return True
+
+    def load_bank(self, patterns, force=False):
+        """Load independent patterns, the trigger fires on the first one found.
+
+        Return False when it was already loaded. fired() tells which
+        pattern fired.
+        """
+        patterns = [pattern_words(pattern) for pattern in patterns]
+        if self._bank is None or not 0 < len(patterns) <= self._nstages():
+            raise ValueError("Trigger bank must hold 1 to {} patterns".format(self._nstages()))
+        words  = []
+        config = []
+        for pattern in patterns:
+            if not 0 < len(pattern) < 256:
+                raise ValueError("Trigger bank pattern must hold 1 to 255 words")
+            config += [len(words), len(pattern)]
+            words  += pattern
+        if len(words) > self.mem_size:
+            raise ValueError("Trigger bank must hold 1 to {} words".format(self.mem_size))
+        digest = hashlib.sha1(b"bank" + struct.pack("<{:d}I".format(len(words) + len(config)), *(words + config))).digest()
+        if not force and self._cache.get(self.name) == digest:
+            return False
+
+        self.invalidate()
+        self._write(words)
+        for i in range(len(patterns)):
+            base, size = config[2*i:2*i + 2]
+            if i == 0:
+                self._size.write(size)
+            else:
+                self._reg("base", i).write(base)
+                self._reg("size", i).write(size)
+        self.enable_patterns(range(len(patterns)))
+        self._set_bank(True)
+        self._cache[self.name] = digest
+        return True
+
+    def enable_patterns(self, indexes):
+        """Bank: only look for the patterns given"""
+        getattr(self.wb.regs, self.name + "_bankEnable").write(sum(1 << i for i in set(indexes)))
+
+    def qualify(self, nth=None, rate=None):
+        """Fire on the nth match, or on more than count matches within window
+        time ticks with rate=(count, window). Default: the first match.
+        """
+        if nth is not None and rate is not None:
+            raise ValueError("Trigger qualifier is nth or rate, not both")
+        if rate is not None:
+            count, window = rate
+            self._qualifier_reg("rateCount").write(count)
+            self._qualifier_reg("rateWindow").write(window)
+            self._qualifier_reg("qualifier").write(QUALIFIER_RATE)
+        elif nth is not None:
+            self._qualifier_reg("nth").write(nth)
+            self._qualifier_reg("qualifier").write(QUALIFIER_NTH)
+        else:
+            self._qualifier_reg("qualifier").write(QUALIFIER_FIRST)
+
+    def matches(self):
+        """Return the matches counted since the trigger was armed"""
+        return self._qualifier_reg("matches").read()
+
+    def trigger_on_errors(self, classes, patterns=True):
+        """Also fire on errors of the ERROR_CLASSES given (names), only on them
+        without patterns. An empty list stops triggering on errors.
+        """
+        unknown = set(classes) - set(ERROR_CLASSES)
+        if unknown:
+            raise ValueError("Unknown error classes: {}".format(", ".join(sorted(unknown))))
+        if not patterns:
+            self.invalidate()
+            self._size.write(0)
+            if self._stages is not None:
+                self._stages.write(1)
+            self._set_bank(False)
+        mask = sum(1 << ERROR_CLASSES.index(name) for name in set(classes))
+        self._qualifier_reg("errorEnable").write(mask)
+
+    def fired_errors(self):
+        """Return the error classes that fired the trigger (empty for a pattern)"""
+        mask = self._qualifier_reg("errorClass").read()
+        return [name for i, name in enumerate(ERROR_CLASSES) if mask & (1 << i)]
+
+    def trigger_on_timeouts(self, inactivity=0, elecidle=0, training=0):
+        """Also fire when no TLP or DLLP is seen, the link stays in electrical
+        idle or in TS1/TS2 training for the time ticks given (0 = off)
+        """
+        self._qualifier_reg("inactivityTicks").write(inactivity)
+        self._qualifier_reg("elecIdleTicks").write(elecidle)
+        self._qualifier_reg("trainingTicks").write(training)
+
+    def fired_timeouts(self):
+        """Return the LINK_TIMEOUTS that fired the trigger"""
+        mask = self._qualifier_reg("linkTimeout").read()
+        return [name for i, name in enumerate(LINK_TIMEOUTS) if mask & (1 << i)]
+
+    def fired(self):
+        """Return the pattern (bank) or stage (sequence) that fired"""
+        return getattr(self.wb.regs, self.name + "_fired").read()
+
+    def invalidate(self):
+        self._cache.pop(self.name, None)
+
+    def _write(self, words):
+        for offset in range(0, len(words), ETHERBONE_BURST_MAX):
+            self.wb.write(self._mem + offset*WORD_SIZE, words[offset:offset + ETHERBONE_BURST_MAX])
+        # The trigger copies its memory again on next arming only
+        if self._reload is not None:
+            self._reload.write(1)
+
+    def _qualifier_reg(self, name):
+        return getattr(self.wb.regs, "{}_{}".format(self.name, name))
+
+    def _set_bank(self, bank):
+        if self._bank is not None:
+            self._bank.write(int(bank))
+
+    def _reg(self, name, stage):
+        return getattr(self.wb.regs, "{}_{}{:d}".format(self.name, name, stage))
+
+    def _nstages(self):
+        n = 0
+        while hasattr(self.wb.regs, "{}_count{:d}".format(self.name, n)):
+            n += 1
+        return n
@@ -0,0 +1,196 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import time
+import socket
+import struct
+
+import numpy as np
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+UDP_RECEIVER_PORT = 2345
+
+# Datagram header (see udp_streamer.py): sequence number, DRAM address (bytes)
+_header = struct.Struct("<II")
+
+DATAGRAM_BLOCKS = 32 # 32 blocks of 256 bits: 1032 bytes datagrams, below the MTU
+
+def decode_datagram(datagram):
+    """Return the (sequence, address, payload) of a UDPStreamer datagram"""
+    if len(datagram) < _header.size:
+        raise ValueError("Datagram too short ({} bytes)".format(len(datagram)))
+    seq, address = _header.unpack_from(datagram)
+    return seq, address, memoryview(datagram)[_header.size:]
+
+def ip_to_int(ip):
+    return struct.unpack(">I", socket.inet_aton(ip))[0]
+
+def missing_areas(received, block_size):
+    """Return the (offset, size) areas of the blocks not received"""
+    edges  = np.diff(np.concatenate([[1], received.view(np.int8), [1]]))
+    starts = np.flatnonzero(edges == -1)
+    ends   = np.flatnonzero(edges == 1)
+    return [(int(s)*block_size, int(e - s)*block_size) for s, e in zip(starts, ends)]
+
+# *********************************************************
+# *                                                       *
+# *                     UDPReceiver                       *
+# *                                                       *
+# *********************************************************
+
+class UDPReceiver:
+    """Receive UDPStreamer datagrams into a buffer.
+
+    Payloads are copied in place at their address, so datagrams can come
+    in any order. Lost datagrams are reported as missing areas, to be
+    requested again.
+    """
+    def __init__(self, port=UDP_RECEIVER_PORT, host="0.0.0.0", timeout=0.2, rcvbuf=1 << 23):
+        self.timeout = timeout
+        self.sock    = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        self.sock.bind((host, port))
+        self.port    = self.sock.getsockname()[1]
+
+        self.datagrams = 0 # Datagrams received
+        self.sequence  = 0 # Sequence numbers missing (lost or reordered datagrams)
+
+    def receive(self, buf, block_size, base=0, received=None):
+        """Receive the blocks of buf, DRAM area from address base.
+
+        Stop once every block is received, or when no datagram came for
+        timeout seconds. received is the bool array of blocks already
+        received, updated in place. Return the missing (offset, size)
+        areas of buf.
+        """
+        view = memoryview(buf).cast("B")
+        if received is None:
+            received = np.zeros(len(view)//block_size, dtype=bool)
+        left = len(received) - int(received.sum())
+        last = None
+
+        self.sock.settimeout(self.timeout)
+        datagram = bytearray(1 << 16)
+        while left:
+            try:
+                n = self.sock.recv_into(datagram)
+            except socket.timeout:
+                break
+            seq, address, payload = decode_datagram(datagram[:n])
+            offset = address - base
+            if offset < 0 or offset + len(payload) > len(view):
+                continue
+            view[offset:offset + len(payload)] = payload
+            first = offset//block_size
+            count = len(payload)//block_size
+            left -= count - int(received[first:first + count].sum())
+            received[first:first + count] = True
+            self.datagrams += 1
+            if last is not None and seq != last + 1:
+                self.sequence += 1
+            last = seq
+        return missing_areas(received, block_size)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# *********************************************************
+# *                                                       *
+# *                     PushUploader                      *
+# *                                                       *
+# *********************************************************
+
+class PushUploader:
+    """Upload DRAM areas pushed by a UDPStreamer.
+
+    The streamer is told where to send (host_ip, receiver port) and which
+    area, then sends it without waiting for the host: the upload runs
+    close to line rate. Areas lost on the way are requested again, up to
+    retries times, once the streamer is finished with the last request
+    (waiting up to timeout seconds). Addresses are DRAM addresses (as the
+    recorder base).
+    """
+    def __init__(self, wb, host_ip, name="udp_streamer", receiver=None, blocks=DATAGRAM_BLOCKS, retries=3,
+                 timeout=10):
+        self.wb       = wb
+        self.receiver = receiver if receiver is not None else UDPReceiver()
+        self.retries  = retries
+        self.timeout  = timeout
+
+        self._start     = getattr(wb.regs, name + "_start")
+        self._finished  = getattr(wb.regs, name + "_finished")
+        self._ipAddress = getattr(wb.regs, name + "_ipAddress")
+        self._dstPort   = getattr(wb.regs, name + "_dstPort")
+        self._addr      = getattr(wb.regs, name + "_addr")
+        self._size      = getattr(wb.regs, name + "_size")
+        self._blocks    = getattr(wb.regs, name + "_blocks")
+
+        self.block_size = getattr(wb.constants, name + "_dw")//8
+
+        max_blocks = getattr(wb.constants, name + "_maxblocks", None) # Not in older gateware
+        if not 0 < blocks <= (max_blocks or 255):
+            raise ValueError("Datagrams hold 1 to {} blocks".format(max_blocks or 255))
+
+        self._ipAddress.write(ip_to_int(host_ip))
+        self._dstPort.write(self.receiver.port)
+        self._blocks.write(blocks)
+
+        self.elapsed    = 0 # Last upload duration (s)
+        self.throughput = 0 # Last upload throughput (MB/s)
+        self.requests   = 0 # Areas requested during the last upload
+
+    def upload_into(self, addr, buf):
+        """Upload len(buf) bytes from DRAM address addr into the writable buffer buf"""
+        view = memoryview(buf).cast("B")
+        if (addr | len(view)) % self.block_size:
+            raise ValueError("Upload address and length must be {} bytes aligned".format(self.block_size))
+
+        start    = time.time()
+        received = np.zeros(len(view)//self.block_size, dtype=bool)
+        missing  = [(0, len(view))] if len(view) else []
+        self.requests = 0
+        for attempt in range(self.retries + 1):
+            if not missing:
+                break
+            for offset, size in missing:
+                self._wait_finished()
+                self._addr.write(addr + offset)
+                self._size.write(size)
+                self._start.write(1)
+                self.requests += 1
+                first = offset//self.block_size
+                self.receiver.receive(view[offset:offset + size], self.block_size, addr + offset,
+                    received[first:first + size//self.block_size])
+            missing = missing_areas(received, self.block_size)
+        if missing:
+            raise TimeoutError("{} bytes never received".format(sum(size for offset, size in missing)))
+
+        self.elapsed    = time.time() - start
+        self.throughput = len(view)/(self.elapsed*1e6) if self.elapsed else 0
+        return buf
+
+    def _wait_finished(self):
+        """Wait for the streamer to be done with the last request: a start is ignored until then"""
+        deadline = time.time() + self.timeout
+        while not self._finished.read():
+            if time.time() > deadline:
+                raise TimeoutError("UDP streamer still busy after {} s".format(self.timeout))
+            time.sleep(0.001)
+
+    def upload(self, addr, length):
+        """Upload length bytes from addr into a new bytearray"""
+        print("Push upload of {} bytes from 0x{:08x}...".format(length, addr))
+        buf = self.upload_into(addr, bytearray(length))
+        print("Done ({:.3f} s, {:.2f} MB/s, {} requests)".format(self.elapsed, self.throughput, self.requests))
+        return buf
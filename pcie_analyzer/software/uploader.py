@@ -0,0 +1,168 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import sys
+import mmap
+import time
+import struct
+import threading
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+# Etherbone records hold at most 255 reads (8-bit rcount field)
+ETHERBONE_BURST_MAX = 255
+
+WORD_SIZE = 4
+
+# *********************************************************
+# *                                                       *
+# *                      Uploader                         *
+# *                                                       *
+# *********************************************************
+
+class Uploader:
+    """Upload a memory area with Etherbone bursts.
+
+    Each request reads up to burst_length 32-bit words. When several
+    clients (one connection each) are given, the area is split in as
+    many stripes, uploaded concurrently so that several bursts are in
+    flight. Words are written in place into the destination buffer.
+    """
+    def __init__(self, wb, burst_length=ETHERBONE_BURST_MAX, clients=None):
+        self.wb           = wb
+        self.burst_length = burst_length
+        self.clients      = clients if clients else [wb]
+
+        self.elapsed      = 0     # Last upload duration (s)
+        self.throughput   = 0     # Last upload throughput (MB/s)
+
+    def _upload_stripe(self, client, addr, view, progress):
+        offset = 0
+        while offset < len(view):
+            count = min(self.burst_length, (len(view) - offset)//WORD_SIZE)
+            datas = client.read(addr + offset, count)
+            struct.pack_into("<{:d}I".format(count), view, offset, *datas)
+            offset += count*WORD_SIZE
+            if progress is not None:
+                progress(count*WORD_SIZE)
+
+    def upload_into(self, addr, buf, progress=None):
+        """Upload len(buf) bytes from addr into the writable buffer buf."""
+        with memoryview(buf) as raw, raw.cast("B") as view:
+            self._upload_view(addr, view, progress)
+        return buf
+
+    def _upload_view(self, addr, view, progress):
+        length = len(view)
+        if (addr | length) % WORD_SIZE:
+            raise ValueError("Upload address and length must be 32-bit aligned")
+
+        # Split the area in one stripe per client, on burst boundaries
+        nclients = len(self.clients)
+        bursts   = -(-length // (self.burst_length*WORD_SIZE))
+        stripe   = -(-bursts // nclients) * self.burst_length*WORD_SIZE
+
+        lock = threading.Lock()
+        def _progress(n):
+            if progress is not None:
+                with lock:
+                    progress(n)
+
+        start = time.time()
+        if nclients == 1:
+            self._upload_stripe(self.clients[0], addr, view, _progress)
+        else:
+            threads = []
+            for i, client in enumerate(self.clients):
+                first = i*stripe
+                if first >= length:
+                    break
+                thread = threading.Thread(target=self._upload_stripe,
+                    args=(client, addr + first, view[first:first + stripe], _progress))
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                thread.join()
+        self.elapsed    = time.time() - start
+        self.throughput = length/(self.elapsed*1e6) if self.elapsed else 0
+
+    def upload(self, addr, length, progress=None):
+        """Upload length bytes from addr into a new bytearray."""
+        print("Upload of {} bytes from 0x{:08x}...".format(length, addr))
+        buf = self.upload_into(addr, bytearray(length), progress)
+        print("Done ({:.3f} s, {:.2f} MB/s)".format(self.elapsed, self.throughput))
+        return buf
+
+    def upload_to_file(self, addr, length, filename, progress=None):
+        """Upload length bytes from addr directly into a memory mapped file."""
+        print("Upload of {} bytes from 0x{:08x} to {}...".format(length, addr, filename))
+        with open(filename, "w+b") as f:
+            f.truncate(length)
+            if length:
+                with mmap.mmap(f.fileno(), length) as m:
+                    self.upload_into(addr, m, progress)
+                    m.flush()
+        print("Done ({:.3f} s, {:.2f} MB/s)".format(self.elapsed, self.throughput))
+
+# *********************************************************
+# *                                                       *
+# *                 Concurrent uploads                    *
+# *                                                       *
+# *********************************************************
+
+class UploadProgress:
+    """Print the progress of several named uploads on one line"""
+    def __init__(self, totals, out=sys.stdout):
+        self.totals = dict(totals)
+        self.done   = {name: 0 for name in self.totals}
+        self.out    = out
+        self._lock  = threading.Lock()
+
+    def __call__(self, name, n):
+        with self._lock:
+            self.done[name] += n
+            status = " | ".join("{} {:3d}%".format(name, 100*self.done[name]//total if total else 100)
+                for name, total in self.totals.items())
+            self.out.write("\r" + status)
+            if self.done == self.totals:
+                self.out.write("\n")
+            self.out.flush()
+
+def upload_concurrent(uploads, progress=None):
+    """Upload several memory areas at the same time.
+
+    uploads is a list of (name, uploader, addr, length), each uploader
+    using its own Etherbone connection(s) (ie one per RX/TX ring). Areas
+    are uploaded by one thread each, progress(name, n) is called as
+    bytes arrive. Return a {name: bytearray} dict.
+    """
+    bufs    = {name: bytearray(length) for name, uploader, addr, length in uploads}
+    errors  = []
+    threads = []
+
+    def _upload(name, uploader, addr):
+        try:
+            uploader.upload_into(addr, bufs[name],
+                None if progress is None else lambda n: progress(name, n))
+        except Exception as e:
+            errors.append(e)
+
+    start = time.time()
+    for name, uploader, addr, length in uploads:
+        thread = threading.Thread(target=_upload, args=(name, uploader, addr))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.time() - start
+    length  = sum(len(buf) for buf in bufs.values())
+    print("Uploaded {} bytes from {} areas ({:.3f} s, {:.2f} MB/s)".format(
+        length, len(uploads), elapsed, length/(elapsed*1e6) if elapsed else 0))
+    return bufs
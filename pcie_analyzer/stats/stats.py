@@ -0,0 +1,167 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from migen import *
+from migen.genlib.cdc import *
+
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect import stream
+
+from pcie_analyzer.common import *
+
+# *********************************************************
+# *                                                       *
+# *                  Traffic statistics                   *
+# *                                                       *
+# *********************************************************
+
+# Counts frames and symbols per traffic category (STATS_CATEGORIES in
+# common.py) on the aligned stream going into the Filter. Ordered sets
+# are sorted with the DetectOrderedSets type, TLP and DLLP symbols with
+# the Filter framing states (the Filter must be enabled for them, with
+# filterConfig = 0 nothing is recorded). Data symbols outside of frames
+# are counted as logical idle.
+#
+# A write to snapshot copies all the counters and clears them, in the
+# same clock cycle: the values read by the host cover the same interval.
+# The copies are then latched into the status registers, in the sys
+# domain, on the acknowledge of the snapshot: they do not change until
+# the next snapshot, and snapshot writes are ignored until then. The
+# counter of snapshots, latched with them, tells when they are ready.
+
+class TrafficStats(Module, AutoCSR):
+    def __init__(self, clock_domain, counter_width=48):
+
+        # *********************************************************
+        # *                    Interface                          *
+        # *********************************************************
+        self.snapshot  = CSR()                       # Copy and clear the counters
+        self.snapshots = CSRStatus(32)               # Snapshots taken
+        self.cycles    = CSRStatus(counter_width)    # Clock cycles in the last interval
+
+        for category in STATS_CATEGORIES:
+            setattr(self, category + "Frames",  CSRStatus(counter_width, name=category + "Frames"))
+            setattr(self, category + "Symbols", CSRStatus(counter_width, name=category + "Symbols"))
+
+        self.logicalIdleSymbols = CSRStatus(counter_width) # Data symbols outside of frames
+        self.errors    = CSRStatus(counter_width)    # Filter errors (bad TLP/DLLP)
+
+        self.sink      = sink = stream.Endpoint(descrambler_layout)
+
+        self.tlp       = Signal()                    # Filter is in a TLP
+        self.dllp      = Signal()                    # Filter is in a DLLP
+        self.error     = Signal()                    # Filter error
+
+        # *********************************************************
+        # *                      Signals                          *
+        # *********************************************************
+        ncategories = len(STATS_CATEGORIES)
+        TLP, DLLP   = STATS_CATEGORIES.index("tlp"), STATS_CATEGORIES.index("dllp")
+        LOGICAL     = ncategories
+
+        category  = Signal(max=ncategories + 2)      # Category of the current word
+        frame     = Signal()                         # Current word starts a frame
+        ended     = Signal()                         # Last word had an END symbol
+        snap      = Signal()
+        busy      = Signal()                         # Snapshot not acknowledged yet (sys)
+
+        frames    = [Signal(counter_width) for i in range(ncategories)]
+        symbols   = [Signal(counter_width) for i in range(ncategories + 1)]
+        errors    = Signal(counter_width)
+        cycles    = Signal(counter_width)
+
+        _frames   = [Signal(counter_width) for i in range(ncategories)]
+        _symbols  = [Signal(counter_width) for i in range(ncategories + 1)]
+        _errors   = Signal(counter_width)
+        _cycles   = Signal(counter_width)
+        _snapshots= Signal(32)
+
+        # Ordered set types counted
+        osets_categories = {
+            osetsType.SKIP : STATS_CATEGORIES.index("skip"),
+            osetsType.FTS  : STATS_CATEGORIES.index("fts"),
+            osetsType.TS1  : STATS_CATEGORIES.index("ts1"),
+            osetsType.TS2  : STATS_CATEGORIES.index("ts2"),
+            osetsType.IDLE : STATS_CATEGORIES.index("idle"),
+        }
+
+        # *********************************************************
+        # *                         CDC                           *
+        # *********************************************************
+        ps_snapshot = PulseSynchronizer("sys", clock_domain)
+        ps_ack      = PulseSynchronizer(clock_domain, "sys")
+        self.submodules += ps_snapshot, ps_ack
+
+        # The copies are stable when the acknowledge gets to sys
+        self.sync += [
+            If(self.snapshot.re & ~busy,
+                busy.eq(1),
+            ),
+            If(ps_ack.o,
+                busy.eq(0),
+                self.snapshots.status.eq(_snapshots),
+                self.cycles.status.eq(_cycles),
+                self.errors.status.eq(_errors),
+                self.logicalIdleSymbols.status.eq(_symbols[LOGICAL]),
+                [getattr(self, name + "Frames").status.eq(_frames[i]) for i, name in enumerate(STATS_CATEGORIES)],
+                [getattr(self, name + "Symbols").status.eq(_symbols[i]) for i, name in enumerate(STATS_CATEGORIES)],
+            ),
+        ]
+
+        # *********************************************************
+        # *                    Combinatorial                      *
+        # *********************************************************
+        self.comb += [
+            ps_snapshot.i.eq(self.snapshot.re & ~busy),
+            snap.eq(ps_snapshot.o),
+            sink.ready.eq(1),
+
+            category.eq(ncategories + 1),
+            frame.eq(0),
+            If(sink.osets != 0,
+                Case(sink.type, {t: category.eq(c) for t, c in osets_categories.items()}),
+                frame.eq(sink.ctrl[1] & (sink.data[8:16] == COM.value)),
+            ).Elif(sink.ctrl[1] & (sink.data[8:16] == STP.value),
+                category.eq(TLP),
+                frame.eq(1),
+            ).Elif(sink.ctrl[1] & (sink.data[8:16] == SDP.value),
+                category.eq(DLLP),
+                frame.eq(1),
+            ).Elif(self.tlp & ~ended,
+                category.eq(TLP),
+            ).Elif(self.dllp & ~ended,
+                category.eq(DLLP),
+            ).Else(
+                category.eq(LOGICAL),
+            ),
+        ]
+
+        # *********************************************************
+        # *                   Synchronous                         *
+        # *********************************************************
+
+        # Counter value after this cycle, from 0 on a snapshot
+        def count(counter, inc):
+            return counter.eq(Mux(snap, 0, counter) + inc)
+
+        sync = getattr(self.sync, clock_domain)
+        sync += [
+            # The Filter leaves TLP/DLLP one word after END
+            If(sink.valid,
+                ended.eq(sink.ctrl[0] & (sink.data[0:8] == END.value)),
+            ),
+
+            count(cycles, 1),
+            count(errors, self.error),
+            [count(frames[i], sink.valid & frame & (category == i)) for i in range(ncategories)],
+            [count(symbols[i], Mux(sink.valid & (category == i), 2, 0)) for i in range(ncategories + 1)],
+
+            ps_ack.i.eq(snap),                       # Once the copies are registered
+            If(snap,
+                _snapshots.eq(_snapshots + 1),
+                _cycles.eq(cycles),
+                _errors.eq(errors),
+                [_frames[i].eq(frames[i]) for i in range(ncategories)],
+                [_symbols[i].eq(symbols[i]) for i in range(ncategories + 1)],
+            ),
+        ]
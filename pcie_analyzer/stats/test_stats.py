@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from pcie_analyzer.stats.stats import *
+from pcie_analyzer.filter.filters import *
+from pcie_analyzer.common import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_data(typ, osets, ctrl, data):
+    return (typ << 20) + (osets << 18) + (ctrl << 16) + data
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+def ordered_set(typ, symbol, words):
+    return [make_data(typ, 3, 3, 0xbc00 | symbol)] + [make_data(typ, 3, 3, symbol << 8 | symbol)]*(words - 1)
+
+def training_set(typ, symbol):
+    return [make_data(typ, 3, 2, 0xbcf7)] + [make_data(typ, 3, 0, symbol << 8 | symbol)]*7
+
+def frame(start, length, end=0xfd):
+    return ([make_data(osetsType.DATA, 0, 2, start << 8)] +
+            [make_data(osetsType.DATA, 0, 0, random.getrandbits(16)) for i in range(length)] +
+            [make_data(osetsType.DATA, 0, 1, end)])
+
+def make_stream():
+    """Random traffic and the expected {counter: value}"""
+    random.seed(0)
+    datas    = []
+    expected = {name: 0 for name in ["errors", "logicalIdleSymbols"]}
+    for category in STATS_CATEGORIES:
+        expected[category + "Frames"]  = 0
+        expected[category + "Symbols"] = 0
+
+    def add(category, words):
+        datas.extend(words)
+        expected[category + "Frames"]  += 1
+        expected[category + "Symbols"] += 2*len(words)
+
+    for i in range(200):
+        idle = random.randint(0, 20)
+        datas += [make_data(osetsType.DATA, 0, 0, 0x0000)]*idle
+        expected["logicalIdleSymbols"] += 2*idle
+
+        kind = random.choice(["skip", "fts", "idle", "ts1", "ts2", "tlp", "dllp", "bad"])
+        if kind == "skip":
+            add("skip", ordered_set(osetsType.SKIP, SKP.value, 2))
+        elif kind == "fts":
+            add("fts", ordered_set(osetsType.FTS, FTS.value, 2))
+        elif kind == "idle":
+            add("idle", ordered_set(osetsType.IDLE, IDL.value, 2))
+        elif kind == "ts1":
+            add("ts1", training_set(osetsType.TS1, 0x4a))
+        elif kind == "ts2":
+            add("ts2", training_set(osetsType.TS2, 0x45))
+        elif kind == "tlp":
+            add("tlp", frame(STP.value, random.randint(5, 40)))
+        elif kind == "dllp":
+            add("dllp", frame(SDP.value, 3))
+        else:
+            # Nullified TLP
+            add("tlp", frame(STP.value, random.randint(5, 40), EDB.value))
+            expected["errors"] += 1
+
+    # Leave the last frame
+    datas += [make_data(osetsType.DATA, 0, 0, 0x0000)]*4
+    expected["logicalIdleSymbols"] += 8
+    return datas, expected
+
+# *********************************************************
+# *                                                       *
+# *                     Test bench                        *
+# *                                                       *
+# *********************************************************
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.filter = Filter("sys", 64)
+        self.submodules.stats  = TrafficStats("sys")
+
+        self.comb += [
+            self.filter.sink.connect(self.stats.sink, omit={"ready"}),
+            self.stats.tlp.eq(self.filter.tlp),
+            self.stats.dllp.eq(self.filter.dllp),
+            self.stats.error.eq(self.filter.error),
+            self.filter.source.ready.eq(1),
+        ]
+
+        self.snapshots = []
+        self.done      = False
+
+def snapshot(dut):
+    count = (yield dut.stats.snapshots.status)
+    yield from dut.stats.snapshot.write(1)
+    while (yield dut.stats.snapshots.status) == count:
+        yield
+    values = {}
+    for csr in dut.stats.get_csrs():
+        if csr.name not in ["snapshot", "snapshots"]:
+            values[csr.name] = (yield csr.status)
+    dut.snapshots.append(values)
+
+def main_generator(dut, datas):
+    yield from dut.filter.tlpDllpTimeoutCnt.write(100)
+    yield from dut.filter.filterEnable.write(1)
+    for i in range(10):
+        yield
+
+    sink = dut.filter.sink
+    yield sink.valid.eq(1)
+    for data in datas:
+        yield sink.payload.raw_bits().eq(data)
+        yield
+    yield sink.valid.eq(0)
+    dut.done = True
+
+def snapshot_generator(dut, datas):
+    # Snapshot while counting, then once everything is counted
+    for i in range(len(datas)//2):
+        yield
+    yield from snapshot(dut)
+    while not dut.done:
+        yield
+    for i in range(10):
+        yield
+    yield from snapshot(dut)
+
+    # A write before the acknowledge is ignored
+    count = (yield dut.stats.snapshots.status)
+    yield from dut.stats.snapshot.write(1)
+    yield from dut.stats.snapshot.write(1)
+    for i in range(20):
+        yield
+    dut.taken = (yield dut.stats.snapshots.status) - count
+
+# *********************************************************
+# *                                                       *
+# *                   Run simulation                      *
+# *                                                       *
+# *********************************************************
+
+if __name__ == "__main__":
+    datas, expected = make_stream()
+    tb = TB()
+    generators = {"sys": [main_generator(tb, datas), snapshot_generator(tb, datas)]}
+    run_simulation(tb, generators, {"sys": 10}, vcd_name="sim.vcd")
+
+    first, second = tb.snapshots
+    for name, value in sorted(expected.items()):
+        print("{:20s} {:6d} + {:6d} (expected {:6d})".format(name, first[name], second[name], value))
+        assert first[name] + second[name] == value
+    assert first["tlpSymbols"] > 0 and second["tlpSymbols"] > 0
+    assert first["cycles"] + second["cycles"] > len(datas)
+    print("Snapshots taken for two writes in a row: {}".format(tb.taken))
+    assert tb.taken == 1
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from migen import *
+
+from pcie_analyzer.trigger.trigger import *
+from pcie_analyzer.common import *
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_data(typ, osets, ctrl, data):
+    return (typ << 20) + (osets << 18) + (ctrl << 16) + data
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+IDLE  = make_data(osetsType.DATA, 0, 0, 0x0000)
+TLP   = make_data(osetsType.DATA, 0, 2, STP.value << 8)
+DLLP  = make_data(osetsType.DATA, 0, 1, SDP.value)
+SKP   = make_data(osetsType.SKIP, 3, 3, (COM.value << 8) | SKP.value)
+EIOS  = make_data(osetsType.IDLE, 3, 3, (COM.value << 8) | IDL.value)
+TS1   = make_data(osetsType.TS1,  3, 2, (COM.value << 8) | 0x00)
+
+THRESHOLDS = {"inactivity": 50, "elecidle": 30, "training": 40}
+
+# Frames every 20 words, then TS1 training for 60 words, frames again,
+# an EIOS and electrical idle for 60 words, nothing at last
+datas  = ([TLP] + [IDLE]*19)*5
+datas += [TS1]*60 + [SKP] + ([DLLP] + [IDLE]*19)*3
+datas += [EIOS]*2 + [IDLE]*60 + [TS1] + [TLP] + [IDLE]*100
+
+# Expected timeouts: (name, index of the word when it fires)
+expected = [
+    ("inactivity",  80 + 50),
+    ("training",   100 + 40),
+    ("elecidle",   221 + 30),
+    ("inactivity", 201 + 50),
+    ("inactivity", 284 + 50),
+]
+
+# *********************************************************
+# *                                                       *
+# *                     Test bench                        *
+# *                                                       *
+# *********************************************************
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.monitor = LinkMonitor()
+
+        # One time tick per word
+        self.sync += self.monitor.time.eq(self.monitor.time + 1)
+
+        self.timeouts = []
+
+def main_generator(dut):
+    monitor = dut.monitor
+    for name, ticks in THRESHOLDS.items():
+        yield monitor.thresholds[LINK_TIMEOUTS.index(name)].eq(ticks)
+    yield monitor.enable.eq(1)
+    yield monitor.sink.valid.eq(1)
+    for i, data in enumerate(datas):
+        yield monitor.sink.payload.raw_bits().eq(data)
+        yield
+        timeouts = yield monitor.timeouts
+        for j, name in enumerate(LINK_TIMEOUTS):
+            if timeouts & (1 << j):
+                dut.timeouts.append((name, i))
+
+# *********************************************************
+# *                                                       *
+# *                   Run simulation                      *
+# *                                                       *
+# *********************************************************
+
+if __name__ == "__main__":
+    tb = TB()
+    generators = {"sys": [main_generator(tb)]}
+    run_simulation(tb, generators, {"sys": 10})
+
+    print("Timeouts: {}".format(tb.timeouts))
+    print("Expected: {}".format(expected))
+    for (name, i), (expected_name, expected_i) in zip(sorted(tb.timeouts, key=lambda t: (t[1], t[0])),
+                                                      sorted(expected, key=lambda t: (t[1], t[0]))):
+        assert name == expected_name and abs(i - expected_i) <= 2
+    assert len(tb.timeouts) == len(expected)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from migen import *
+
+from pcie_analyzer.trigger.trigger import *
+from pcie_analyzer.common import *
+
+EDB_ERROR       = 1 << ERROR_CLASSES.index("edb")
+DISPARITY_ERROR = 1 << ERROR_CLASSES.index("disparity")
+
+# *********************************************************
+# *                                                       *
+# *                      Helpers                          *
+# *                                                       *
+# *********************************************************
+
+def make_data(ctrl, data):
+    return (ctrl << 16) + data
+
+def make_mem_data(dc, ctrl, data):
+    return (dc << 18) + (ctrl << 16) + data
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+A    = [make_data(3, 0xbc1c), make_data(3, 0x1c1c)]   # SKP
+B    = [make_data(2, 0xfb00), make_data(0, 0x1234)]   # STP
+SKP  = make_data(3, 0xbc1c)
+FILL = make_data(0, 0x0000)
+
+# Pattern memory: A at 0, B at 2
+mem_data = [make_mem_data(0, 3, 0xbc1c), make_mem_data(0, 3, 0x1c1c),
+            make_mem_data(0, 2, 0xfb00), make_mem_data(0, 0, 0x1234)]
+
+def make_stream(*parts):
+    """parts are patterns or filler lengths, return the records and the end of each part"""
+    datas = [FILL]*10
+    ends  = []
+    for part in parts:
+        datas += [FILL]*part if isinstance(part, int) else part
+        ends.append(len(datas))
+    return datas + [FILL]*100, ends
+
+# *********************************************************
+# *                                                       *
+# *                     Test bench                        *
+# *                                                       *
+# *********************************************************
+
+class TB(Module):
+    def __init__(self, mem_data):
+        self.mem_data = mem_data
+        self.submodules.trigger = Trigger("sys")
+        self.specials.wrport = self.trigger.mem.get_port(write_capable=True, clock_domain="sys")
+
+        # One time tick per clock cycle
+        self.sync += self.trigger.time.eq(self.trigger.time + 1)
+
+        self.received = []
+
+def main_generator(dut, datas, stages, bank, qualifier, errors):
+    for addr, dat in enumerate(dut.mem_data):
+        yield dut.wrport.adr.eq(addr)
+        yield dut.wrport.dat_w.eq(dat)
+        yield dut.wrport.we.eq(1)
+        yield
+    yield dut.wrport.we.eq(0)
+
+    # stages: [(base, size, count, timeout, restart)]
+    trigger = dut.trigger
+    yield from trigger.stages.write(len(stages))
+    for i, (base, size, count, timeout, restart) in enumerate(stages):
+        if i == 0:
+            yield from trigger.size.write(size)
+        else:
+            yield from getattr(trigger, "base{:d}".format(i)).write(base)
+            yield from getattr(trigger, "size{:d}".format(i)).write(size)
+        yield from getattr(trigger, "count{:d}".format(i)).write(count)
+        yield from getattr(trigger, "timeout{:d}".format(i)).write(timeout)
+        yield from getattr(trigger, "restart{:d}".format(i)).write(restart)
+    if bank is not None:
+        yield from trigger.bank.write(1)
+        yield from trigger.bankEnable.write(bank)
+    if qualifier is not None:
+        mode, nth, rate_count, rate_window = qualifier
+        yield from trigger.qualifier.write(mode)
+        yield from trigger.nth.write(nth)
+        yield from trigger.rateCount.write(rate_count)
+        yield from trigger.rateWindow.write(rate_window)
+    if errors is not None:
+        yield from trigger.errorEnable.write(errors[0])
+    yield from trigger.armed.write(1)
+    yield trigger.enable.eq(1)
+    # Pattern memory copy, first arming after reset
+    while not (yield trigger.running.status):
+        yield
+
+    sink = trigger.sink
+    i = 0
+    while i < len(datas):
+        yield sink.valid.eq(1)
+        yield sink.payload.raw_bits().eq(datas[i])
+        # Error inputs pulse when the record enters the trigger
+        yield trigger.error.eq(0 if errors is None else errors[1].get(i, 0))
+        yield
+        if (yield sink.ready):
+            i += 1
+    yield sink.valid.eq(0)
+    for i in range(10):
+        yield
+    dut.status = {"fired": (yield trigger.fired.status), "matches": (yield trigger.matches.status),
+                  "errorClass": (yield trigger.errorClass.status)}
+
+@passive
+def receive_generator(dut):
+    source = dut.trigger.source
+    yield source.ready.eq(1)
+    while True:
+        yield
+        if (yield source.valid) & (yield source.ready):
+            dut.received.append((yield source.trig))
+
+def run(datas, stages, mem_data=mem_data, bank=None, qualifier=None, errors=None, status=None):
+    """Return the indexes of the records flagged by the trigger, fill status with its CSRs"""
+    tb = TB(mem_data)
+    generators = {"sys": [main_generator(tb, datas, stages, bank, qualifier, errors), receive_generator(tb)]}
+    run_simulation(tb, generators, {"sys": 10})
+    if status is not None:
+        status.update(tb.status)
+    return [i for i, trig in enumerate(tb.received) if trig]
+
+# *********************************************************
+# *                                                       *
+# *                   Run simulation                      *
+# *                                                       *
+# *********************************************************
+
+if __name__ == "__main__":
+    # Single stage, as before: first A
+    datas, ends = make_stream(20, A, 20, A)
+    trigs = run(datas, [(0, 2, 0, 0, 0)])
+    print("A:                      {} (A ends at {})".format(trigs, ends[1]))
+    assert len(trigs) == 1 and ends[1] - 1 <= trigs[0] < ends[2]
+
+    # Third A
+    datas, ends = make_stream(20, A, 20, A, 20, A, 20, A)
+    trigs = run(datas, [(0, 2, 3, 0, 0)])
+    print("Third A:                {} (A ends at {})".format(trigs, ends[5]))
+    assert len(trigs) == 1 and ends[5] - 1 <= trigs[0] < ends[6]
+
+    # A then B within 30 ticks: the first B is too late
+    datas, ends = make_stream(20, A, 60, B, 20, A, 10, B, 20)
+    trigs = run(datas, [(0, 2, 0, 0, 0), (2, 2, 0, 30, 0)])
+    print("A then B within 30:     {} (second B ends at {})".format(trigs, ends[7]))
+    assert len(trigs) == 1 and ends[7] - 1 <= trigs[0] < ends[8]
+
+    # A not followed by B within 30 ticks: the first A is followed by B
+    datas, ends = make_stream(20, A, 10, B, 20, A, 60)
+    trigs = run(datas, [(0, 2, 0, 0, 0), (2, 2, 0, 30, 1)])
+    print("A without B within 30:  {} (second A ends at {})".format(trigs, ends[5]))
+    assert len(trigs) == 1 and ends[5] + 25 <= trigs[0] < ends[5] + 40
+
+    # Self-similar pattern, found after a partial match
+    datas, ends = make_stream(20, [SKP, SKP, SKP, A[1]], 20)
+    trigs = run(datas, [(0, 3, 0, 0, 0)], [make_mem_data(0, 3, 0xbc1c)]*2 + [make_mem_data(0, 3, 0x1c1c)])
+    print("bc1c bc1c 1c1c:         {} (ends at {})".format(trigs, ends[1]))
+    assert trigs == [ends[1] - 1]
+
+    # Overlapping occurrences are all counted
+    datas, ends = make_stream(20, [SKP, SKP, SKP], 20)
+    trigs = run(datas, [(0, 2, 2, 0, 0)], [make_mem_data(0, 3, 0xbc1c)]*2)
+    print("Second bc1c bc1c:       {} (ends at {})".format(trigs, ends[1]))
+    assert trigs == [ends[1] - 1]
+
+    # Unaligned A
+    datas, ends = make_stream(20, [make_data(1, 0x00bc), make_data(3, 0x1c1c), make_data(2, 0x1c00)], 20)
+    trigs = run(datas, [(0, 2, 0, 0, 0)])
+    print("Unaligned A:            {} (ends at {})".format(trigs, ends[1]))
+    assert trigs == [ends[1] - 1]
+
+    # B right after A
+    datas, ends = make_stream(20, A, B, 20)
+    trigs = run(datas, [(0, 2, 0, 0, 0), (2, 2, 0, 0, 0)])
+    print("A then B:               {} (B ends at {})".format(trigs, ends[2]))
+    assert trigs == [ends[2] - 1]
+
+    # Bank: first of A or B
+    datas, ends = make_stream(20, B, 20, A, 20)
+    status = {}
+    trigs = run(datas, [(0, 2, 0, 0, 0), (2, 2, 0, 0, 0)], bank=0b11, status=status)
+    print("Bank A or B:            {} fired {} (B ends at {})".format(trigs, status["fired"], ends[1]))
+    assert trigs == [ends[1] - 1] and status["fired"] == 1
+
+    # Bank with B disabled
+    trigs = run(datas, [(0, 2, 0, 0, 0), (2, 2, 0, 0, 0)], bank=0b01, status=status)
+    print("Bank A:                 {} fired {} (A ends at {})".format(trigs, status["fired"], ends[3]))
+    assert trigs == [ends[3] - 1] and status["fired"] == 0
+
+    # Fourth match of the A then B sequence
+    datas, ends = make_stream(*([10, A, 5, B]*5))
+    trigs = run(datas, [(0, 2, 0, 0, 0), (2, 2, 0, 0, 0)], qualifier=(1, 4, 0, 0), status=status)
+    print("Fourth A then B:        {} matches {} (ends at {})".format(trigs, status["matches"], ends[15]))
+    assert trigs == [ends[15] - 1] and status["matches"] == 4
+
+    # More than 2 A within 15 ticks: A every 22 ticks, then a burst
+    datas, ends = make_stream(20, A, 20, A, 20, A, 20, A, 2, A, 2, A, 20)
+    trigs = run(datas, [(0, 2, 0, 0, 0)], qualifier=(2, 0, 2, 15), status=status)
+    print("3 A within 15 ticks:    {} matches {} (ends at {})".format(trigs, status["matches"], ends[11]))
+    assert trigs == [ends[11] - 1] and status["matches"] == 6
+
+    # EDB, patterns off
+    datas, ends = make_stream(20, A, 20, [make_data(1, 0x00fe)], 20)
+    trigs = run(datas, [(0, 0, 0, 0, 0)], errors=(EDB_ERROR | DISPARITY_ERROR, {}), status=status)
+    print("EDB:                    {} class {} (ends at {})".format(trigs, status["errorClass"], ends[3]))
+    assert trigs == [ends[3] - 1] and status["errorClass"] == EDB_ERROR
+
+    # Disparity error before A, not enabled then enabled
+    datas, ends = make_stream(20, A, 20)
+    trigs = run(datas, [(0, 2, 0, 0, 0)], errors=(EDB_ERROR, {15: DISPARITY_ERROR}), status=status)
+    assert trigs == [ends[1] - 1] and status["errorClass"] == 0
+    trigs = run(datas, [(0, 2, 0, 0, 0)], errors=(DISPARITY_ERROR, {15: DISPARITY_ERROR}), status=status)
+    print("Disparity error:        {} class {}".format(trigs, status["errorClass"]))
+    # Flagged on the record at the trigger output
+    assert len(trigs) == 1 and 10 <= trigs[0] <= 15 and status["errorClass"] == DISPARITY_ERROR
@@ -121,12 +121,16 @@ def main_generator(dut):
     yield from dut.trigger.size.write(len(mem_data))
     yield from dut.trigger.armed.write(1)
 
-    packet = Packet(data)
-    dut.streamer.send(packet)
-
     yield dut.trigger.enable.eq(1)
     yield dut.trigger.source.ready.eq(1)
 
+    # First arming after reset: the pattern memory is copied
+    while not (yield dut.trigger.running.status):
+        yield
+
+    packet = Packet(data)
+    dut.streamer.send(packet)
+
     for i in range(1000):
 
         # If trigged, rearm
@@ -143,6 +147,28 @@ def main_generator(dut):
             yield from dut.trigger.armed.write(1)
         yield
 
+    # Re-enabling (as the recorder does) is immediate when the memory
+    # was not written...
+    yield dut.trigger.enable.eq(0)
+    yield
+    yield dut.trigger.enable.eq(1)
+    for i in range(6):
+        yield
+    dut.rearmed = (yield dut.trigger.running.status)
+
+    # ...and waits for a fresh copy when it was
+    yield dut.trigger.enable.eq(0)
+    yield from dut.trigger.reload.write(1)
+    for i in range(6):
+        yield
+    yield dut.trigger.enable.eq(1)
+    for i in range(6):
+        yield
+    dut.reloading = not (yield dut.trigger.running.status)
+    for i in range(140):
+        yield
+    dut.reloaded = (yield dut.trigger.running.status)
+
 # *********************************************************
 # *                                                       *
 # *                   Run simulation                      *
@@ -158,3 +184,5 @@ if __name__ == "__main__":
     clocks = {"sys": 10}
 
     run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+    print("Re-armed: {}, reloading: {}, reloaded: {}".format(tb.rearmed, tb.reloading, tb.reloaded))
+    assert tb.rearmed and tb.reloading and tb.reloaded
@@ -1,6 +1,9 @@
 # This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
 # License: BSD
 
+from functools import reduce
+from operator import or_
+
 from migen import *
 from migen.genlib.cdc import *
 
@@ -36,25 +39,305 @@ CTRL_UPPER_K = 1
 # *                                                       *
 # *********************************************************
 
+def word_match(pattern, data, ctrl):
+    """Memory word pattern matches data/ctrl, with don't care bytes"""
+    return (((pattern[UPPER_BYTE] == data[UPPER_BYTE])   | pattern[UPPER_DONT_CARE]) &
+            ((pattern[LOWER_BYTE] == data[LOWER_BYTE])   | pattern[LOWER_DONT_CARE]) &
+            ((pattern[UPPER_K]    == ctrl[CTRL_UPPER_K]) | pattern[UPPER_DONT_CARE]) &
+            ((pattern[LOWER_K]    == ctrl[CTRL_LOWER_K]) | pattern[LOWER_DONT_CARE]))
+
+# *********************************************************
+# *                                                       *
+# *                   Pattern matcher                     *
+# *                                                       *
+# *********************************************************
+
+# Shift-and matcher: every word of the pattern memory is compared with
+# each new word, for both byte alignments, and a[j] (u[j] unaligned)
+# tells that the pattern words from the start of the region up to j
+# match the last words of the stream. All the occurrences are found,
+# overlapping or not, without going back in the stream.
+#
+# Regions start at the `bases` given (a region must not hold the base
+# of another one) and found[i] is set when region i, `sizes[i]` words
+# from `bases[i]`, matches up to the word accepted on the last cycle.
+# Time stamp records are skipped. The memory is copied to registers
+# continuously, in mem_size cycles (one word per cycle).
+
+class PatternMatcher(Module):
+    def __init__(self, mem, regions):
+        mem_size = mem.depth
+
+        # *********************************************************
+        # *                    Interface                          *
+        # *********************************************************
+        self.enable = Signal()                  # 0 = Forget partial matches
+        self.valid  = Signal()                  # A word is accepted
+        self.data   = Signal(16)
+        self.ctrl   = Signal(2)
+        self.time   = Signal()
+
+        self.bases  = [Signal(log2_int(mem_size)) for i in range(regions)]
+        self.sizes  = [Signal(8) for i in range(regions)]
+        self.starts = [Signal() for i in range(regions)] # Region is used
+        self.found  = [Signal() for i in range(regions)]
+
+        # *********************************************************
+        # *                      Signals                          *
+        # *********************************************************
+        pattern   = [Signal(20) for i in range(mem_size)]
+        scan      = Signal(log2_int(mem_size))
+        start     = Signal(mem_size)            # Region first words
+        last      = [Signal(log2_int(mem_size)) for i in range(regions)]
+        last_ok   = [Signal() for i in range(regions)]
+
+        a         = Signal(mem_size)            # Aligned partial matches
+        u         = Signal(mem_size)            # Unaligned partial matches
+        prev_data = Signal(16)
+        prev_ctrl = Signal(2)
+        prev_ok   = Signal()
+        updated   = Signal()                    # Matches were updated
+
+        # *********************************************************
+        # *                     Specials                          *
+        # *********************************************************
+        self.specials.rdport = mem.get_port(async_read=True)
+
+        # *********************************************************
+        # *                    Combinatorial                      *
+        # *********************************************************
+        self.comb += [
+            self.rdport.adr.eq(scan),
+            [self.found[i].eq(updated & last_ok[i] & (Array(a)[last[i]] | Array(u)[last[i]])) for i in range(regions)],
+        ]
+
+        # *********************************************************
+        # *                   Synchronous                         *
+        # *********************************************************
+        aligned   = Cat(*[word_match(p, self.data, self.ctrl) for p in pattern])
+        unaligned = Cat(*[word_match(p, Cat(self.data[UPPER_BYTE], prev_data[LOWER_BYTE]),
+                                        Cat(self.ctrl[CTRL_UPPER_K], prev_ctrl[CTRL_LOWER_K])) for p in pattern])
+
+        self.sync += [
+            # Pattern memory copy
+            scan.eq(scan + 1),
+            Array(pattern)[scan].eq(self.rdport.dat_r),
+
+            # Regions (static)
+            start.eq(Cat(*[reduce(or_, [self.starts[i] & (self.bases[i] == j) for i in range(regions)])
+                           for j in range(mem_size)])),
+            [last[i].eq(self.bases[i] + self.sizes[i] - 1) for i in range(regions)],
+            [last_ok[i].eq(self.starts[i] & (self.sizes[i] != 0)) for i in range(regions)],
+
+            updated.eq(self.enable & self.valid & ~self.time),
+            If(~self.enable,
+                a.eq(0),
+                u.eq(0),
+                prev_ok.eq(0),
+            ).Elif(self.valid & ~self.time,
+                a.eq((start | (a << 1)) & aligned),
+                u.eq((start | (u << 1)) & unaligned & Replicate(prev_ok, mem_size)),
+                prev_data.eq(self.data),
+                prev_ctrl.eq(self.ctrl),
+                prev_ok.eq(1),
+            ),
+        ]
+
+# *********************************************************
+# *                                                       *
+# *                    Link monitor                       *
+# *                                                       *
+# *********************************************************
+
+# Times the link from the descrambler stream and pulses timeouts[i]
+# once when LINK_TIMEOUTS[i] lasts `thresholds[i]` time ticks (0 = off):
+# no TLP or DLLP start, electrical idle (from an EIOS up to the next
+# ordered set or frame) and training (from TS1/TS2 up to a SKP, FTS,
+# EIOS or frame). All timers restart when enable is low.
+
+class LinkMonitor(Module):
+    def __init__(self):
+
+        # *********************************************************
+        # *                    Interface                          *
+        # *********************************************************
+        self.sink       = sink = stream.Endpoint(descrambler_layout) # Tap, ready is not used
+        self.enable     = Signal()
+        self.time       = Signal(32)
+        self.thresholds = [Signal(32) for name in LINK_TIMEOUTS]
+        self.timeouts   = Signal(len(LINK_TIMEOUTS))
+
+        # *********************************************************
+        # *                      Signals                          *
+        # *********************************************************
+        frame     = Signal()                    # TLP or DLLP start
+        oset      = Signal()
+        since     = [Signal(32) for name in LINK_TIMEOUTS]
+        elapsed   = [Signal(32) for name in LINK_TIMEOUTS]
+        reported  = [Signal() for name in LINK_TIMEOUTS]
+        state     = Signal(len(LINK_TIMEOUTS))  # Conditions lasting
+        elec_idle = Signal()
+        training  = Signal()
+        start     = Signal(len(LINK_TIMEOUTS))  # Conditions starting
+
+        INACTIVITY = LINK_TIMEOUTS.index("inactivity")
+        ELECIDLE   = LINK_TIMEOUTS.index("elecidle")
+        TRAINING   = LINK_TIMEOUTS.index("training")
+
+        # *********************************************************
+        # *                    Combinatorial                      *
+        # *********************************************************
+        def starts(byte, k):
+            return k & ((byte == STP.value) | (byte == SDP.value))
+
+        self.comb += [
+            oset.eq(sink.valid & (sink.osets != 0)),
+            frame.eq(sink.valid & ~oset &
+                     (starts(sink.data[8:16], sink.ctrl[1]) | starts(sink.data[0:8], sink.ctrl[0]))),
+
+            # Inactivity always lasts, it starts again with each frame
+            state[INACTIVITY].eq(1),
+            state[ELECIDLE].eq(elec_idle),
+            state[TRAINING].eq(training),
+            start[INACTIVITY].eq(frame),
+            start[ELECIDLE].eq(oset & (sink.type == osetsType.IDLE) & ~elec_idle),
+            start[TRAINING].eq(oset & ((sink.type == osetsType.TS1) | (sink.type == osetsType.TS2)) &
+                               ~training),
+        ]
+
+        for i in range(len(LINK_TIMEOUTS)):
+            self.comb += [
+                elapsed[i].eq(self.time - since[i]),
+                self.timeouts[i].eq(self.enable & state[i] & ~reported[i] & (self.thresholds[i] != 0) &
+                                    (elapsed[i] >= self.thresholds[i])),
+            ]
+
+        # *********************************************************
+        # *                    Synchronous                        *
+        # *********************************************************
+        self.sync += [
+            If(~self.enable,
+                elec_idle.eq(0),
+                training.eq(0),
+            ).Elif(oset & (sink.type == osetsType.IDLE),
+                elec_idle.eq(1),
+                training.eq(0),
+            ).Elif(oset & ((sink.type == osetsType.TS1) | (sink.type == osetsType.TS2)),
+                elec_idle.eq(0),
+                training.eq(1),
+            ).Elif(oset | frame,
+                elec_idle.eq(0),
+                training.eq(0),
+            ),
+        ]
+
+        for i in range(len(LINK_TIMEOUTS)):
+            self.sync += [
+                If(~self.enable | start[i],
+                    since[i].eq(self.time),
+                    reported[i].eq(0),
+                ).Elif(self.timeouts[i],
+                    reported[i].eq(1),
+                ),
+            ]
+
 # *********************************************************
 # *                                                       *
 # *                      Trigger                          *
 # *                                                       *
 # *********************************************************
 
+# The trigger runs a sequence of up to `stages` stages. Each stage looks
+# for its own pattern: stage 0 uses the first `size` words of the
+# memory, stage i the `size{i}` words from `base{i}`. A stage is done
+# when its pattern is found `count{i}` times (0 is the same as 1). The
+# sequence then moves to the next stage, or triggers after the last
+# one (`stages` stages are used, 1 by default).
+#
+# `timeout{i}` (time ticks, 0 = none) gives a window: when the pattern
+# is not found in time, the sequence restarts from stage 0. With
+# `restart{i}` set, the stage works the other way round: finding the
+# pattern restarts the sequence and the timeout moves it forward, to
+# catch "A not followed by B within T".
+#
+# The patterns of all the stages are looked for at the same time (see
+# PatternMatcher): a stage pattern starting right after the previous
+# one is found. The trig flag is set on the last word of the pattern.
+#
+# The matcher works on a register copy of the pattern memory. Once the
+# memory was written, the host pulses `reload` (TriggerLoader does): the
+# next arming then waits mem_size clock cycles for a fresh copy, blind
+# to the stream. Otherwise, re-arming is immediate. `running` tells the
+# trigger is matching. The copy is also reloaded after a reset.
+#
+# With `bank` set, the stage patterns are independent instead: the
+# trigger fires on the first one found among those enabled in
+# `bankEnable` (count, timeout and restart are not used). `fired`
+# gives the pattern that fired (the last stage in a sequence), also
+# sent to the recorder with trigId.
+#
+# A qualifier decides whether a match (a completed sequence or a bank
+# pattern found) fires the trigger. With `qualifier` 1 the trigger
+# fires on the `nth` match, with 2 when more than `rateCount` matches
+# happen within `rateWindow` time ticks (the times of the last
+# rate_depth matches are kept). Unqualified matches restart the
+# sequence. `matches` counts the matches since arming.
+#
+# Errors of the classes enabled in `errorEnable` (see ERROR_CLASSES)
+# are matches too: EDB symbols are found here, the other classes come
+# from the error inputs. `errorClass` gives the classes of the error
+# that fired (0 for a pattern). Filter and link errors are seen earlier
+# in the pipeline: the trig flag is set a few records before the bad
+# ones. Set the stage 0 size to 0 to trigger on errors only.
+#
+# Link timeouts are matches too (see LinkMonitor): `inactivityTicks`,
+# `elecIdleTicks` and `trainingTicks` give their thresholds (0 = off),
+# counted from arming at most, and `linkTimeout` the ones that fired.
+
 class Trigger(Module, AutoCSR):
 
-    def __init__(self, clock_domain, mem_size=128):
+    def __init__(self, clock_domain, mem_size=128, stages=TRIGGER_STAGES, rate_depth=256):
+        assert bits_for(stages - 1) <= TRIG_ID_BITS # trigId must fit in the DDR blocks
 
         # *********************************************************
         # *                    Interface                          *
         # *********************************************************
         self.armed     = CSRStorage()    # Trigger is armed
         self.trigged   = CSRStatus()     # Pattern found
-        self.size      = CSRStorage(8)   # Pattern size - 1
+        self.reload    = CSR()           # Pattern memory written, copy it on next arming
+        self.running   = CSRStatus()     # Armed and matching
+        self.size      = CSRStorage(8)   # Pattern size (stage 0)
+        self.stages    = CSRStorage(bits_for(stages), reset=1) # Stages in the sequence
+        self.stage     = CSRStatus(bits_for(stages))           # Current stage
+        self.bank      = CSRStorage()                          # 0 = Sequence, 1 = Bank
+        self.bankEnable= CSRStorage(stages, reset=1)           # Bank: patterns enabled
+        self.fired     = CSRStatus(bits_for(stages - 1))       # Pattern that fired
+        self.qualifier = CSRStorage(2)   # 0 = First match, 1 = Nth match, 2 = Rate
+        self.nth       = CSRStorage(32)  # Nth: match that fires
+        self.rateCount = CSRStorage(log2_int(rate_depth)) # Rate: more than rateCount matches...
+        self.rateWindow= CSRStorage(32)  # Rate: ...within rateWindow time ticks
+        self.matches   = CSRStatus(32)   # Matches since armed
+        self.errorEnable = CSRStorage(len(ERROR_CLASSES)) # Error classes that match
+        self.errorClass  = CSRStatus(len(ERROR_CLASSES))  # Error classes that fired
+        self.inactivityTicks = CSRStorage(32) # No TLP or DLLP threshold
+        self.elecIdleTicks   = CSRStorage(32) # Electrical idle threshold
+        self.trainingTicks   = CSRStorage(32) # TS1/TS2 training threshold
+        self.linkTimeout     = CSRStatus(len(LINK_TIMEOUTS)) # Link timeouts that fired
+
+        for i in range(1, stages):
+            setattr(self, "base{:d}".format(i), CSRStorage(log2_int(mem_size), name="base{:d}".format(i)))
+            setattr(self, "size{:d}".format(i), CSRStorage(8, name="size{:d}".format(i)))
+        for i in range(stages):
+            setattr(self, "count{:d}".format(i),   CSRStorage(16, name="count{:d}".format(i)))
+            setattr(self, "timeout{:d}".format(i), CSRStorage(32, name="timeout{:d}".format(i)))
+            setattr(self, "restart{:d}".format(i), CSRStorage(name="restart{:d}".format(i)))
 
         self.enable   = Signal()
         self.trigExt  = Signal()
+        self.time     = Signal(32)      # Time source
+        self.trigId   = Signal(bits_for(stages - 1)) # Pattern that fired
+        self.error    = Signal(len(ERROR_CLASSES))   # Errors (EDB is found here)
+        self.link     = stream.Endpoint(descrambler_layout) # Link monitor tap
 
         self.sink   =   sink = stream.Endpoint(trigger_layout)
         self.source = source = stream.Endpoint(trigger_layout)
@@ -62,26 +345,100 @@ class Trigger(Module, AutoCSR):
         # *********************************************************
         # *                      Signals                          *
         # *********************************************************
-        matches  = Signal(8)
-        addr     = Signal(log2_int(mem_size))
         trig     = Signal()
+        flag     = Signal()             # Trig flag waiting for its word
+        load     = Signal(max=mem_size + 1)
+        dirty    = Signal(reset=1)      # Pattern copy must be reloaded
+
+        stage      = Signal(max=stages)
+        next_stage = Signal(max=stages)
+        found      = Signal()           # Stage pattern found
+        running    = Signal()
+        occurrences= Signal(16)
+        stage_time = Signal(32)         # Time the stage started
+        elapsed    = Signal(32)         # Time since the stage started
+        timed_out  = Signal()
+        advance    = Signal()
+        restart    = Signal()
+        event      = Signal()           # Match, before qualification
+        errors     = Signal(len(ERROR_CLASSES))      # Enabled errors seen
+        error_class= Signal(len(ERROR_CLASSES))
+        edb        = Signal()
+        link_timeout = Signal(len(LINK_TIMEOUTS))
+        qualified  = Signal()           # Match fires the trigger
+        fire       = Signal()
+        matches    = Signal(32)
+        rate_index = Signal(log2_int(rate_depth))
+        rate_elapsed = Signal(32)       # Time since rateCount matches ago
+        bank_found = Signal(stages)     # Bank: enabled patterns found
+        fired      = Signal(bits_for(stages - 1))
 
         _armed   = Signal()
         _trigged = Signal()
         _size    = Signal(8)
+        _stages  = Signal(bits_for(stages))
+        _time    = Signal(32)
+        _bank    = Signal()
+        _bankEnable = Signal(stages)
+        _qualifier  = Signal(2)
+        _nth        = Signal(32)
+        _rateCount  = Signal(log2_int(rate_depth))
+        _rateWindow = Signal(32)
+        _errorEnable= Signal(len(ERROR_CLASSES))
+        _linkTicks  = [Signal(32) for name in LINK_TIMEOUTS]
+
+        _bases    = [Signal(log2_int(mem_size)) for i in range(stages)]
+        _sizes    = [_size] + [Signal(8) for i in range(1, stages)]
+        _counts   = [Signal(16) for i in range(stages)]
+        _timeouts = [Signal(32) for i in range(stages)]
+        _restarts = [Signal() for i in range(stages)]
 
         # *********************************************************
         # *                         CDC                           *
         # *********************************************************
         self.specials += MultiReg(self.armed.storage, _armed, clock_domain)
         self.specials += MultiReg(_trigged, self.trigged.status, "sys")
+        self.specials += MultiReg(running, self.running.status, "sys")
+
+        ps_reload = PulseSynchronizer("sys", clock_domain)
+        self.submodules += ps_reload
+        self.comb += ps_reload.i.eq(self.reload.re)
         self.specials += MultiReg(self.size.storage, _size, clock_domain)
+        self.specials += MultiReg(self.stages.storage, _stages, clock_domain)
+        self.specials += MultiReg(stage, self.stage.status, "sys")
+        self.specials += MultiReg(self.time, _time, clock_domain)
+        self.specials += MultiReg(self.bank.storage, _bank, clock_domain)
+        self.specials += MultiReg(self.bankEnable.storage, _bankEnable, clock_domain)
+        self.specials += MultiReg(self.trigId, self.fired.status, "sys")
+        self.specials += MultiReg(self.qualifier.storage, _qualifier, clock_domain)
+        self.specials += MultiReg(self.nth.storage, _nth, clock_domain)
+        self.specials += MultiReg(self.rateCount.storage, _rateCount, clock_domain)
+        self.specials += MultiReg(self.rateWindow.storage, _rateWindow, clock_domain)
+        self.specials += MultiReg(matches, self.matches.status, "sys")
+        self.specials += MultiReg(self.errorEnable.storage, _errorEnable, clock_domain)
+        self.specials += MultiReg(error_class, self.errorClass.status, "sys")
+        self.specials += MultiReg(link_timeout, self.linkTimeout.status, "sys")
+        for reg, ticks in zip([self.inactivityTicks, self.elecIdleTicks, self.trainingTicks], _linkTicks):
+            self.specials += MultiReg(reg.storage, ticks, clock_domain)
+
+        for i in range(1, stages):
+            self.specials += MultiReg(getattr(self, "base{:d}".format(i)).storage, _bases[i], clock_domain)
+            self.specials += MultiReg(getattr(self, "size{:d}".format(i)).storage, _sizes[i], clock_domain)
+        for i in range(stages):
+            self.specials += MultiReg(getattr(self, "count{:d}".format(i)).storage, _counts[i], clock_domain)
+            self.specials += MultiReg(getattr(self, "timeout{:d}".format(i)).storage, _timeouts[i], clock_domain)
+            self.specials += MultiReg(getattr(self, "restart{:d}".format(i)).storage, _restarts[i], clock_domain)
 
         # *********************************************************
         # *                     Specials                          *
         # *********************************************************
         self.specials.mem = Memory(20, mem_size)
-        self.specials.rdport = self.mem.get_port(write_capable=False, async_read=True, clock_domain=clock_domain)
+
+        # Match times, for the rate qualifier
+        times    = Memory(32, rate_depth)
+        times_wr = times.get_port(write_capable=True, clock_domain=clock_domain)
+        times_rd = times.get_port(async_read=True)
+        self.specials += times, times_wr, times_rd
 
         # *********************************************************
         # *                     Submodules                        *
@@ -91,6 +448,12 @@ class Trigger(Module, AutoCSR):
         self.submodules += ClockDomainsRenamer(clock_domain)(buf0)
         self.submodules += ClockDomainsRenamer(clock_domain)(buf1)
 
+        matcher = PatternMatcher(self.mem, stages)
+        self.submodules.matcher = ClockDomainsRenamer(clock_domain)(matcher)
+
+        monitor = LinkMonitor()
+        self.submodules.monitor = ClockDomainsRenamer(clock_domain)(monitor)
+
         # *********************************************************
         # *                    Combinatorial                      *
         # *********************************************************
@@ -99,9 +462,90 @@ class Trigger(Module, AutoCSR):
             buf0.source.connect(buf1.sink),
             buf1.source.connect(source, omit={"trig"}),
             sink.ready.eq(source.ready),
-            self.rdport.adr.eq(addr),
-            source.trig.eq(buf1.source.trig | trig),
+            source.trig.eq(buf1.source.trig | trig | flag),
             self.trigExt.eq(trig),
+
+            # Words are matched when they go to buf1, found on the
+            # next cycle when they are on buf1 output
+            matcher.enable.eq(running),
+            matcher.valid.eq(buf0.source.valid & buf0.source.ready),
+            matcher.data.eq(buf0.source.data),
+            matcher.ctrl.eq(buf0.source.ctrl),
+            matcher.time.eq(buf0.source.time),
+            [matcher.bases[i].eq(_bases[i]) for i in range(stages)],
+            [matcher.sizes[i].eq(_sizes[i]) for i in range(stages)],
+            [matcher.starts[i].eq(Mux(_bank, _bankEnable[i], i < _stages)) for i in range(stages)],
+
+            self.link.connect(monitor.sink),
+            monitor.enable.eq(running),
+            monitor.time.eq(_time),
+            [monitor.thresholds[i].eq(_linkTicks[i]) for i in range(len(LINK_TIMEOUTS))],
+        ]
+
+        sync = getattr(self.sync, clock_domain)
+        sync += [
+            If(source.valid & source.ready,
+                flag.eq(0),
+            ).Elif(trig,
+                flag.eq(1),
+            ),
+        ]
+
+        # *********************************************************
+        # *                      Sequence                         *
+        # *********************************************************
+        counts   = Array(_counts)
+        timeouts = Array(_timeouts)
+        restarts = Array(_restarts)
+
+        self.comb += [
+            found.eq(Array(matcher.found)[stage]),
+            elapsed.eq(_time - stage_time),
+            timed_out.eq(running & (timeouts[stage] != 0) & (elapsed >= timeouts[stage])),
+            If(restarts[stage],
+                advance.eq(timed_out),
+                restart.eq(found),
+            ).Else(
+                advance.eq(found & (occurrences + 1 >= counts[stage])),
+                restart.eq(timed_out),
+            ),
+            bank_found.eq(Cat(*matcher.found) & _bankEnable),
+            If(_bank,
+                event.eq(running & ((bank_found != 0) | (errors != 0) | (monitor.timeouts != 0))),
+            ).Else(
+                event.eq(running & ((advance & (stage + 1 >= _stages)) | (errors != 0) |
+                                    (monitor.timeouts != 0))),
+            ),
+            fire.eq(event & qualified),
+
+            # Lowest pattern found first
+            fired.eq(stage),
+            If(_bank,
+                [If(bank_found[i], fired.eq(i)) for i in reversed(range(stages))],
+            ),
+
+            If(~running | restart | _bank | (event & ~fire),
+                next_stage.eq(0),
+            ).Elif(advance & ~event,
+                next_stage.eq(stage + 1),
+            ).Else(
+                next_stage.eq(stage),
+            ),
+        ]
+
+        sync += [
+            If(fire,
+                self.trigId.eq(fired),
+                error_class.eq(errors),
+                link_timeout.eq(monitor.timeouts),
+            ),
+            stage.eq(next_stage),
+            If(~running | restart | advance,
+                occurrences.eq(0),
+                stage_time.eq(_time),
+            ).Elif(found,
+                occurrences.eq(occurrences + 1),
+            ),
         ]
 
         # *********************************************************
@@ -110,88 +554,46 @@ class Trigger(Module, AutoCSR):
         fsm = ResetInserter()(FSM(reset_state="IDLE"))
         self.submodules.fsm = ClockDomainsRenamer(clock_domain)(fsm)
 
-        fsm.act("IDLE",
-            If(_armed & self.enable,
-                NextValue(addr, 0),
-                NextValue(matches, 0),
-                NextState("FIRST")
+        self.comb += running.eq(fsm.ongoing("RUN"))
+
+        sync += [
+            If(ps_reload.o,
+                dirty.eq(1),
+            ).Elif(fsm.ongoing("LOAD") & (load == mem_size),
+                dirty.eq(0),
             ),
-        )
+        ]
 
-        fsm.act("FIRST",
-            # If we search "bc1c" we are in this situation: bc1c 1c1c xxxx
-            If((((self.rdport.dat_r[UPPER_BYTE] == buf0.source.data[UPPER_BYTE])  | self.rdport.dat_r[UPPER_DONT_CARE]) &
-               ((self.rdport.dat_r[LOWER_BYTE]  == buf0.source.data[LOWER_BYTE])  | self.rdport.dat_r[LOWER_DONT_CARE]) &
-               ((self.rdport.dat_r[UPPER_K]     == buf0.source.ctrl[CTRL_UPPER_K])| self.rdport.dat_r[UPPER_DONT_CARE]) &
-               ((self.rdport.dat_r[LOWER_K]     == buf0.source.ctrl[CTRL_LOWER_K])| self.rdport.dat_r[LOWER_DONT_CARE]) &
-                ~buf0.source.time & buf0.source.valid),
-                # Full word match
-                NextValue(matches, matches + 1),
-                NextValue(addr, addr + 1),
-                NextState("ALIGNED_CHECK")
-            ).Else(
-                # If we search "bc1c" we are in this situation: xxbc 1c1c 1cxx
-                If((((self.rdport.dat_r[UPPER_BYTE] == buf0.source.data[LOWER_BYTE])  | self.rdport.dat_r[UPPER_DONT_CARE]) &
-                    ((self.rdport.dat_r[LOWER_BYTE] == sink.data[UPPER_BYTE])         | self.rdport.dat_r[LOWER_DONT_CARE]) &
-                    ((self.rdport.dat_r[UPPER_K]    == buf0.source.ctrl[CTRL_LOWER_K])| self.rdport.dat_r[UPPER_DONT_CARE]) &
-                    ((self.rdport.dat_r[LOWER_K]    == sink.ctrl[CTRL_UPPER_K])       | self.rdport.dat_r[UPPER_DONT_CARE]) &
-                     ~buf0.source.time & ~sink.time & buf0.source.valid & sink.valid),
-                        # Half word match
-                        NextValue(matches, matches + 1),
-                        NextValue(addr, addr + 1),
-                        NextState("UNALIGNED_CHECK")
+        fsm.act("IDLE",
+            If(_armed & self.enable,
+                NextValue(load, 0),
+                If(dirty,
+                    NextState("LOAD")
+                ).Else(
+                    NextState("RUN")
                 )
             ),
-            If(~self.enable,
-                NextState("IDLE")
-            )
         )
 
-        fsm.act("ALIGNED_CHECK",
-            If(matches == _size,
-                NextState("DONE"),
-                NextValue(_trigged, 1),
-                trig.eq(1),
-            ).Else(
-                If((((self.rdport.dat_r[UPPER_BYTE] == buf0.source.data[UPPER_BYTE])  | self.rdport.dat_r[UPPER_DONT_CARE]) &
-                   ((self.rdport.dat_r[LOWER_BYTE]  == buf0.source.data[LOWER_BYTE])  | self.rdport.dat_r[LOWER_DONT_CARE]) &
-                   ((self.rdport.dat_r[UPPER_K]     == buf0.source.ctrl[CTRL_UPPER_K])| self.rdport.dat_r[UPPER_DONT_CARE]) &
-                   ((self.rdport.dat_r[LOWER_K]     == buf0.source.ctrl[CTRL_LOWER_K])| self.rdport.dat_r[LOWER_DONT_CARE]) &
-                    ~buf0.source.time & buf0.source.valid),
-                    NextValue(matches, matches + 1),
-                    NextValue(addr, addr + 1),
-                    NextState("ALIGNED_CHECK")
-                ).Else(
-                    NextValue(matches, 0),
-                    NextValue(addr, 0),
-                    NextState("FIRST")
-                )
+        # Wait for the matcher to get a fresh copy of the memory, from
+        # the start again if it is written meanwhile
+        fsm.act("LOAD",
+            NextValue(load, load + 1),
+            If(ps_reload.o,
+                NextValue(load, 0),
+            ).Elif(load == mem_size,
+                NextState("RUN")
             ),
             If(~self.enable,
                 NextState("IDLE")
             )
         )
 
-        fsm.act("UNALIGNED_CHECK",
-            If(matches == _size,
+        fsm.act("RUN",
+            If(fire,
                 NextState("DONE"),
                 NextValue(_trigged, 1),
                 trig.eq(1),
-            ).Else(
-                If((((self.rdport.dat_r[UPPER_BYTE] == buf0.source.data[LOWER_BYTE])  | self.rdport.dat_r[UPPER_DONT_CARE]) &
-                    ((self.rdport.dat_r[LOWER_BYTE] == sink.data[UPPER_BYTE])         | self.rdport.dat_r[LOWER_DONT_CARE]) &
-                    ((self.rdport.dat_r[UPPER_K]    == buf0.source.ctrl[CTRL_LOWER_K])| self.rdport.dat_r[UPPER_DONT_CARE]) &
-                    ((self.rdport.dat_r[LOWER_K]    == sink.ctrl[CTRL_UPPER_K])       | self.rdport.dat_r[UPPER_DONT_CARE]) &
-                     ~buf0.source.time & ~sink.time & buf0.source.valid & sink.valid),
-                        # Half word match
-                        NextValue(matches, matches + 1),
-                        NextValue(addr, addr + 1),
-                        NextState("UNALIGNED_CHECK")
-                ).Else(
-                        NextValue(matches, 0),
-                        NextValue(addr, 0),
-                        NextState("FIRST")
-                )
             ),
             If(~self.enable,
                 NextState("IDLE")
@@ -207,3 +609,43 @@ class Trigger(Module, AutoCSR):
                 NextState("IDLE")
             )
         )
+
+        # *********************************************************
+        # *                      Qualifier                        *
+        # *********************************************************
+        self.comb += [
+            times_wr.adr.eq(rate_index),
+            times_wr.dat_w.eq(_time),
+            times_wr.we.eq(event),
+            times_rd.adr.eq(rate_index - _rateCount),
+            rate_elapsed.eq(_time - times_rd.dat_r),
+
+            Case(_qualifier, {
+                1:         qualified.eq(matches + 1 >= _nth),
+                2:         qualified.eq((_rateCount == 0) |
+                                        ((matches >= _rateCount) & (rate_elapsed < _rateWindow))),
+                "default": qualified.eq(1),
+            }),
+        ]
+
+        sync += [
+            If(fsm.ongoing("IDLE"),
+                matches.eq(0),
+                rate_index.eq(0),
+            ).Elif(event,
+                matches.eq(matches + 1),
+                rate_index.eq(rate_index + 1),
+            ),
+        ]
+
+        # *********************************************************
+        # *                       Errors                          *
+        # *********************************************************
+        # EDB found on the next cycle, with the patterns
+        sync += [
+            edb.eq(matcher.valid & ~matcher.time &
+                   ((matcher.ctrl[CTRL_UPPER_K] & (matcher.data[UPPER_BYTE] == EDB.value)) |
+                    (matcher.ctrl[CTRL_LOWER_K] & (matcher.data[LOWER_BYTE] == EDB.value)))),
+        ]
+
+        self.comb += errors.eq((self.error | (edb << ERROR_CLASSES.index("edb"))) & _errorEnable)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+import random
+import struct
+
+from migen import *
+
+from litex.soc.interconnect import stream
+
+from litedram.common import LiteDRAMNativePort
+
+from liteeth.common import eth_udp_user_description
+
+from pcie_analyzer.udp_streamer.udp_streamer import *
+from pcie_analyzer.software.udp_receiver import decode_datagram, ip_to_int
+
+# *********************************************************
+# *                                                       *
+# *                  Simulation datas                     *
+# *                                                       *
+# *********************************************************
+
+DRAM_BLOCKS = 256
+BLOCK_SIZE  = 32
+
+random.seed(0)
+dram = [random.getrandbits(8*BLOCK_SIZE) for i in range(DRAM_BLOCKS)]
+
+AREA_ADDR = 0x200
+AREA_SIZE = 100*BLOCK_SIZE  # Last datagram is not full
+
+# *********************************************************
+# *                                                       *
+# *                     Test bench                        *
+# *                                                       *
+# *********************************************************
+
+class UDPPort:
+    def __init__(self):
+        self.sink = stream.Endpoint(eth_udp_user_description(32))
+
+class TB(Module):
+    def __init__(self):
+        self.port = LiteDRAMNativePort("read", 24, 8*BLOCK_SIZE)
+        self.udp  = UDPPort()
+        self.submodules.streamer = UDPStreamer(self.port, self.udp)
+
+        self.datagrams = []
+        self.runs      = []
+
+# *********************************************************
+# *                                                       *
+# *                         Main                          *
+# *                                                       *
+# *********************************************************
+
+# (blocks, datagrams expected): 0 is clamped to 1, 255 to maxBlocks
+RUNS = [(8, -(-100//8)), (0, 100), (255, -(-100//45))]
+
+def main_generator(dut):
+    yield from dut.streamer.ipAddress.write(ip_to_int("192.168.1.100"))
+    yield from dut.streamer.dstPort.write(5000)
+    for blocks, expected in RUNS:
+        yield from dut.streamer.blocks.write(blocks)
+        yield from dut.streamer.addr.write(AREA_ADDR)
+        yield from dut.streamer.size.write(AREA_SIZE)
+        yield from dut.streamer.start.write(1)
+        for i in range(10):
+            yield
+        # A start during the transfer is ignored
+        yield from dut.streamer.addr.write(0)
+        yield from dut.streamer.start.write(1)
+        while not (yield dut.streamer.finished.status):
+            yield
+        for i in range(10):
+            yield
+        dut.runs.append(((yield dut.streamer.packets.status), dut.datagrams))
+        dut.datagrams = []
+
+@passive
+def dram_generator(dut):
+    # Read port with some latency, stalled at times
+    pending = []
+    while True:
+        yield dut.port.cmd.ready.eq(random.random() > 0.2)
+        yield dut.port.rdata.valid.eq(0)
+        if pending and pending[0][0] == 0:
+            yield dut.port.rdata.valid.eq(1)
+            yield dut.port.rdata.data.eq(dram[pending[0][1]])
+        yield
+        if (yield dut.port.cmd.valid) & (yield dut.port.cmd.ready):
+            pending.append([4, (yield dut.port.cmd.addr)])
+        if pending and pending[0][0] == 0 and (yield dut.port.rdata.ready):
+            pending.pop(0)
+        for request in pending:
+            request[0] = max(request[0] - 1, 0)
+
+@passive
+def udp_generator(dut):
+    # Local UDP receiver: collect datagrams, back pressure at times
+    words = []
+    sink  = dut.udp.sink
+    while True:
+        yield sink.ready.eq(random.random() > 0.3)
+        yield
+        if (yield sink.valid) & (yield sink.ready):
+            words.append((yield sink.data))
+            if (yield sink.last):
+                assert (yield sink.ip_address) == ip_to_int("192.168.1.100")
+                assert (yield sink.dst_port) == 5000
+                assert (yield sink.length) == 4*len(words)
+                dut.datagrams.append(struct.pack("<{:d}I".format(len(words)), *words))
+                words = []
+
+# *********************************************************
+# *                                                       *
+# *                      Check datas                      *
+# *                                                       *
+# *********************************************************
+
+def check_datagrams(dut):
+    expected = b"".join(block.to_bytes(BLOCK_SIZE, "little")
+                        for block in dram[AREA_ADDR//BLOCK_SIZE:(AREA_ADDR + AREA_SIZE)//BLOCK_SIZE])
+    for (blocks, count), (packets, datagrams) in zip(RUNS, dut.runs):
+        buf = bytearray(AREA_SIZE)
+        for i, datagram in enumerate(datagrams):
+            seq, address, payload = decode_datagram(datagram)
+            assert seq == i
+            assert len(datagram) <= UDP_PAYLOAD_MAX
+            buf[address - AREA_ADDR:address - AREA_ADDR + len(payload)] = payload
+        print("blocks {}: {} datagrams, {} bytes".format(blocks, len(datagrams), len(buf)))
+        assert packets == len(datagrams) == count
+        assert buf == expected
+    assert len(dut.runs) == len(RUNS)
+
+# *********************************************************
+# *                                                       *
+# *                   Run simulation                      *
+# *                                                       *
+# *********************************************************
+
+if __name__ == "__main__":
+    tb = TB()
+    generators = {
+        "sys" :   [main_generator(tb),
+                   dram_generator(tb),
+                   udp_generator(tb)]
+    }
+    clocks = {"sys": 10}
+
+    run_simulation(tb, generators, clocks, vcd_name="sim.vcd")
+    check_datagrams(tb)
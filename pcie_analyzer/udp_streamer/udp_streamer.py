@@ -0,0 +1,189 @@
+# This file is Copyright (c) 2020 Franck Jullien <franck.jullien@gmail.com>
+# License: BSD
+
+from migen import *
+
+from litex.soc.interconnect.csr import *
+from litex.soc.interconnect import stream
+
+from litedram.frontend.dma import LiteDRAMDMAReader
+
+# *********************************************************
+# *                                                       *
+# *                     Definitions                       *
+# *                                                       *
+# *********************************************************
+
+UDP_STREAMER_PORT = 2345 # Datagrams source port
+UDP_PAYLOAD_MAX   = 1472 # 1500 bytes MTU, less the IP and UDP headers
+
+# +--------------------------------+ Datagram (32-bit little endian words)
+# | sequence number                | Datagrams sent since start
+# | address                        | DRAM address of the first block (bytes)
+# +--------------------------------+
+# | DRAM blocks (as in memory)     | up to "blocks" blocks
+# +--------------------------------+
+HEADER_WORDS = 2
+
+# *********************************************************
+# *                                                       *
+# *                    UDP Streamer                       *
+# *                                                       *
+# *********************************************************
+
+class UDPStreamer(Module, AutoCSR):
+    """Push a DRAM area to a host as UDP datagrams.
+
+    Blocks are read with a LiteDRAMDMAReader and sent as they come, with
+    no round trip: each datagram holds a header (see above) and up to
+    "blocks" DRAM blocks. blocks is clamped to 1 to maxBlocks, so that
+    datagrams fit in max_payload bytes. start is only taken when
+    finished, a start during a transfer is ignored. udp_port is a 32-bit
+    LiteEth UDP user port.
+    """
+    def __init__(self, dram_port, udp_port, src_port=UDP_STREAMER_PORT, fifo_depth=64,
+                 max_payload=UDP_PAYLOAD_MAX):
+
+        # *********************************************************
+        # *                    Interface                          *
+        # *********************************************************
+        self.start     = CSR()                     # Start sending the area
+        self.finished  = CSRStatus()               # All datagrams sent
+        self.ipAddress = CSRStorage(32)            # Host IP address
+        self.dstPort   = CSRStorage(16)            # Host UDP port
+        self.addr      = CSRStorage(32)            # Area address (bytes)
+        self.size      = CSRStorage(32)            # Area size (bytes, whole blocks)
+        self.blocks    = CSRStorage(8, reset=32)   # Blocks per datagram
+        self.packets   = CSRStatus(32)             # Datagrams sent since start
+
+        self.dw        = CSRConstant(dram_port.data_width)
+
+        max_blocks     = (max_payload//4 - HEADER_WORDS)//(dram_port.data_width//32)
+        assert 0 < max_blocks < 256
+        self.maxBlocks = CSRConstant(max_blocks)
+
+        # *********************************************************
+        # *                      Signals                          *
+        # *********************************************************
+        shift     = log2_int(dram_port.data_width//8)
+        words     = dram_port.data_width//32       # UDP words per block
+
+        rd_addr   = Signal(dram_port.address_width)
+        rd_left   = Signal(32)                     # Blocks left to request
+        tx_left   = Signal(32)                     # Blocks left to send
+        count     = Signal(8)                      # Blocks in this datagram
+        blocks    = Signal(8)                      # Blocks per datagram, clamped
+        start     = Signal()                       # Start, when finished
+        word      = Signal(16)                     # Word in this datagram
+        seq       = Signal(32)
+        address   = Signal(32)
+
+        # *********************************************************
+        # *                     Submodules                        *
+        # *********************************************************
+        self.submodules.dma       = dma       = LiteDRAMDMAReader(dram_port, fifo_depth)
+        self.submodules.converter = converter = stream.Converter(dram_port.data_width, 32)
+
+        # *********************************************************
+        # *                    Combinatorial                      *
+        # *********************************************************
+        self.comb += [
+            dma.source.connect(converter.sink),
+
+            # Read requests run ahead, the DMA FIFO holds the blocks
+            dma.sink.valid.eq(rd_left != 0),
+            dma.sink.address.eq(rd_addr),
+
+            If(self.blocks.storage == 0,
+                blocks.eq(1),
+            ).Elif(self.blocks.storage > max_blocks,
+                blocks.eq(max_blocks),
+            ).Else(
+                blocks.eq(self.blocks.storage),
+            ),
+            If(tx_left < blocks,
+                count.eq(tx_left),
+            ).Else(
+                count.eq(blocks),
+            ),
+
+            udp_port.sink.src_port.eq(src_port),
+            udp_port.sink.dst_port.eq(self.dstPort.storage),
+            udp_port.sink.ip_address.eq(self.ipAddress.storage),
+            udp_port.sink.length.eq((HEADER_WORDS + count*words)*4),
+            udp_port.sink.last_be.eq(Mux(udp_port.sink.last, 0b1000, 0)),
+
+            self.packets.status.eq(seq),
+        ]
+
+        # *********************************************************
+        # *                   Synchronous                         *
+        # *********************************************************
+        self.sync += [
+            If(start,
+                rd_addr.eq(self.addr.storage[shift:]),
+                rd_left.eq(self.size.storage[shift:]),
+            ).Elif(dma.sink.valid & dma.sink.ready,
+                rd_addr.eq(rd_addr + 1),
+                rd_left.eq(rd_left - 1),
+            ),
+        ]
+
+        # *********************************************************
+        # *                        FSM                            *
+        # *********************************************************
+        fsm = FSM(reset_state="IDLE")
+        self.submodules.fsm = fsm
+
+        self.comb += start.eq(self.start.re & fsm.ongoing("IDLE"))
+
+        fsm.act("IDLE",
+            self.finished.status.eq(1),
+            If(start,
+                NextValue(tx_left, self.size.storage[shift:]),
+                NextValue(seq, 0),
+                NextValue(address, self.addr.storage),
+                NextState("CHECK"),
+            )
+        )
+
+        fsm.act("CHECK",
+            If(tx_left == 0,
+                NextState("IDLE"),
+            ).Else(
+                NextState("SEQUENCE"),
+            )
+        )
+
+        fsm.act("SEQUENCE",
+            udp_port.sink.valid.eq(1),
+            udp_port.sink.data.eq(seq),
+            If(udp_port.sink.ready,
+                NextState("ADDRESS"),
+            )
+        )
+
+        fsm.act("ADDRESS",
+            udp_port.sink.valid.eq(1),
+            udp_port.sink.data.eq(address),
+            If(udp_port.sink.ready,
+                NextValue(word, 0),
+                NextState("DATA"),
+            )
+        )
+
+        fsm.act("DATA",
+            udp_port.sink.valid.eq(converter.source.valid),
+            udp_port.sink.data.eq(converter.source.data),
+            udp_port.sink.last.eq(word == count*words - 1),
+            converter.source.ready.eq(udp_port.sink.ready),
+            If(converter.source.valid & udp_port.sink.ready,
+                NextValue(word, word + 1),
+                If(udp_port.sink.last,
+                    NextValue(seq, seq + 1),
+                    NextValue(address, address + (count << shift)),
+                    NextValue(tx_left, tx_left - count),
+                    NextState("CHECK"),
+                )
+            )
+        )
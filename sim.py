@@ -32,10 +32,12 @@ sys.path.append("./pcie_analyzer")
 sys.path.append("./pcie_analyzer/descrambler")
 sys.path.append("./pcie_analyzer/trigger")
 sys.path.append("./pcie_analyzer/recorder")
+sys.path.append("./pcie_analyzer/udp_streamer")
 
 from descrambler import Descrambler, DetectOrderedSets
 from trigger import Trigger
 from recorder import RingRecorder
+from udp_streamer import UDPStreamer, UDP_STREAMER_PORT
 from common import *
 
 # *********************************************************
@@ -252,6 +254,14 @@ class PCIeAnalyzer(SoCSDRAM):
             self.rx_recorder.force.eq(self.tx_recorder.enable),
         ]
 
+        # *********************************************************
+        # *                    UDP Streamer                       *
+        # *********************************************************
+        streamer_port = self.sdram.crossbar.get_port("read", 256)
+        udp_port      = self.ethcore.udp.crossbar.get_port(UDP_STREAMER_PORT, dw=32)
+        self.submodules.udp_streamer = UDPStreamer(streamer_port, udp_port)
+        self.add_csr("udp_streamer")
+
 # *********************************************************
 # *                                                       *
 # *                      Build                            *
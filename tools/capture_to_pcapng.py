@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from pcie_analyzer.software.capture_file import CaptureFile
+from pcie_analyzer.software.pcapng import export_pcapng
+
+# *********************************************************
+# *                                                       *
+# *                         Main                          *
+# *                                                       *
+# *********************************************************
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert capture files to PCAPNG")
+    parser.add_argument("captures", nargs="+",           help="Capture files (one per direction)")
+    parser.add_argument("-o", "--output", required=True, help="PCAPNG output file")
+    args = parser.parse_args()
+
+    files    = [CaptureFile(filename) for filename in args.captures]
+    captures = [(f.direction, f.decoder.iter_decode(f.blocks)) for f in files]
+    packets  = export_pcapng(args.output, captures)
+    print("{} packets written to {}".format(packets, args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import time
+import argparse
+
+from litex import RemoteClient
+
+from pcie_analyzer.software.histogram import HistogramReader
+
+# *********************************************************
+# *                                                       *
+# *                         Main                          *
+# *                                                       *
+# *********************************************************
+
+LENGTH_EDGES = [4, 6, 8, 10, 12, 16, 20, 24, 32, 48, 64, 96, 128, 256, 512]
+GAP_EDGES    = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384, 65536, 1 << 20]
+
+def main():
+    parser = argparse.ArgumentParser(description="TLP length and inter-frame gap histograms")
+    parser.add_argument("--pipeline", default="rx_capture",  help="Capture pipeline name")
+    parser.add_argument("--duration", default=10, type=float, help="Accumulation time (s)")
+    args = parser.parse_args()
+
+    wb = RemoteClient()
+    wb.open()
+
+    histograms = [("TLP length (words)",     HistogramReader(wb, args.pipeline + "_length_histogram"), LENGTH_EDGES),
+                  ("Inter-frame gap (ticks)", HistogramReader(wb, args.pipeline + "_gap_histogram"),    GAP_EDGES)]
+    for title, histogram, edges in histograms:
+        histogram.configure(edges)
+    time.sleep(args.duration)
+
+    for title, histogram, edges in histograms:
+        print(title)
+        for low, high, count in histogram.bins():
+            print("    {:>8d} - {:<8s} {:12d}".format(low, "" if high is None else str(high), count))
+
+    wb.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from litex import RemoteClient
+
+from pcie_analyzer.software.status import recorder_status
+from pcie_analyzer.software.udp_receiver import PushUploader, UDPReceiver, UDP_RECEIVER_PORT
+from pcie_analyzer.software.ring import RingCapture
+from pcie_analyzer.software.capture_file import CaptureWriter
+from pcie_analyzer.software.ddr import recorder_ring
+
+# *********************************************************
+# *                                                       *
+# *                         Main                          *
+# *                                                       *
+# *********************************************************
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload finished captures with the UDP streamer")
+    parser.add_argument("host_ip",                               help="Host IP address, as seen by the board")
+    parser.add_argument("--port",       default=UDP_RECEIVER_PORT, type=int, help="Host UDP port")
+    parser.add_argument("--recorders",  default="rx_capture_recorder,tx_capture_recorder",
+                                                                 help="Recorder names")
+    parser.add_argument("--directions", default="rx,tx",         help="Recorder directions")
+    args = parser.parse_args()
+
+    wb = RemoteClient()
+    wb.open()
+
+    with UDPReceiver(args.port) as receiver:
+        uploader = PushUploader(wb, args.host_ip, receiver=receiver)
+        for name, direction in zip(args.recorders.split(","), args.directions.split(",")):
+            base, length = recorder_ring(wb, name)
+            nb     = getattr(wb.constants, name + "_nb")
+            dw     = getattr(wb.constants, name + "_dw")
+
+            status = recorder_status(wb, name).read()
+            buf    = uploader.upload(base, length)
+            ring   = RingCapture.from_buffer(buf, base, length, dw, status["trigAddr"], status["wrAddr"])
+            with CaptureWriter(direction + ".bin", nb, dw, direction, ring) as capture:
+                for segment in ring.segments(buf):
+                    capture.write(segment)
+            print("{}: {} blocks written to {}.bin".format(name, len(ring), direction))
+
+    wb.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from litex import RemoteClient
+
+from pcie_analyzer.software.stream import RingDrainer
+from pcie_analyzer.software.capture_file import CaptureWriter
+
+# *********************************************************
+# *                                                       *
+# *                         Main                          *
+# *                                                       *
+# *********************************************************
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuous capture, the ring is drained while recording")
+    parser.add_argument("-o", "--output", default="rx.bin",      help="Capture file")
+    parser.add_argument("--recorder",     default="rx_capture_recorder", help="Recorder name")
+    parser.add_argument("--direction",    default="rx",          help="Capture direction (rx or tx)")
+    parser.add_argument("--duration",     default=10, type=float, help="Capture duration (s)")
+    parser.add_argument("--backpressure", action="store_true",   help="Stall instead of dropping blocks when full")
+    args = parser.parse_args()
+
+    wb = RemoteClient()
+    wb.open()
+
+    drainer = RingDrainer(wb, args.recorder)
+    with CaptureWriter(args.output, drainer.nb, drainer.dw, args.direction) as capture:
+        drainer.start(args.backpressure)
+        drainer.run(capture.write, args.duration)
+        overruns = drainer.stop(capture.write)
+    print("{} bytes captured to {}, {} blocks dropped".format(drainer.drained, args.output, overruns))
+
+    wb.close()
+
+if __name__ == "__main__":
+    main()
@@ -4,20 +4,19 @@ import sys
 
 from litex import RemoteClient
 
+from pcie_analyzer.software.trigger_loader import TriggerLoader, make_mem_data
+from pcie_analyzer.software.status import recorder_status
+from pcie_analyzer.software.uploader import Uploader, UploadProgress, upload_concurrent
+from pcie_analyzer.software.decoder import RecordDecoder
+from pcie_analyzer.software.ring import RingCapture
+from pcie_analyzer.software.capture_file import CaptureWriter
+from pcie_analyzer.software.ddr import recorder_ring
+
 wb = RemoteClient()
 wb.open()
 
 # # #
 
-# *********************************************************
-# *                                                       *
-# *                      Helpers                          *
-# *                                                       *
-# *********************************************************
-
-def make_mem_data(dc, ctrl, data):
-    return (dc << 18) + (ctrl << 16) + data
-
 # *********************************************************
 # *                                                       *
 # *                Descrambler control                    *
@@ -43,15 +42,12 @@ class Trigger:
         self._trigged = getattr(wb.regs, name + "_trigged")
         self._size    = getattr(wb.regs, name + "_size")
         self._mem     = getattr(wb.bases, name + "_mem")
+        self._loader  = TriggerLoader(wb, name)
 
     def configure(self, data):
-        print("Configure trigger memory")
-        offset = 0
-        for addr, val in mem_data:
-                print("{:x} -> {:1b} {:02b} {:04x}".format(addr, (val >> 18) & 3, (val >> 16) & 3, val & 0xffff))
-                wb.write(wb.bases.rx_trigger_mem + (addr * 4), val)
-        self._size.write(len(mem_data))
-        print("Done...")
+        # Whole pattern in one burst, skipped when already loaded
+        if self._loader.load(data):
+            print("Trigger memory loaded ({} words)".format(len(data)))
 
     def armed(self, value):
         self._armed.write(value)
@@ -64,20 +60,24 @@ class Trigger:
 # *********************************************************
 
 class Recorder:
-    def __init__(self, name):
+    def __init__(self, name, direction="rx"):
+        self.direction = direction
+
         self._start    = getattr(wb.regs, name + "_start")
         self._stop     = getattr(wb.regs, name + "_stop")
         self._finished = getattr(wb.regs, name + "_finished")
         self._size     = getattr(wb.regs, name + "_size")
         self._offset   = getattr(wb.regs, name + "_offset")
         self._trigAddr = getattr(wb.regs, name + "_trigAddr")
+        self._wrAddr   = getattr(wb.regs, name + "_wrAddr")
+        self._status   = recorder_status(wb, name)
 
-        self._base     = getattr(wb.constants, name + "_base")
-        self._length   = getattr(wb.constants, name + "_length")
+        self._base, self._length = recorder_ring(wb, name)
         self._nb       = getattr(wb.constants, name + "_nb")
         self._dw       = getattr(wb.constants, name + "_dw")
 
         self.addr   = 0;
+        self.wrAddr = 0;
         self.offset = 0;
         self.size   = 0;
 
@@ -94,12 +94,13 @@ class Recorder:
     def stop(self):
         self._stop.write(1)
 
-    def wait(self):
-        while self._finished.read() != 1:
-            pass
+    def wait(self, timeout=None):
+        # Status CSRs are read together, pointers are reset on stop: save them
+        status = self._status.wait(timeout=timeout)
         print("Done !")
-        self.addr = self._trigAddr.read()
-        print("Trigger at 0x{:08x}".format(self.addr))
+        self.addr   = status["trigAddr"]
+        self.wrAddr = status["wrAddr"]
+        print("Trigger at 0x{:08x}, next write at 0x{:08x}".format(self.addr, self.wrAddr))
 
     def print_config(self):
         print("RX buffer base address      = 0x{:08x}".format(self._base))
@@ -107,17 +108,33 @@ class Recorder:
         print("RX DMA data width           = {}".format(self._dw))
         print("Number of agregated records = {}".format(self._nb))
 
-    def upload(self):
-        base = wb.mems.main_ram.base
-        base += self.addr - self.offset
-        size = self.size
-        print("Upload of {} bytes from 0x{:08x}...".format(size, base))
-        datas = []
-        for i in range(size//4):
-            addr = base + 4*i
-            val = wb.read(addr)
-            print("{:08x} : {:08x}".format(addr, val))
-        return datas
+    def upload_job(self):
+        """Return an upload_concurrent() job of the whole ring, on its own connection"""
+        client = RemoteClient()
+        client.open()
+        return (self.direction, Uploader(client), wb.mems.main_ram.base + self._base, self._length)
+
+    def save(self, buf, filename=None):
+        # Unwrap the uploaded ring in place (no copy)
+        ring = RingCapture.from_buffer(buf, self._base, self._length, self._dw, self.addr, self.wrAddr)
+        print("{} ring wrapped: {}, {} blocks recorded".format(self.direction, ring.wrapped, len(ring)))
+        if filename is not None:
+            with CaptureWriter(filename, self._nb, self._dw, self.direction, ring) as capture:
+                for segment in ring.segments(buf):
+                    capture.write(segment)
+        return ring.decode(buf, RecordDecoder(self._nb, self._dw))
+
+    def upload(self, filename=None):
+        buf = Uploader(wb).upload(wb.mems.main_ram.base + self._base, self._length)
+        return self.save(buf, filename)
+
+def upload_rings(recorders):
+    """Upload all rings at the same time, each one into <direction>.bin"""
+    jobs = [recorder.upload_job() for recorder in recorders]
+    bufs = upload_concurrent(jobs, UploadProgress((name, length) for name, uploader, addr, length in jobs))
+    for recorder, (name, uploader, addr, length) in zip(recorders, jobs):
+        recorder.save(bufs[name], name + ".bin")
+        uploader.wb.close()
 
 # *********************************************************
 # *                                                       *
@@ -153,6 +170,7 @@ mem_data =    [(0, make_mem_data(0b00, 0b00, 0x8000)),
 descrambler = Descrambler("rx_descrambler")
 trigger  = Trigger("rx_trigger")
 recorder = Recorder("rx_recorder")
+tx_recorder = Recorder("tx_recorder", "tx")
 
 recorder.print_config()
 
@@ -166,11 +184,16 @@ trigger.configure(mem_data)
 trigger.armed(1)
 
 recorder.configure(0x1000, 0x400)
+tx_recorder.configure(0x1000, 0x400)
+tx_recorder.start()
 recorder.start()
 recorder.wait()
+tx_recorder.wait()
 recorder.stop()
+tx_recorder.stop()
 
-datas = recorder.upload()
+# RX and TX rings are uploaded concurrently, to rx.bin and tx.bin
+upload_rings([recorder, tx_recorder])
 
 # # #
 
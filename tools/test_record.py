@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
 import sys
+import struct
 
 from litex import RemoteClient
 
+from pcie_analyzer.software.uploader import Uploader
+
 wb = RemoteClient()
 wb.open()
 
@@ -27,11 +30,8 @@ class DMARecorder:
         print("Done...")
 
     def upload(self, base, length):
-        print("Upload of {} bytes to @0x{:08x}...".format(length, base))
-        datas = []
-        for i in range(length//4):
-            datas.append(wb.read(base + 4*i))
-        return datas
+        datas = Uploader(wb).upload(base, length)
+        return [data for (data,) in struct.iter_unpack("<I", datas)]
 
 wb.write(wb.mems.main_ram.base, 0x11223344)
 test = wb.read(wb.mems.main_ram.base)
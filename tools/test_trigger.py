@@ -4,20 +4,14 @@ import sys
 
 from litex import RemoteClient
 
+from pcie_analyzer.software.trigger_loader import TriggerLoader, make_mem_data
+from pcie_analyzer.software.status import trigger_status
+
 wb = RemoteClient()
 wb.open()
 
 # # #
 
-# *********************************************************
-# *                                                       *
-# *                      Helpers                          *
-# *                                                       *
-# *********************************************************
-
-def make_mem_data(dc, ctrl, data):
-    return (dc << 18) + (ctrl << 16) + data
-
 # *********************************************************
 # *                                                       *
 # *                Trigger memory data                    *
@@ -48,15 +42,12 @@ class Trigger:
         self._trigged = getattr(wb.regs, name + "_trigged")
         self._size    = getattr(wb.regs, name + "_size")
         self._mem     = getattr(wb.bases, name + "_mem")
+        self._loader  = TriggerLoader(wb, name)
 
     def configure(self, data):
-        print("Configure trigger memory")
-        offset = 0
-        for addr, val in mem_data:
-                print("{:x} -> {:b} {:04x}".format(addr, val >> 16, val & 0xffff))
-                wb.write(wb.bases.rx_trigger_mem + (addr * 4), val)
-        self._size.write(len(mem_data))
-        print("Done...")
+        # Whole pattern in one burst, skipped when already loaded
+        if self._loader.load(data):
+            print("Trigger memory loaded ({} words)".format(len(data)))
 
     def armed(self, value):
         self._armed.write(value)
@@ -77,8 +68,7 @@ trigger.armed(1)
 
 # Wait trigger
 print("Wait for trigger...")
-while trigger._trigged.read() != 1:
-    pass
+trigger_status(wb, "rx_trigger").wait(lambda status: status["trigged"])
 print("Done !")
 
 # Arm trigger
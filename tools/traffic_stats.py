@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import time
+import argparse
+
+from litex import RemoteClient
+
+from pcie_analyzer.software.traffic_stats import TrafficStats
+
+# *********************************************************
+# *                                                       *
+# *                         Main                          *
+# *                                                       *
+# *********************************************************
+
+def main():
+    parser = argparse.ArgumentParser(description="Monitor the link traffic with the hardware statistics counters")
+    parser.add_argument("--pipelines", default="rx_capture,tx_capture", help="Capture pipeline names")
+    parser.add_argument("--interval",  default=1, type=float,          help="Snapshot interval (s)")
+    parser.add_argument("--count",     default=0, type=int,            help="Number of snapshots (0 = forever)")
+    parser.add_argument("--clk-freq",  default=125e6, type=float,      help="Capture pipeline clock frequency (Hz)")
+    args = parser.parse_args()
+
+    wb = RemoteClient()
+    wb.open()
+
+    monitors = {name: TrafficStats(wb, name + "_stats", args.clk_freq) for name in args.pipelines.split(",")}
+    for monitor in monitors.values():
+        monitor.snapshot()
+
+    n = 0
+    while args.count == 0 or n < args.count:
+        time.sleep(args.interval)
+        for name, monitor in monitors.items():
+            stats = monitor.snapshot()
+            print("{}: {} errors".format(name, stats["errors"]))
+            for category, (frames, share) in monitor.rates(stats).items():
+                print("    {:12s} {:12.0f} frames/s {:6.2f} %".format(category, frames, 100*share))
+        n += 1
+
+    wb.close()
+
+if __name__ == "__main__":
+    main()